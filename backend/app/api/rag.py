@@ -14,6 +14,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
 from app.rag.engine import QueryMode, RAGQuery
+from app.rag.planner import PROFILES
 from app.api.auth import get_current_user, UserResponse
 from app.db.database import get_db
 from app.models import SearchHistory
@@ -31,6 +32,8 @@ class RAGQueryRequest(BaseModel):
     top_k: int | None = None
     temperature: float = 0.3
     stream: bool = False
+    rerank_budget_ms: float | None = None  # overrides the mode's re-ranking budget
+    profile: str | None = None  # "default" or "fast"; None uses the configured profile
 
 
 class GenerateSectionRequest(BaseModel):
@@ -78,9 +81,18 @@ async def rag_query(
     Query the HybridRAG engine and save to search history.
 
     Supports modes: search, qa, write_section, exec_summary, analyze_reqs, compliance
+
+    Profile "fast" runs dense + sparse retrieval only, without the knowledge
+    graph or re-ranking, for search-as-you-type and quick lookups.
     """
     engine = request.app.state.rag_engine
 
+    if data.profile is not None and data.profile not in PROFILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid profile: {data.profile}. Valid profiles: {list(PROFILES)}"
+        )
+
     try:
         mode = QueryMode(data.mode)
     except ValueError:
@@ -95,6 +107,8 @@ async def rag_query(
         filters=data.filters,
         top_k=data.top_k,
         temperature=data.temperature,
+        rerank_budget_ms=data.rerank_budget_ms,
+        profile=data.profile,
     )
 
     if data.stream:
@@ -287,6 +301,9 @@ async def rag_health(request: Request):
         "sparse_corpus_size": engine.sparse_retriever.corpus_size if engine.sparse_retriever else 0,
         "graph_retriever": engine.graph_retriever is not None,
         "generator": engine.generator is not None,
+        "embedding_cache": engine.embedder.cache_stats() if engine.embedder else None,
+        "embedding_batching": engine.embedder.batching_stats() if engine.embedder else None,
+        "reranker": engine.reranker.stats() if engine.reranker else None,
     }
 
     # Check Ollama
@@ -32,6 +32,20 @@ class Settings(BaseSettings):
     qdrant_port: int = 6333
     qdrant_api_key: str = ""
     qdrant_collection_prefix: str = "tw_"
+    qdrant_grpc_port: int = 6334
+    qdrant_prefer_grpc: bool = False  # gRPC transport instead of REST
+    qdrant_timeout: int = 10  # seconds, per request
+    qdrant_max_connections: int = 20  # REST connection pool size
+    # Collection layout; existing collections are migrated in place on startup
+    qdrant_hnsw_m: int = 16
+    qdrant_hnsw_ef_construct: int = 100
+    qdrant_hnsw_ef: int = 128  # search-time beam width
+    qdrant_quantization: str = "int8"  # "int8", "binary" or "none"
+    qdrant_quantization_rescore: bool = True  # rescore candidates with full vectors
+    qdrant_quantization_oversampling: float = 2.0
+    qdrant_on_disk_vectors: bool = False  # keep full vectors on disk, quantized in RAM
+    qdrant_upsert_batch_size: int = 256  # chunks embedded and upserted per batch
+    qdrant_upsert_max_in_flight: int = 2  # unacknowledged upserts while embedding the next batch
 
     # --- Neo4j ---
     neo4j_uri: str = "bolt://localhost:7687"
@@ -47,9 +61,56 @@ class Settings(BaseSettings):
     embedding_model: str = "BAAI/bge-base-en-v1.5"
     embedding_device: str = "cpu"
     embedding_batch_size: int = 32
+    embedding_token_budget: int = 16384  # padded tokens per forward pass
+    embedding_max_batch_size: int = 256
+    # Worker processes for bulk ingestion embedding (0 = embed in-process).
+    # Keep workers * threads below the core count so queries keep capacity.
+    embedding_pool_workers: int = 0
+    embedding_pool_threads: int = 4  # intra-op threads per worker
+    embedding_pool_shard_size: int = 512  # texts per task
+    embedding_pool_min_texts: int = 256  # smaller batches stay in-process
+    embedding_cache_enabled: bool = True
+    embedding_cache_path: str = "data/embedding_cache.sqlite3"
+    embedding_cache_max_entries: int = 500_000  # ~0.8 KB each at 384 dims, ~1.5 KB at 768
+    query_embedding_cache_size: int = 2048
+    query_embedding_cache_ttl: float = 3600.0  # seconds
+    # Coalesce concurrent query embeddings into one model call
+    embedding_query_batch_size: int = 32
+    embedding_query_batch_wait_ms: float = 5.0
 
     # --- Re-Ranker ---
     reranker_model: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    # Cascade: a small cross-encoder scores every candidate and the full
+    # model only re-scores the survivors ("" = full model only)
+    reranker_first_pass_model: str = "cross-encoder/ms-marco-TinyBERT-L-2-v2"
+    # Per QueryMode: fused candidates re-ranked, survivors of the first pass,
+    # and the re-ranking budget in ms (0 = unbounded)
+    reranker_depth: dict[str, int] = {
+        "search": 30, "qa": 30, "write_section": 50,
+        "exec_summary": 50, "analyze_reqs": 40, "compliance": 40,
+    }
+    reranker_survivors: dict[str, int] = {
+        "search": 10, "qa": 10, "write_section": 20,
+        "exec_summary": 20, "analyze_reqs": 15, "compliance": 15,
+    }
+    reranker_budget_ms: dict[str, float] = {
+        "search": 150.0, "qa": 250.0, "write_section": 500.0,
+        "exec_summary": 500.0, "analyze_reqs": 400.0, "compliance": 400.0,
+    }
+    reranker_batch_size: int = 8  # full-model pairs scored between budget checks
+    reranker_cache_enabled: bool = True  # cache scores per (model, query, chunk content)
+    reranker_cache_size: int = 50_000
+    # Coalesce pairs from concurrent requests into one model call
+    reranker_max_batch_pairs: int = 128
+    reranker_batch_wait_ms: float = 3.0
+    reranker_token_budget: int = 16384  # padded tokens per forward pass
+
+    # --- Inference backend (embedder + re-ranker) ---
+    inference_backend: str = "torch"  # "torch" or "onnx" (needs the [onnx] extra)
+    onnx_model_dir: str = "data/onnx"  # cached ONNX exports
+    onnx_quantize: bool = True  # dynamic int8 quantization
+    onnx_quantization_config: str = "auto"  # "auto", "avx2", "avx512_vnni" or "arm64"
+    onnx_threads: int = 0  # intra-op threads, 0 = all cores
 
     # --- MinIO ---
     minio_endpoint: str = "localhost:9000"
@@ -87,10 +148,61 @@ class Settings(BaseSettings):
     rag_sparse_weight: float = 0.3
     rag_graph_weight: float = 0.3
 
+    # --- Retrieval concurrency ---
+    rag_retrieval_workers: int = 4
+    rag_dense_timeout: float = 5.0
+    rag_sparse_timeout: float = 2.0
+    rag_graph_timeout: float = 5.0
+
+    # --- Query planner (see app/rag/planner.py) ---
+    rag_planner_enabled: bool = True
+    rag_profile: str = "default"  # "default" or "fast" (dense + sparse only, < 50 ms p95)
+    rag_short_query_tokens: int = 3  # search mode, up to this many words: no re-ranking
+    # Skip the graph and re-ranking when dense and sparse agree on the top hits
+    rag_early_exit_modes: list[str] = ["search", "qa"]
+    rag_early_exit_depth: int = 3
+    rag_early_exit_overlap: float = 0.6
+    rag_fast_top_k: int = 10
+    # A cold query embedding takes 20-80 ms on CPU (bge-base) plus the batch
+    # wait and a Qdrant round trip; cached queries need a few ms
+    rag_fast_dense_timeout: float = 0.15
+    rag_fast_sparse_timeout: float = 0.05
+
+    # --- Sparse Index (BM25) ---
+    sparse_compaction_ratio: float = 0.25
+    sparse_maxscore_min_terms: int = 4
+    sparse_snapshot_dir: str = "data/sparse_index"
+    sparse_snapshot_keep: int = 2
+    sparse_snapshot_interval: float = 5.0  # min seconds between background snapshot writes
+    sparse_snapshot_prune_grace: float = 60.0  # seconds a superseded generation stays readable
+    # Share one snapshot across uvicorn workers/replicas (requires a shared volume)
+    sparse_shared_mode: bool = False
+    sparse_shared_notify: bool = True
+    sparse_shared_channel: str = "tenderwriter:bm25"
+    sparse_shared_poll_interval: float = 2.0
+
     # --- Chunking ---
     chunk_min_size: int = 200
     chunk_max_size: int = 1500
     chunk_overlap: int = 100
+    chunk_embed_window: int = 256  # sentences embedded per batch while streaming
+    # Reuse boundary-detection sentence vectors for indexing: "off", "mean"
+    # (mean-pooled for every chunk) or "selective" (re-encode chunks longer
+    # than chunk_reencode_min_chars)
+    chunk_embedding_reuse: str = "off"
+    chunk_reencode_min_chars: int = 1000
+    # Smaller model for boundary detection only ("" = the embedding model);
+    # disables embedding reuse since its vectors are not in the index space
+    chunk_boundary_model: str = ""
+
+    # --- Near-duplicate chunk detection (MinHash + LSH) ---
+    dedup_enabled: bool = True
+    # Estimated Jaccard similarity of word shingles for a candidate; a duplicate
+    # must also have the same whitespace-normalized text (content hash)
+    dedup_threshold: float = 0.97
+    dedup_num_perm: int = 64
+    dedup_bands: int = 8  # candidates from ~0.77 similarity with 8 bands of 8 rows
+    dedup_shingle_size: int = 5  # words per shingle
 
     model_config = {"env_file": ".env", "env_file_encoding": "utf-8", "extra": "ignore"}
 
@@ -7,17 +7,34 @@ Processes uploaded documents (PDF, DOCX, PPTX) through:
 3. Embedding + vector indexing (Qdrant)
 4. BM25 indexing (sparse retriever)
 5. Entity extraction + knowledge graph building (Neo4j)
+
+Re-ingesting a document (same document_id) is incremental: only chunks whose
+content changed are embedded and indexed, and chunks the new version no
+longer contains are removed (see app.rag.versioning).
 """
 
 from __future__ import annotations
 
+import asyncio
+from itertools import islice
+from typing import TYPE_CHECKING, AsyncIterator, Iterator
+
 import structlog
 
 from app.config import settings
 
+if TYPE_CHECKING:
+    from app.rag.chunker import TextChunk
+    from app.rag.versioning import DocumentDiff
+
 logger = structlog.get_logger()
 
 
+def _take(iterator: Iterator, n: int) -> list:
+    """Next `n` items of an iterator (fewer at its end)."""
+    return list(islice(iterator, n))
+
+
 class IngestionPipeline:
     """
     Orchestrates the full document ingestion pipeline.
@@ -59,8 +76,9 @@ class IngestionPipeline:
 
         logger.info("Ingesting document", file_path=file_path, doc_type=doc_type)
 
-        # Step 1: Parse document
-        elements = self._parse_document(file_path)
+        # Step 1: Parse document (off the event loop, like chunking below)
+        loop = asyncio.get_running_loop()
+        elements = await loop.run_in_executor(None, self._parse_document, file_path)
         if not elements:
             logger.warning("No content extracted from document", file_path=file_path)
             return {"status": "empty", "chunks": 0, "entities": 0}
@@ -68,19 +86,36 @@ class IngestionPipeline:
         # Step 2: Build structured text from elements
         full_text, section_texts = self._structure_elements(elements)
 
-        # Step 3: Chunk the text
+        # Steps 3-4: Chunk the text and index the chunks (dense + sparse) as
+        # they stream out of the chunker, so memory does not grow with
+        # document length. Chunks unchanged since the previous version of the
+        # document are skipped, and chunks it no longer has are removed.
         from app.rag.chunker import ChunkMetadata
         chunk_meta = ChunkMetadata(
             document_id=document_id,
             source_file=file_path,
             doc_type=doc_type,
         )
-        chunks = self.rag_engine.chunk_and_embed(full_text, chunk_meta)
-
-        # Step 4: Index chunks (dense + sparse)
-        point_ids = []
-        if chunks:
-            point_ids = self.rag_engine.index_chunks(chunks)
+        diff = await self.rag_engine.diff_document(document_id)
+        point_ids: list[str | None] = []
+        batch: list[tuple[int, TextChunk]] = []
+        chunk_stream = self.rag_engine.iter_chunks(
+            (elem["text"] for elem in elements if elem.get("text")),
+            chunk_meta,
+        )
+        async for chunks in self._pull_chunks(chunk_stream):
+            for chunk in chunks:
+                stored_id = diff.assign(chunk)
+                point_ids.append(stored_id)
+                if stored_id is not None:
+                    continue
+                batch.append((len(point_ids) - 1, chunk))
+                if len(batch) >= settings.qdrant_upsert_batch_size:
+                    await self._index_batch(batch, point_ids, diff)
+                    batch = []
+        if batch:
+            await self._index_batch(batch, point_ids, diff)
+        await self.rag_engine.remove_stale_chunks(diff)
 
         # Step 5: Extract entities and build knowledge graph
         entity_count = 0
@@ -89,7 +124,8 @@ class IngestionPipeline:
 
         stats = {
             "status": "completed",
-            "chunks": len(chunks),
+            "chunks": len(point_ids),
+            **diff.stats(),
             "entities": entity_count,
             "point_ids": point_ids,
         }
@@ -97,6 +133,39 @@ class IngestionPipeline:
         logger.info("Document ingestion complete", **stats)
         return stats
 
+    @staticmethod
+    async def _pull_chunks(chunk_stream: Iterator[TextChunk]) -> AsyncIterator[list[TextChunk]]:
+        """
+        Pull chunks from the synchronous chunker off the event loop.
+
+        Chunking embeds sentences for boundary detection, which is CPU-bound,
+        so each batch of chunks is produced on an executor thread and
+        concurrent searches keep running while a large upload is chunked.
+        """
+        loop = asyncio.get_running_loop()
+        size = max(1, settings.qdrant_upsert_batch_size)
+        while chunks := await loop.run_in_executor(None, _take, chunk_stream, size):
+            yield chunks
+
+    async def _index_batch(
+        self,
+        batch: list[tuple[int, TextChunk]],
+        point_ids: list,
+        diff: DocumentDiff,
+    ):
+        """
+        Index new chunks, filling in their point ids at the given positions.
+
+        The document's previously stored chunks are excluded from dedup, so
+        an edited chunk is always indexed with its new text.
+        """
+        indexed = await self.rag_engine.index_chunks(
+            [chunk for _, chunk in batch],
+            exclude_points=diff.previous_point_ids,
+        )
+        for (position, _), point_id in zip(batch, indexed):
+            point_ids[position] = point_id
+
     def _parse_document(self, file_path: str) -> list[dict]:
         """
         Parse a document file and extract structured elements.
@@ -300,11 +369,15 @@ Return as JSON:
 
             for project in entities.get("projects", []):
                 project.setdefault("id", f"proj_{hash(project.get('name', ''))}")
+                project["document_id"] = metadata.get("document_id")
+                project["doc_type"] = doc_type
                 await graph.add_project(project)
                 entity_count += 1
 
             for member in entities.get("team_members", []):
                 member.setdefault("id", f"member_{hash(member.get('name', ''))}")
+                member["document_id"] = metadata.get("document_id")
+                member["doc_type"] = doc_type
                 await graph.add_team_member(member)
                 entity_count += 1
 
@@ -337,12 +410,26 @@ Return as JSON:
             doc_type=doc_type,
         )
 
-        chunks = self.rag_engine.chunk_and_embed(text, chunk_meta)
-        point_ids = self.rag_engine.index_chunks(chunks) if chunks else []
+        loop = asyncio.get_running_loop()
+        chunks = await loop.run_in_executor(
+            None, self.rag_engine.chunk_and_embed, text, chunk_meta
+        )
+        diff = await self.rag_engine.diff_document(document_id)
+        point_ids: list[str | None] = []
+        batch: list[tuple[int, TextChunk]] = []
+        for chunk in chunks:
+            stored_id = diff.assign(chunk)
+            point_ids.append(stored_id)
+            if stored_id is None:
+                batch.append((len(point_ids) - 1, chunk))
+        if batch:
+            await self._index_batch(batch, point_ids, diff)
+        await self.rag_engine.remove_stale_chunks(diff)
 
         return {
             "status": "completed",
             "chunks": len(chunks),
+            **diff.stats(),
             "entities": 0,
             "point_ids": point_ids,
         }
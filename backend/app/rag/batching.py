@@ -0,0 +1,189 @@
+"""
+TenderWriter — Dynamic Micro-Batching
+
+Coalesces small model calls from concurrent requests into one batched
+call. Items submitted within `max_wait_ms` of each other (or until
+`max_batch_size` items are pending) are run together on an executor, and
+each caller gets its own results back through futures.
+
+With `max_concurrent`, batches do not run side by side competing for the
+same cores: items arriving while the model is busy wait and go out as one
+larger batch as soon as it is free.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from concurrent.futures import Executor
+from typing import Callable, Generic, Sequence, TypeVar
+
+import numpy as np
+import structlog
+
+logger = structlog.get_logger()
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# Batches kept for the size / queueing-delay metrics
+_RECENT_BATCHES = 256
+
+
+def token_budget_buckets(
+    lengths: np.ndarray,
+    token_budget: int,
+    max_batch_size: int,
+) -> list[list[int]]:
+    """
+    Group indices, longest first, into batches of at most `token_budget`
+    padded tokens (batch size x longest member) and `max_batch_size` items.
+    """
+    batches: list[list[int]] = []
+    current: list[int] = []
+    for i in np.argsort(-lengths, kind="stable").tolist():
+        # Sorted longest first, so the first member sets the padded width
+        if current and (
+            (len(current) + 1) * lengths[current[0]] > token_budget
+            or len(current) >= max_batch_size
+        ):
+            batches.append(current)
+            current = []
+        current.append(i)
+    if current:
+        batches.append(current)
+    return batches
+
+
+class MicroBatcher(Generic[T, R]):
+    """
+    Async front-end that batches calls to a synchronous `batch_fn`.
+
+    `batch_fn` receives a list of items and must return one result per item,
+    in order. It runs on `executor` (None uses the loop's default executor).
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[list[T]], Sequence[R]],
+        max_batch_size: int,
+        max_wait_ms: float,
+        executor: Executor | None = None,
+        name: str = "batcher",
+        max_concurrent: int | None = None,
+    ):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self.executor = executor
+        self.name = name
+        self.max_concurrent = max_concurrent
+
+        self._pending: list[tuple[T, asyncio.Future, float]] = []
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self._running = 0
+        # References to running batches, so they are not garbage-collected mid-run
+        self._tasks: set[asyncio.Task] = set()
+
+        self.batches = 0
+        self.items = 0
+        self.max_observed = 0
+        # (batch size, max queueing delay ms, run time ms) of recent batches
+        self._recent: deque[tuple[int, float, float]] = deque(maxlen=_RECENT_BATCHES)
+
+    async def submit(self, item: T) -> R:
+        """Queue one item and wait for its result."""
+        return (await self.submit_many([item]))[0]
+
+    async def submit_many(self, items: Sequence[T]) -> list[R]:
+        """Queue several items (batched with other callers') and wait for their results."""
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        futures = [loop.create_future() for _ in items]
+        self._pending.extend((item, future, now) for item, future in zip(items, futures))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.max_wait, self._flush)
+
+        return list(await asyncio.gather(*futures))
+
+    def _flush(self):
+        """Hand the pending items to the executor, in batches of max_batch_size."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        self._pending = [entry for entry in self._pending if not entry[1].done()]
+        loop = asyncio.get_running_loop()
+        while self._pending and (
+            self.max_concurrent is None or self._running < self.max_concurrent
+        ):
+            batch = self._pending[:self.max_batch_size]
+            self._pending = self._pending[self.max_batch_size:]
+            self._running += 1
+            task = loop.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        # Anything left waits for a running batch to finish (see _run)
+
+    async def _run(self, batch: list[tuple[T, asyncio.Future, float]]):
+        loop = asyncio.get_running_loop()
+        items = [item for item, _, _ in batch]
+        started = loop.time()
+        queue_ms = (started - min(enqueued for _, _, enqueued in batch)) * 1000
+        self.batches += 1
+        self.items += len(items)
+        self.max_observed = max(self.max_observed, len(items))
+
+        try:
+            results = await loop.run_in_executor(self.executor, self.batch_fn, items)
+        except Exception as e:
+            logger.warning("Micro-batch failed", batcher=self.name, size=len(items), error=str(e))
+            for _, fut, _ in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        else:
+            for (_, fut, _), result in zip(batch, results):
+                if not fut.done():
+                    fut.set_result(result)
+        finally:
+            # On cancellation (e.g. shutdown) nothing above resolved the batch;
+            # never leave a caller waiting on it
+            for _, fut, _ in batch:
+                fut.cancel()
+            self._running -= 1
+            if self._pending and self._flush_handle is None:
+                self._flush()
+
+        run_ms = (loop.time() - started) * 1000
+        self._recent.append((len(items), queue_ms, run_ms))
+        logger.debug(
+            "Micro-batch complete",
+            batcher=self.name,
+            size=len(items),
+            queue_ms=round(queue_ms, 2),
+            run_ms=round(run_ms, 2),
+        )
+
+    def stats(self) -> dict:
+        """Batch counters since startup, and size / delay of recent batches."""
+        stats = {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+            "max_batch_size": self.max_observed,
+            "pending": len(self._pending),
+        }
+        if self._recent:
+            sizes, queue_ms, run_ms = (np.asarray(v) for v in zip(*self._recent))
+            stats["recent"] = {
+                "batches": len(sizes),
+                "mean_batch_size": float(sizes.mean()),
+                "mean_queue_ms": float(queue_ms.mean()),
+                "p95_queue_ms": float(np.percentile(queue_ms, 95)),
+                "mean_run_ms": float(run_ms.mean()),
+            }
+        return stats
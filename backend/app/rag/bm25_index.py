@@ -0,0 +1,597 @@
+"""
+TenderWriter — Incremental BM25 Inverted Index
+
+A native inverted index that scores exactly like `rank_bm25.BM25Okapi`
+but supports cheap incremental updates:
+
+- Appends cost O(new tokens): each document gets a new slot and its term
+  frequencies are appended to the per-term postings lists.
+- Deletes are tombstones: the slot is marked dead and the running corpus
+  statistics are adjusted, but postings are left in place until compaction.
+- Corpus statistics (live document count, total length, document
+  frequencies) are maintained incrementally, so IDF values never need a
+  full corpus pass.
+
+Terms are interned into integer ids. Postings live in two segments: a
+frozen CSR term-document matrix (NumPy, row = term id) and a small mutable
+tail of typed arrays appended since the last merge. Queries only touch the
+postings rows of their own terms, select the top-k with `argpartition`, and
+can prune long queries with MaxScore. Only collecting a query's postings
+(`prepare`) reads mutable state; scoring them does not, so callers can score
+outside their lock.
+"""
+
+from __future__ import annotations
+
+import math
+from array import array
+from collections import Counter
+
+import numpy as np
+
+
+class BM25Index:
+    """
+    Inverted index with Okapi BM25 scoring (ATIRE IDF with epsilon floor).
+
+    Documents are identified by integer slots assigned in insertion order.
+    Slots are stable until `compact()` is called, which drops tombstoned
+    slots and renumbers the survivors. Within every postings row slots are
+    strictly increasing, which the pruned scoring path relies on.
+    """
+
+    # The tail is merged into the CSR segment once it holds this many
+    # postings, or 1/8 of the CSR segment, whichever is larger.
+    merge_min_postings = 65_536
+
+    # Term frequencies are stored as uint16; BM25 saturates long before this
+    MAX_TF = np.iinfo(np.uint16).max
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25):
+        self.k1 = k1
+        self.b = b
+        self.epsilon = epsilon
+
+        # Vocabulary: term <-> interned term id
+        self._vocab: dict[str, int] = {}
+        self._terms: list[str] = []
+
+        # Frozen CSR segment: row i holds the postings of term id i
+        self._indptr = np.zeros(1, dtype=np.int64)
+        self._indices = np.zeros(0, dtype=np.uint32)
+        self._data = np.zeros(0, dtype=np.uint16)
+        self._row_max_tf = np.zeros(0, dtype=np.uint16)
+
+        # Mutable tail: term id -> parallel typed arrays of (slot, term frequency)
+        self._tail_slots: dict[int, array] = {}
+        self._tail_freqs: dict[int, array] = {}
+        self._tail_nnz = 0
+
+        # Per-slot state (amortized-growth arrays, first _size entries valid)
+        self._size = 0
+        self._doc_len = np.zeros(1024, dtype=np.int32)
+        self._deleted = np.zeros(1024, dtype=bool)
+
+        # Running statistics over live documents
+        self._df = np.zeros(1024, dtype=np.int32)  # per term id
+        self._df_hist: Counter[int] = Counter()  # document frequency -> number of terms
+        self._num_terms = 0  # terms with df > 0
+        self._num_live = 0
+        self._num_deleted = 0
+        self._total_len = 0
+
+        self._idf_floor: float | None = None
+
+    # ──────────────────────────────────────────────
+    # Mutation
+    # ──────────────────────────────────────────────
+
+    def add(self, tokens: list[str]) -> int:
+        """Append a tokenized document and return its slot."""
+        slot = self._size
+        if slot == len(self._doc_len):
+            self._grow()
+
+        frequencies = Counter(tokens)
+        for term, tf in frequencies.items():
+            term_id = self._vocab.get(term)
+            if term_id is None:
+                term_id = self._intern(term)
+            tf = min(tf, self.MAX_TF)
+            slots = self._tail_slots.get(term_id)
+            if slots is None:
+                self._tail_slots[term_id] = array("I", [slot])
+                self._tail_freqs[term_id] = array("H", [tf])
+            else:
+                slots.append(slot)
+                self._tail_freqs[term_id].append(tf)
+            self._bump_df(term_id, 1)
+        self._tail_nnz += len(frequencies)
+
+        self._doc_len[slot] = len(tokens)
+        self._size += 1
+        self._num_live += 1
+        self._total_len += len(tokens)
+        self._idf_floor = None
+
+        if self._tail_nnz > max(self.merge_min_postings, len(self._indices) // 8):
+            self._merge()
+        return slot
+
+    def delete(self, slot: int, tokens: list[str]):
+        """
+        Tombstone a document slot.
+
+        `tokens` must be the tokens the slot was added with; they are used to
+        update the document frequencies without scanning the postings.
+        """
+        if self._deleted[slot]:
+            return
+
+        for term in set(tokens):
+            term_id = self._vocab.get(term)
+            if term_id is not None:
+                self._bump_df(term_id, -1)
+
+        self._deleted[slot] = True
+        self._num_live -= 1
+        self._num_deleted += 1
+        self._total_len -= int(self._doc_len[slot])
+        self._idf_floor = None
+
+    def compact(self) -> list[int]:
+        """
+        Drop tombstoned slots from the postings and renumber live slots.
+
+        Returns:
+            The old slot of every surviving document, in new-slot order, so
+            callers can compact any slot-aligned side storage the same way.
+        """
+        survivors = np.flatnonzero(~self._deleted[: self._size])
+        remap = np.full(self._size, -1, dtype=np.int64)
+        remap[survivors] = np.arange(len(survivors))
+
+        self._merge(remap)
+
+        capacity = max(1024, len(survivors))
+        doc_len = np.zeros(capacity, dtype=np.int32)
+        doc_len[: len(survivors)] = self._doc_len[survivors]
+        self._doc_len = doc_len
+        self._deleted = np.zeros(capacity, dtype=bool)
+        self._size = len(survivors)
+        self._num_deleted = 0
+        return survivors.tolist()
+
+    def _intern(self, term: str) -> int:
+        """Assign the next term id to a new term."""
+        term_id = len(self._terms)
+        self._vocab[term] = term_id
+        self._terms.append(term)
+        if term_id == len(self._df):
+            df = np.zeros(2 * len(self._df), dtype=np.int32)
+            df[:term_id] = self._df
+            self._df = df
+        return term_id
+
+    def _grow(self):
+        """Double the capacity of the per-slot arrays."""
+        capacity = max(1024, 2 * len(self._doc_len))
+        doc_len = np.zeros(capacity, dtype=np.int32)
+        doc_len[: self._size] = self._doc_len[: self._size]
+        deleted = np.zeros(capacity, dtype=bool)
+        deleted[: self._size] = self._deleted[: self._size]
+        self._doc_len, self._deleted = doc_len, deleted
+
+    def _merge(self, remap: np.ndarray | None = None):
+        """
+        Merge the tail into the CSR segment.
+
+        With `remap` (old slot -> new slot, -1 for dropped), postings of
+        dropped slots are removed, slots are renumbered and terms without
+        live documents are dropped from the vocabulary (renumbering term ids).
+        """
+        num_terms = len(self._terms)
+        row_parts = [np.repeat(np.arange(len(self._indptr) - 1), np.diff(self._indptr))]
+        slot_parts = [self._indices.astype(np.int64)]
+        tf_parts = [self._data]
+        for term_id, slots in self._tail_slots.items():
+            row_parts.append(np.full(len(slots), term_id, dtype=np.int64))
+            slot_parts.append(np.frombuffer(slots, dtype=np.uint32).astype(np.int64))
+            tf_parts.append(np.frombuffer(self._tail_freqs[term_id], dtype=np.uint16))
+
+        rows = np.concatenate(row_parts)
+        slots = np.concatenate(slot_parts)
+        tfs = np.concatenate(tf_parts)
+
+        if remap is not None:
+            slots = remap[slots]
+            keep = slots >= 0
+            rows, slots, tfs = rows[keep], slots[keep], tfs[keep]
+
+            live_terms = self._df[:num_terms] > 0
+            term_remap = np.cumsum(live_terms) - 1
+            rows = term_remap[rows]
+            self._terms = [t for t, live in zip(self._terms, live_terms.tolist()) if live]
+            self._vocab = {t: i for i, t in enumerate(self._terms)}
+            df = np.zeros(max(1024, len(self._terms)), dtype=np.int32)
+            df[: len(self._terms)] = self._df[:num_terms][live_terms]
+            self._df = df
+            num_terms = len(self._terms)
+
+        order = np.lexsort((slots, rows))
+        rows, slots, tfs = rows[order], slots[order], tfs[order]
+        counts = np.bincount(rows, minlength=num_terms)
+
+        self._indptr = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        self._indices = slots.astype(np.uint32)
+        self._data = tfs.astype(np.uint16)
+        self._row_max_tf = np.zeros(num_terms, dtype=np.uint16)
+        if len(tfs):
+            nonempty = counts > 0
+            self._row_max_tf[nonempty] = np.maximum.reduceat(
+                self._data, self._indptr[:-1][nonempty]
+            )
+
+        self._tail_slots = {}
+        self._tail_freqs = {}
+        self._tail_nnz = 0
+
+    def _bump_df(self, term_id: int, delta: int):
+        """Adjust a term's document frequency and the df histogram."""
+        old = int(self._df[term_id])
+        new = old + delta
+        if old:
+            self._df_hist[old] -= 1
+            if not self._df_hist[old]:
+                del self._df_hist[old]
+        else:
+            self._num_terms += 1
+        if new:
+            self._df_hist[new] += 1
+        else:
+            self._num_terms -= 1
+        self._df[term_id] = new
+
+    # ──────────────────────────────────────────────
+    # Serialization
+    # ──────────────────────────────────────────────
+
+    def export_state(self) -> tuple[dict[str, np.ndarray], dict, list[str]]:
+        """
+        Merge the tail and return the index as (arrays, scalars, terms).
+
+        The returned arrays are never mutated in place by the index, so they
+        can be written out after the caller releases its lock.
+        """
+        if self._tail_nnz:
+            self._merge()
+
+        arrays = {
+            "indptr": self._indptr,
+            "indices": self._indices,
+            "data": self._data,
+            "row_max_tf": self._row_max_tf,
+            "doc_len": self._doc_len[: self._size].copy(),
+            "deleted": self._deleted[: self._size].copy(),
+            "df": self._df[: len(self._terms)].copy(),
+        }
+        scalars = {
+            "k1": self.k1,
+            "b": self.b,
+            "epsilon": self.epsilon,
+            "num_live": self._num_live,
+            "num_deleted": self._num_deleted,
+            "total_len": self._total_len,
+        }
+        return arrays, scalars, list(self._terms)
+
+    def export_copy(self) -> BM25Index:
+        """
+        Detached copy to call `export_state` on outside the owner's lock.
+
+        The frozen CSR segment is shared (it is replaced, never written); the
+        tail and the per-slot and per-term arrays are copied. That costs a few
+        memory copies and no merge, which the copy then does on its own. The
+        copy has no vocabulary lookup and must not be mutated.
+        """
+        index = BM25Index(k1=self.k1, b=self.b, epsilon=self.epsilon)
+        index._terms = list(self._terms)
+        index._indptr = self._indptr
+        index._indices = self._indices
+        index._data = self._data
+        index._row_max_tf = self._row_max_tf
+        index._tail_slots = {t: array("I", a) for t, a in self._tail_slots.items()}
+        index._tail_freqs = {t: array("H", a) for t, a in self._tail_freqs.items()}
+        index._tail_nnz = self._tail_nnz
+        index._size = self._size
+        index._doc_len = self._doc_len[: self._size].copy()
+        index._deleted = self._deleted[: self._size].copy()
+        index._df = self._df[: len(self._terms)].copy()
+        index._num_live = self._num_live
+        index._num_deleted = self._num_deleted
+        index._total_len = self._total_len
+        return index
+
+    @classmethod
+    def from_state(
+        cls,
+        arrays: dict[str, np.ndarray],
+        scalars: dict,
+        terms: list[str],
+    ) -> BM25Index:
+        """
+        Rebuild an index from `export_state` output.
+
+        Postings and doc lengths may be read-only memory maps: they are only
+        replaced, never written, and the first append copies the per-slot
+        arrays into growable memory.
+        """
+        index = cls(k1=scalars["k1"], b=scalars["b"], epsilon=scalars["epsilon"])
+        index._terms = list(terms)
+        index._vocab = {t: i for i, t in enumerate(index._terms)}
+        index._indptr = arrays["indptr"]
+        index._indices = arrays["indices"]
+        index._data = arrays["data"]
+        index._row_max_tf = arrays["row_max_tf"]
+        index._doc_len = arrays["doc_len"]
+        index._deleted = np.array(arrays["deleted"], dtype=bool)
+        index._size = len(index._doc_len)
+
+        df = arrays["df"]
+        index._df = np.zeros(max(1024, 2 * len(df)), dtype=np.int32)
+        index._df[: len(df)] = df
+        values, counts = np.unique(df[df > 0], return_counts=True)
+        index._df_hist = Counter(dict(zip(values.tolist(), counts.tolist())))
+        index._num_terms = int(counts.sum())
+        index._num_live = scalars["num_live"]
+        index._num_deleted = scalars["num_deleted"]
+        index._total_len = scalars["total_len"]
+        return index
+
+    # ──────────────────────────────────────────────
+    # Statistics
+    # ──────────────────────────────────────────────
+
+    @property
+    def num_docs(self) -> int:
+        """Number of live (non-tombstoned) documents."""
+        return self._num_live
+
+    @property
+    def num_slots(self) -> int:
+        """Number of allocated slots, including tombstones."""
+        return self._size
+
+    @property
+    def tombstone_ratio(self) -> float:
+        """Fraction of allocated slots that are tombstoned."""
+        return self._num_deleted / self._size if self._size else 0.0
+
+    @property
+    def avgdl(self) -> float:
+        """Average live document length."""
+        return self._total_len / self._num_live if self._num_live else 0.0
+
+    def is_live(self, slot: int) -> bool:
+        """Whether a slot holds a live document."""
+        return not self._deleted[slot]
+
+    def _raw_idf(self, df: int) -> float:
+        n = self._num_live
+        return math.log(n - df + 0.5) - math.log(df + 0.5)
+
+    def idf(self, term: str) -> float:
+        """IDF of a term (0.0 for unknown terms), matching BM25Okapi."""
+        term_id = self._vocab.get(term)
+        return 0.0 if term_id is None else self._idf(term_id)
+
+    def _idf(self, term_id: int) -> float:
+        """
+        IDF of an interned term.
+
+        Negative IDFs (terms in more than half the corpus) are floored to
+        `epsilon * average_idf`. The average is computed from the df
+        histogram, which has far fewer entries than the vocabulary.
+        """
+        df = int(self._df[term_id])
+        if not df:
+            return 0.0
+
+        idf = self._raw_idf(df)
+        if idf >= 0:
+            return idf
+
+        if self._idf_floor is None:
+            idf_sum = sum(count * self._raw_idf(d) for d, count in self._df_hist.items())
+            self._idf_floor = self.epsilon * idf_sum / self._num_terms
+        return self._idf_floor
+
+    # ──────────────────────────────────────────────
+    # Scoring
+    # ──────────────────────────────────────────────
+
+    def _term_postings(self, term_id: int) -> tuple[np.ndarray, np.ndarray, int]:
+        """Return (slots, tfs, max_tf) for a term across both segments."""
+        slots = np.zeros(0, dtype=np.uint32)
+        tfs = np.zeros(0, dtype=np.uint16)
+        max_tf = 0
+
+        if term_id < len(self._indptr) - 1:
+            lo, hi = self._indptr[term_id], self._indptr[term_id + 1]
+            slots, tfs = self._indices[lo:hi], self._data[lo:hi]
+            max_tf = int(self._row_max_tf[term_id])
+
+        tail = self._tail_slots.get(term_id)
+        if tail is not None:
+            tail_tfs = self._tail_freqs[term_id]
+            slots = np.concatenate((slots, np.frombuffer(tail, dtype=np.uint32)))
+            tfs = np.concatenate((tfs, np.frombuffer(tail_tfs, dtype=np.uint16)))
+            max_tf = max(max_tf, max(tail_tfs))
+
+        return slots, tfs, max_tf
+
+    def search(
+        self,
+        query_tokens: list[str],
+        top_k: int | None = None,
+        mask: np.ndarray | None = None,
+        prune_min_terms: int = 0,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Score live documents against a tokenized query and select the top-k.
+
+        Only the postings rows of the query terms are visited. Repeated
+        query tokens contribute once per occurrence, as in BM25Okapi.
+
+        Args:
+            query_tokens: Tokenized query.
+            top_k: Number of results; None returns every scored slot.
+            mask: Optional boolean array over slots; only True slots are scored.
+            prune_min_terms: Enable MaxScore pruning when the query has at least
+                this many distinct terms (0 disables pruning).
+
+        Returns:
+            Tuple of (slots, scores) for slots with a positive score, ordered
+            by score descending (ties in slot order).
+        """
+        return self.prepare(query_tokens).search(top_k, mask, prune_min_terms)
+
+    def prepare(self, query_tokens: list[str]) -> PreparedQuery:
+        """
+        Collect the postings and weights of a query's terms.
+
+        This is the only part of a search that reads mutable index state, so
+        a caller that guards the index with a lock only needs to hold it here
+        and can score the returned query without it. Postings are copies or
+        views of arrays that are replaced, never written, and per-slot arrays
+        are only written for new slots or to set a tombstone (a concurrent
+        delete may or may not be seen, like a search that ran a moment later).
+        """
+        query = PreparedQuery(self.k1, self.b, self.avgdl, self._doc_len, self._deleted)
+        if not self._num_live or not self._total_len:
+            return query
+
+        k1, b = self.k1, self.b
+        for term, qf in Counter(query_tokens).items():
+            term_id = self._vocab.get(term)
+            if term_id is None or not self._df[term_id]:
+                continue
+            weight = qf * self._idf(term_id)
+            slots, tfs, max_tf = self._term_postings(term_id)
+            # tf / (tf + norm) is maximized by the largest tf and the shortest doc
+            bound = weight * (k1 + 1) * max_tf / (max_tf + k1 * (1 - b)) if max_tf else 0.0
+            query.terms.append((bound, weight, slots, tfs))
+        return query
+
+
+class PreparedQuery:
+    """
+    A query's postings and weights, with the per-slot statistics they are
+    scored against (see `BM25Index.prepare`).
+    """
+
+    __slots__ = ("k1", "b", "avgdl", "doc_len", "deleted", "terms")
+
+    def __init__(
+        self,
+        k1: float,
+        b: float,
+        avgdl: float,
+        doc_len: np.ndarray,
+        deleted: np.ndarray,
+    ):
+        self.k1 = k1
+        self.b = b
+        self.avgdl = avgdl
+        self.doc_len = doc_len
+        self.deleted = deleted
+        # (upper bound, weight, slots, tfs) per distinct query term
+        self.terms: list[tuple[float, float, np.ndarray, np.ndarray]] = []
+
+    def _bm25(self, slots: np.ndarray, tfs: np.ndarray, weight: float) -> np.ndarray:
+        """BM25 contribution of one term for the given postings."""
+        k1, b = self.k1, self.b
+        norm = k1 * (1 - b + b * self.doc_len[slots] / self.avgdl)
+        return weight * (tfs * (k1 + 1) / (tfs + norm))
+
+    def _contributions(
+        self,
+        slots: np.ndarray,
+        tfs: np.ndarray,
+        weight: float,
+        mask: np.ndarray | None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """BM25 contributions of one term's postings, restricted to live/allowed slots."""
+        keep = ~self.deleted[slots]
+        if mask is not None:
+            keep &= mask[slots]
+        slots, tfs = slots[keep], tfs[keep]
+        return slots, self._bm25(slots, tfs, weight)
+
+    @staticmethod
+    def _accumulate(
+        slots: np.ndarray,
+        scores: np.ndarray,
+        new_slots: np.ndarray,
+        new_scores: np.ndarray,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Sum scores per slot; returns sorted unique slots and their totals."""
+        all_slots = np.concatenate((slots, new_slots))
+        unique, inverse = np.unique(all_slots, return_inverse=True)
+        totals = np.bincount(inverse, weights=np.concatenate((scores, new_scores)))
+        return unique, totals
+
+    def search(
+        self,
+        top_k: int | None = None,
+        mask: np.ndarray | None = None,
+        prune_min_terms: int = 0,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Score and select the top-k, as `BM25Index.search`."""
+        empty = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64))
+        terms = self.terms
+        if not terms:
+            return empty
+
+        prune = (
+            top_k is not None
+            and prune_min_terms
+            and len(terms) >= prune_min_terms
+            and all(weight > 0 for _, weight, _, _ in terms)
+        )
+        # Highest-impact terms first so the threshold rises quickly
+        terms.sort(key=lambda t: t[0], reverse=True)
+        remaining = [0.0] * (len(terms) + 1)
+        for i in range(len(terms) - 1, -1, -1):
+            remaining[i] = remaining[i + 1] + terms[i][0]
+
+        cand_slots, cand_scores = empty
+        essential = True
+        for i, (_, weight, slots, tfs) in enumerate(terms):
+            if essential:
+                new_slots, new_scores = self._contributions(slots, tfs, weight, mask)
+                cand_slots, cand_scores = self._accumulate(
+                    cand_slots, cand_scores, new_slots, new_scores
+                )
+                # MaxScore: once the k-th best partial score beats everything
+                # the remaining terms could add, no new slot can enter the top-k
+                if prune and len(cand_scores) >= top_k:
+                    threshold = np.partition(cand_scores, -top_k)[-top_k]
+                    essential = threshold <= remaining[i + 1]
+            elif len(slots):
+                # Non-essential term: only look up the existing candidates
+                pos = np.minimum(np.searchsorted(slots, cand_slots), len(slots) - 1)
+                hit = slots[pos] == cand_slots
+                cand_scores[hit] += self._bm25(cand_slots[hit], tfs[pos[hit]], weight)
+
+        positive = cand_scores > 0
+        cand_slots, cand_scores = cand_slots[positive], cand_scores[positive]
+
+        if top_k is not None and len(cand_scores) > top_k:
+            # Keep everything tied with the k-th score so ties resolve by slot
+            threshold = -np.partition(-cand_scores, top_k - 1)[top_k - 1]
+            top = cand_scores >= threshold
+            cand_slots, cand_scores = cand_slots[top], cand_scores[top]
+
+        order = np.lexsort((cand_slots, -cand_scores))[:top_k]
+        return cand_slots[order], cand_scores[order]
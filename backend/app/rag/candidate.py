@@ -0,0 +1,62 @@
+"""
+TenderWriter — Retrieval Candidate
+
+The single record a retrieved chunk travels in, from the retrievers through
+rank fusion and re-ranking to the engine.
+
+Candidates are identified by the chunk's stable id (see app.rag.versioning),
+which is also its Qdrant point id and is stored in the BM25 metadata, so
+fusion deduplicates exactly, on ids. Knowledge-graph entities get ids in the
+same UUID namespace (`entity_chunk_id`).
+"""
+
+from __future__ import annotations
+
+import uuid
+
+from app.rag.versioning import CHUNK_ID_NAMESPACE, content_hash
+
+
+class Candidate:
+    """
+    A retrieved chunk (or graph entity) and its scores.
+
+    `score` is the score of the current stage: the retriever's, then the
+    fused RRF score, then the cross-encoder's. `fused_score` keeps the RRF
+    score once re-ranking has replaced `score`.
+    """
+
+    __slots__ = ("chunk_id", "text", "metadata", "score", "fused_score", "sources")
+
+    def __init__(self, chunk_id: str, text: str, metadata: dict, score: float = 0.0):
+        self.chunk_id = chunk_id
+        self.text = text
+        self.metadata = metadata
+        self.score = score
+        self.fused_score = 0.0
+        self.sources: list[str] = []  # retrievers that returned it
+
+    @classmethod
+    def from_chunk(cls, text: str, metadata: dict, score: float) -> Candidate:
+        """
+        Candidate for a stored chunk.
+
+        Chunks indexed before stable ids existed fall back to their content
+        hash, which is the same in every index.
+        """
+        return cls(metadata.get("chunk_id") or content_hash(text), text, metadata, score)
+
+    def rescored(self, score: float) -> Candidate:
+        """Copy of the candidate with `score` replaced (the original is unchanged)."""
+        copy = Candidate(self.chunk_id, self.text, self.metadata, score)
+        copy.fused_score = self.fused_score
+        copy.sources = list(self.sources)
+        return copy
+
+    def __repr__(self) -> str:
+        return f"Candidate({self.chunk_id!r}, score={self.score:.4f}, sources={self.sources})"
+
+
+def entity_chunk_id(entity_type: str, entity_id) -> str:
+    """Stable id of a knowledge-graph entity, in the chunk id namespace."""
+    return str(uuid.uuid5(CHUNK_ID_NAMESPACE, f"graph:{entity_type}:{entity_id}"))
@@ -0,0 +1,85 @@
+"""
+TenderWriter — Compact Chunk Store
+
+Append-only storage of strings as UTF-8 bytes in contiguous buffers with an
+offsets array, instead of one Python object per chunk.
+
+A store has two segments: a frozen segment (typically a read-only memory
+map of a snapshot file, shared through the page cache by every process that
+maps it) and an in-memory tail for strings appended since.
+"""
+
+from __future__ import annotations
+
+from array import array
+from pathlib import Path
+
+import numpy as np
+
+
+class ChunkStore:
+    """Indexable, append-only sequence of strings backed by byte buffers."""
+
+    def __init__(self, blob=b"", offsets: np.ndarray | None = None):
+        # Frozen segment: string i is blob[offsets[i]:offsets[i + 1]]
+        self._blob = blob
+        self._offsets = offsets if offsets is not None else np.zeros(1, dtype=np.int64)
+        self._frozen = len(self._offsets) - 1
+
+        # Tail segment
+        self._tail = bytearray()
+        self._tail_offsets = array("q", [0])
+
+    @classmethod
+    def open(cls, blob_path: Path, offsets_path: Path) -> ChunkStore:
+        """Memory-map a store written by `write`."""
+        offsets = np.load(offsets_path, mmap_mode="r")
+        blob = np.memmap(blob_path, dtype=np.uint8, mode="r") if offsets[-1] else b""
+        return cls(blob, offsets)
+
+    def __len__(self) -> int:
+        return self._frozen + len(self._tail_offsets) - 1
+
+    def append(self, value: str) -> int:
+        """Append a string and return its index."""
+        self._tail += value.encode("utf-8")
+        self._tail_offsets.append(len(self._tail))
+        return len(self) - 1
+
+    def get_bytes(self, index: int) -> bytes:
+        if index < self._frozen:
+            return bytes(self._blob[self._offsets[index]:self._offsets[index + 1]])
+        i = index - self._frozen
+        return bytes(self._tail[self._tail_offsets[i]:self._tail_offsets[i + 1]])
+
+    def __getitem__(self, index: int) -> str:
+        return self.get_bytes(index).decode("utf-8")
+
+    def take(self, indices: list[int]) -> ChunkStore:
+        """Return a new in-memory store with the given entries, in order."""
+        store = ChunkStore()
+        for i in indices:
+            store._tail += self.get_bytes(i)
+            store._tail_offsets.append(len(store._tail))
+        return store
+
+    def write(self, blob_path: Path, offsets_path: Path):
+        """Write both segments as one blob file plus an offsets array."""
+        tail_offsets = np.frombuffer(self._tail_offsets, dtype=np.int64)
+        frozen_end = int(self._offsets[-1])
+        offsets = np.concatenate((self._offsets, tail_offsets[1:] + frozen_end))
+        np.save(offsets_path, offsets)
+        with open(blob_path, "wb") as f:
+            f.write(memoryview(self._blob)[:frozen_end])
+            f.write(self._tail)
+
+    def snapshot(self) -> ChunkStore:
+        """
+        Return a read-only copy that later appends do not affect.
+
+        The frozen segment is shared, only the tail is copied.
+        """
+        store = ChunkStore(self._blob, self._offsets)
+        store._tail = bytearray(self._tail)
+        store._tail_offsets = array("q", self._tail_offsets)
+        return store
@@ -3,13 +3,22 @@ TenderWriter — Semantic Chunker
 
 Splits documents into semantically coherent chunks by detecting topic shifts
 using embedding similarity between consecutive sentences/paragraphs.
+
+The sentence embeddings computed for boundary detection can be handed on to
+indexing (`embedding_reuse`): "mean" gives every chunk the normalized mean of
+its sentence vectors, "selective" does so only for chunks up to
+`reencode_min_chars` and leaves longer chunks to be re-encoded. Chunks
+without a vector are embedded from scratch by the dense retriever.
 """
 
 from __future__ import annotations
 
 import re
 from dataclasses import dataclass, field
+from itertools import islice
+from typing import Iterable, Iterator
 
+import numpy as np
 import structlog
 
 logger = structlog.get_logger()
@@ -24,6 +33,8 @@ class ChunkMetadata:
     page_number: int | None = None
     chunk_index: int = 0
     doc_type: str = ""
+    # Stable id from document + content hash, set at ingestion (see versioning)
+    chunk_id: str = ""
     extra: dict = field(default_factory=dict)
 
 
@@ -32,6 +43,8 @@ class TextChunk:
     """A chunk of text with metadata."""
     text: str
     metadata: ChunkMetadata
+    # Index vector derived from the sentence embeddings, if reused
+    embedding: np.ndarray | None = None
 
 
 class SemanticChunker:
@@ -41,10 +54,20 @@ class SemanticChunker:
     Uses a sliding window to detect topic boundaries by measuring cosine
     similarity of embeddings between consecutive groups of sentences.
     When similarity drops below a threshold, a chunk boundary is inserted.
+    A chunk is also closed before it would exceed `max_chunk_size`.
+
+    `iter_chunks` streams chunks from page/element texts with bounded
+    memory; `chunk_text` is the list-returning form for a single text.
 
     Falls back to fixed-size chunking if embeddings are unavailable.
+
+    `boundary_embedder` optionally replaces `embedder` for boundary detection
+    (e.g. a smaller model). Its vectors live in a different space than the
+    index, so they are never reused as chunk vectors.
     """
 
+    EMBEDDING_REUSE_MODES = ("off", "mean", "selective")
+
     def __init__(
         self,
         embedder=None,
@@ -52,25 +75,28 @@ class SemanticChunker:
         max_chunk_size: int = 1500,
         similarity_threshold: float = 0.5,
         overlap_sentences: int = 1,
+        boundary_embedder=None,
+        embedding_reuse: str = "off",
+        reencode_min_chars: int = 1000,
+        embed_window: int = 256,
     ):
+        if embedding_reuse not in self.EMBEDDING_REUSE_MODES:
+            raise ValueError(f"Unknown embedding_reuse mode: {embedding_reuse!r}")
         self.embedder = embedder
+        self.boundary_embedder = boundary_embedder
         self.min_chunk_size = min_chunk_size
         self.max_chunk_size = max_chunk_size
         self.similarity_threshold = similarity_threshold
         self.overlap_sentences = overlap_sentences
+        self.embedding_reuse = embedding_reuse
+        self.reencode_min_chars = reencode_min_chars
+        self.embed_window = max(2, embed_window)
 
     def _split_sentences(self, text: str) -> list[str]:
         """Split text into sentences using regex."""
         sentences = re.split(r'(?<=[.!?])\s+', text.strip())
         return [s.strip() for s in sentences if s.strip()]
 
-    def _cosine_similarity(self, vec_a, vec_b) -> float:
-        """Compute cosine similarity between two vectors."""
-        import numpy as np
-        dot = np.dot(vec_a, vec_b)
-        norm = np.linalg.norm(vec_a) * np.linalg.norm(vec_b)
-        return float(dot / norm) if norm > 0 else 0.0
-
     def chunk_text(
         self,
         text: str,
@@ -86,98 +112,128 @@ class SemanticChunker:
             return []
 
         metadata = metadata or ChunkMetadata()
-        sentences = self._split_sentences(text)
-
-        if len(sentences) <= 1:
+        if len(self._split_sentences(text)) <= 1:
             return [TextChunk(text=text.strip(), metadata=metadata)]
 
-        # If no embedder, use fixed-size chunking
-        if self.embedder is None:
-            return self._fixed_size_chunk(sentences, metadata)
-
-        return self._semantic_chunk(sentences, metadata)
+        return list(self.iter_chunks([text], metadata))
 
-    def _semantic_chunk(
+    def iter_chunks(
         self,
-        sentences: list[str],
-        base_metadata: ChunkMetadata,
-    ) -> list[TextChunk]:
-        """Chunk using embedding similarity to detect topic shifts."""
-        import numpy as np
-
-        # Embed all sentences in batch
-        embeddings = self.embedder.embed_batch(sentences)
-
-        # Find split points by measuring similarity between consecutive sentences
-        split_points: list[int] = []
-        for i in range(1, len(sentences)):
-            sim = self._cosine_similarity(embeddings[i - 1], embeddings[i])
-            if sim < self.similarity_threshold:
-                split_points.append(i)
+        texts: Iterable[str],
+        metadata: ChunkMetadata | None = None,
+    ) -> Iterator[TextChunk]:
+        """
+        Stream chunks from a sequence of text pieces (pages, parsed elements).
 
-        # Build chunks from split points
-        chunks: list[TextChunk] = []
-        start = 0
-        for split_idx in split_points:
-            chunk_text = " ".join(sentences[start:split_idx])
-
-            # Enforce min/max size constraints
-            if len(chunk_text) < self.min_chunk_size and chunks:
-                # Merge with previous chunk if too small
-                prev = chunks[-1]
-                prev.text = prev.text + " " + chunk_text
-                # Enforce max size — if merged chunk too big, keep separate
-                if len(prev.text) > self.max_chunk_size:
-                    prev.text = prev.text[: -len(chunk_text) - 1]
-                    meta = ChunkMetadata(**{
-                        k: v for k, v in base_metadata.__dict__.items()
-                    })
-                    meta.chunk_index = len(chunks)
-                    chunks.append(TextChunk(text=chunk_text, metadata=meta))
-            else:
-                meta = ChunkMetadata(**{k: v for k, v in base_metadata.__dict__.items()})
-                meta.chunk_index = len(chunks)
-                chunks.append(TextChunk(text=chunk_text, metadata=meta))
+        Sentences are embedded in windows of `embed_window`, and memory stays
+        bounded by one window plus the chunk being built, whatever the
+        document size. Chunks are yielded as soon as they are final.
+        """
+        metadata = metadata or ChunkMetadata()
+        sentences = (s for text in texts for s in self._split_sentences(text))
 
-            start = split_idx
+        if self.embedder is None:
+            yield from self._iter_fixed_size(sentences, metadata)
+        else:
+            yield from self._iter_semantic(sentences, metadata)
 
-        # Remaining text
-        if start < len(sentences):
-            remaining = " ".join(sentences[start:])
-            if remaining.strip():
-                meta = ChunkMetadata(**{k: v for k, v in base_metadata.__dict__.items()})
-                meta.chunk_index = len(chunks)
-                chunks.append(TextChunk(text=remaining, metadata=meta))
-
-        # Final pass: split any chunks that exceed max_chunk_size
-        final_chunks = []
-        for chunk in chunks:
-            if len(chunk.text) > self.max_chunk_size:
-                sub_chunks = self._split_oversized(chunk.text, base_metadata, len(final_chunks))
-                final_chunks.extend(sub_chunks)
+    def _iter_semantic(
+        self,
+        sentences: Iterator[str],
+        base_metadata: ChunkMetadata,
+    ) -> Iterator[TextChunk]:
+        """Chunk using embedding similarity to detect topic shifts."""
+        embedder = self.boundary_embedder or self.embedder
+        reuse = self.embedding_reuse != "off" and self.boundary_embedder is None
+
+        # The open segment (sentences since the last boundary) and the last
+        # closed chunk, which a following small segment may still merge into
+        segment = _Span()
+        pending: _Span | None = None
+        index = 0
+        previous: np.ndarray | None = None
+
+        for window in _batched(sentences, self.embed_window):
+            embeddings = embedder.embed_batch(window)
+            # Vectors are normalized: adjacent cosine similarity is a row-wise dot
+            if previous is None:
+                sims = np.einsum("ij,ij->i", embeddings[:-1], embeddings[1:])
+                sims = np.concatenate(([np.inf], sims))
             else:
-                chunk.metadata.chunk_index = len(final_chunks)
-                final_chunks.append(chunk)
-
-        logger.debug("Semantic chunking complete", num_chunks=len(final_chunks))
-        return final_chunks
-
-    def _fixed_size_chunk(
+                joined = np.vstack((previous[None, :], embeddings))
+                sims = np.einsum("ij,ij->i", joined[:-1], joined[1:])
+            previous = embeddings[-1]
+            # Forced closes (see below) only matter where there is no boundary
+            boundaries = (sims < self.similarity_threshold).tolist()
+
+            for sentence, vector, boundary in zip(window, embeddings, boundaries):
+                # Close the segment at a topic shift, or before it would outgrow
+                # max_chunk_size, which also bounds memory for uniform text
+                if segment.sentences and (
+                    boundary or segment.length + 1 + len(sentence) > self.max_chunk_size
+                ):
+                    if pending is not None and segment.length < self.min_chunk_size and (
+                        pending.length + 1 + segment.length <= self.max_chunk_size
+                    ):
+                        # Merge a too-small segment into the previous chunk
+                        pending.extend(segment)
+                    else:
+                        if pending is not None:
+                            for chunk in self._emit(pending, base_metadata, index, reuse):
+                                index += 1
+                                yield chunk
+                        pending = segment
+                    segment = _Span()
+                segment.add(sentence, vector if reuse else None)
+
+        for span in (pending, segment):
+            if span is not None and span.sentences:
+                for chunk in self._emit(span, base_metadata, index, reuse):
+                    index += 1
+                    yield chunk
+
+        logger.debug("Semantic chunking complete", num_chunks=index)
+
+    def _emit(
         self,
-        sentences: list[str],
+        span: _Span,
         base_metadata: ChunkMetadata,
+        index: int,
+        reuse: bool,
     ) -> list[TextChunk]:
-        """Fallback: chunk by accumulating sentences up to max_chunk_size."""
-        chunks: list[TextChunk] = []
+        """Turn a closed span into chunks, splitting it if oversized."""
+        text = " ".join(span.sentences)
+        if len(text) > self.max_chunk_size:
+            return self._split_oversized(text, base_metadata, index)
+
+        meta = ChunkMetadata(**{k: v for k, v in base_metadata.__dict__.items()})
+        meta.chunk_index = index
+        chunk = TextChunk(text=text, metadata=meta)
+        # Hand sentence vectors on to indexing ("selective": short chunks only)
+        if reuse and not (
+            self.embedding_reuse == "selective" and len(text) > self.reencode_min_chars
+        ):
+            norm = np.linalg.norm(span.vector_sum)
+            chunk.embedding = span.vector_sum / norm if norm > 0 else span.vector_sum
+        return [chunk]
+
+    def _iter_fixed_size(
+        self,
+        sentences: Iterator[str],
+        base_metadata: ChunkMetadata,
+    ) -> Iterator[TextChunk]:
+        """Accumulate sentences up to max_chunk_size, with sentence overlap."""
         current_sentences: list[str] = []
         current_len = 0
+        index = 0
 
         for sentence in sentences:
             if current_len + len(sentence) > self.max_chunk_size and current_sentences:
                 text = " ".join(current_sentences)
                 meta = ChunkMetadata(**{k: v for k, v in base_metadata.__dict__.items()})
-                meta.chunk_index = len(chunks)
-                chunks.append(TextChunk(text=text, metadata=meta))
+                meta.chunk_index = index
+                index += 1
+                yield TextChunk(text=text, metadata=meta)
 
                 # Overlap: carry forward last N sentences
                 current_sentences = current_sentences[-self.overlap_sentences:]
@@ -190,11 +246,11 @@ class SemanticChunker:
         if current_sentences:
             text = " ".join(current_sentences)
             meta = ChunkMetadata(**{k: v for k, v in base_metadata.__dict__.items()})
-            meta.chunk_index = len(chunks)
-            chunks.append(TextChunk(text=text, metadata=meta))
+            meta.chunk_index = index
+            index += 1
+            yield TextChunk(text=text, metadata=meta)
 
-        logger.debug("Fixed-size chunking complete", num_chunks=len(chunks))
-        return chunks
+        logger.debug("Fixed-size chunking complete", num_chunks=index)
 
     def _split_oversized(
         self,
@@ -227,3 +283,36 @@ class SemanticChunker:
             chunks.append(TextChunk(text=chunk_text, metadata=meta))
 
         return chunks
+
+
+class _Span:
+    """Sentences of a chunk under construction, with their running vector sum."""
+
+    __slots__ = ("sentences", "length", "vector_sum")
+
+    def __init__(self):
+        self.sentences: list[str] = []
+        self.length = -1  # joined length; the first sentence adds no separator
+        self.vector_sum: np.ndarray | None = None
+
+    def add(self, sentence: str, vector: np.ndarray | None):
+        self.sentences.append(sentence)
+        self.length += len(sentence) + 1
+        if vector is not None:
+            self.vector_sum = vector.copy() if self.vector_sum is None else self.vector_sum + vector
+
+    def extend(self, other: _Span):
+        self.sentences.extend(other.sentences)
+        self.length += other.length + 1
+        if other.vector_sum is not None:
+            self.vector_sum = (
+                other.vector_sum.copy() if self.vector_sum is None
+                else self.vector_sum + other.vector_sum
+            )
+
+
+def _batched(items: Iterable[str], size: int) -> Iterator[list[str]]:
+    """Yield lists of up to `size` consecutive items."""
+    iterator = iter(items)
+    while batch := list(islice(iterator, size)):
+        yield batch
@@ -0,0 +1,226 @@
+"""
+TenderWriter — Near-Duplicate Chunk Detection
+
+Finds near-duplicate chunks at ingestion (legal boilerplate, company
+overviews, CV templates) so each one is stored and embedded once.
+
+Chunks are fingerprinted with MinHash over word shingles, and candidates are
+found by LSH banding. The band keys and the signature are stored in the Qdrant
+payload of each chunk, so lookups are a payload-index query. Because that state
+lives in Qdrant, it survives restarts and is shared by every worker. Candidates
+are confirmed by their estimated Jaccard similarity and then by the content
+hash of their whitespace-normalized text. A chunk that differs from a stored
+one by a single token (a price, a client or a name) is close to it, but it is
+not the same content and is indexed on its own.
+
+A duplicate is not indexed again. Its source (document, type, file, chunk
+index, chunk id) is appended to the `duplicate_sources` payload of the stored
+chunk, and metadata filters on those fields also match the sources (see
+app.rag.filters).
+
+When a document is re-ingested, the chunks stored for its previous version
+are excluded from the candidates: an edited chunk is close to the text it
+replaces, but must be indexed with its new text rather than matched to the old.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+from collections.abc import Collection
+from dataclasses import dataclass, field
+
+import numpy as np
+import structlog
+
+from app.config import settings
+from app.rag.versioning import content_hash
+
+logger = structlog.get_logger()
+
+# Payload keys used for dedup bookkeeping, not part of the chunk metadata
+SIGNATURE_KEY = "minhash"
+BANDS_KEY = "minhash_bands"
+TEXT_HASH_KEY = "text_hash"
+SOURCES_KEY = "duplicate_sources"
+# Chunk metadata fields copied into each duplicate source reference
+SOURCE_FIELDS = ("document_id", "doc_type", "source_file")
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+class MinHasher:
+    """MinHash signatures and LSH band keys for texts."""
+
+    def __init__(self, num_perm: int, bands: int, shingle_size: int, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+
+        # Multiply-shift hash family: h_i(x) = ((x ^ seed_i) * mult_i) >> 32
+        rng = np.random.default_rng(seed)
+        self._seeds = rng.integers(0, 2**63, size=num_perm, dtype=np.uint64)
+        self._mults = rng.integers(0, 2**63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+
+    def signature(self, text: str) -> np.ndarray:
+        """MinHash signature (uint32 per permutation) of the text's word shingles."""
+        tokens = _TOKEN_RE.findall(text.lower())
+        k = self.shingle_size
+        if len(tokens) <= k:
+            shingles = {" ".join(tokens)}
+        else:
+            shingles = {" ".join(tokens[i:i + k]) for i in range(len(tokens) - k + 1)}
+
+        hashes = np.fromiter(
+            (
+                int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little")
+                for s in shingles
+            ),
+            dtype=np.uint64,
+            count=len(shingles),
+        )
+        mixed = (hashes[:, None] ^ self._seeds[None, :]) * self._mults[None, :]
+        permuted = mixed >> np.uint64(32)
+        return permuted.min(axis=0).astype(np.uint32)
+
+    def band_keys(self, signature: np.ndarray) -> list[str]:
+        """One LSH key per band; near-duplicates share at least one with high probability."""
+        keys = []
+        for band in range(self.bands):
+            rows = signature[band * self.rows:(band + 1) * self.rows]
+            digest = hashlib.blake2b(rows.tobytes(), digest_size=8).hexdigest()
+            keys.append(f"{band}:{digest}")
+        return keys
+
+    @staticmethod
+    def similarity(a: np.ndarray, b: np.ndarray) -> float:
+        """Estimated Jaccard similarity of two signatures."""
+        return float(np.mean(a == b))
+
+
+@dataclass
+class DedupPlan:
+    """How one batch of chunks maps onto stored and new chunks."""
+    unique: list[int] = field(default_factory=list)
+    # Dedup payload (signature, bands, text hash, in-batch sources) per unique chunk
+    payloads: list[dict] = field(default_factory=list)
+    # Batch index of a duplicate -> batch index of its unique chunk
+    in_batch: dict[int, int] = field(default_factory=dict)
+    # Batch index of a duplicate -> id of the already stored chunk
+    existing: dict[int, str] = field(default_factory=dict)
+    # Stored point id -> source references to append
+    existing_sources: dict[str, list[dict]] = field(default_factory=dict)
+
+
+class ChunkDeduplicator:
+    """Plans which chunks of a batch to store, and which are near-duplicates."""
+
+    def __init__(
+        self,
+        dense_retriever,
+        hasher: MinHasher | None = None,
+        threshold: float | None = None,
+    ):
+        self.dense_retriever = dense_retriever
+        self.hasher = hasher or MinHasher(
+            num_perm=settings.dedup_num_perm,
+            bands=settings.dedup_bands,
+            shingle_size=settings.dedup_shingle_size,
+        )
+        self.threshold = settings.dedup_threshold if threshold is None else threshold
+
+    @staticmethod
+    def source_ref(metadata: dict) -> dict:
+        """Reference to where a duplicate copy came from."""
+        return {
+            **{key: metadata.get(key) for key in SOURCE_FIELDS},
+            "chunk_index": metadata.get("chunk_index"),
+            "chunk_id": metadata.get("chunk_id", ""),
+        }
+
+    async def plan(
+        self,
+        texts: list[str],
+        metadatas: list[dict],
+        collection: str,
+        exclude: Collection[str] = (),
+    ) -> DedupPlan:
+        """
+        Match a batch against itself and against the stored chunks.
+
+        Stored points in `exclude` (the previous version of a re-ingested
+        document) are never matched, and neither are stored points without a
+        text hash (indexed before it was recorded).
+        """
+        signatures = [self.hasher.signature(t) for t in texts]
+        band_keys = [self.hasher.band_keys(s) for s in signatures]
+        digests = [content_hash(t) for t in texts]
+
+        stored = await self.dense_retriever.find_by_minhash_bands(
+            sorted({key for keys in band_keys for key in keys}),
+            collection,
+        )
+        stored_by_band: dict[str, list[tuple[str, np.ndarray, str | None]]] = {}
+        for point_id, signature, keys, digest in stored:
+            if point_id in exclude:
+                continue
+            for key in keys:
+                stored_by_band.setdefault(key, []).append((point_id, signature, digest))
+
+        plan = DedupPlan()
+        batch_by_band: dict[str, list[tuple[int, np.ndarray, str]]] = {}
+        payload_of: dict[int, dict] = {}
+        for i, (signature, keys, digest) in enumerate(zip(signatures, band_keys, digests)):
+            point_id = self._match(signature, digest, keys, stored_by_band)
+            if point_id is not None:
+                plan.existing[i] = point_id
+                plan.existing_sources.setdefault(point_id, []).append(self.source_ref(metadatas[i]))
+                continue
+
+            unique_idx = self._match(signature, digest, keys, batch_by_band)
+            if unique_idx is not None:
+                plan.in_batch[i] = unique_idx
+                payload_of[unique_idx][SOURCES_KEY].append(self.source_ref(metadatas[i]))
+                continue
+
+            plan.unique.append(i)
+            payload_of[i] = {
+                SIGNATURE_KEY: signature.tolist(),
+                BANDS_KEY: keys,
+                TEXT_HASH_KEY: digest,
+                SOURCES_KEY: [],
+            }
+            plan.payloads.append(payload_of[i])
+            for key in keys:
+                batch_by_band.setdefault(key, []).append((i, signature, digest))
+
+        if plan.in_batch or plan.existing:
+            logger.info(
+                "Near-duplicate chunks found",
+                chunks=len(texts),
+                in_batch=len(plan.in_batch),
+                already_stored=len(plan.existing),
+            )
+        return plan
+
+    def _match(self, signature, digest, keys, candidates_by_band):
+        """
+        Id of a candidate sharing a band with `signature` above the threshold
+        whose normalized text is the same (equal content hash), else None.
+
+        Candidates are (id, signature, content hash) tuples.
+        """
+        seen = set()
+        for key in keys:
+            for cid, candidate_signature, candidate_digest in candidates_by_band.get(key, ()):
+                if cid in seen:
+                    continue
+                seen.add(cid)
+                if candidate_digest == digest and (
+                    self.hasher.similarity(signature, candidate_signature) >= self.threshold
+                ):
+                    return cid
+        return None
@@ -3,29 +3,55 @@ TenderWriter — Dense Retriever (Vector Search via Qdrant)
 
 Performs semantic similarity search using dense vector embeddings
 stored in Qdrant collections.
+
+Uses `AsyncQdrantClient` over one persistent, pooled connection, so
+concurrent queries overlap their Qdrant round-trips instead of blocking the
+event loop. Embedding stays CPU-bound and runs on an executor.
+
+Collections get payload indexes on the fields we filter and delete by, and
+the HNSW / quantization / on-disk layout from settings. Collections created
+with older settings are migrated in place on startup.
 """
 
 from __future__ import annotations
 
+import asyncio
 import uuid
-from dataclasses import dataclass
+from collections import deque
+from concurrent.futures import Executor
+from typing import AsyncIterator
 
+import httpx
+import numpy as np
 import structlog
-from qdrant_client import QdrantClient, models
+from qdrant_client import AsyncQdrantClient, models
 
 from app.config import settings
+from app.rag.candidate import Candidate
+from app.rag.dedup import BANDS_KEY, SIGNATURE_KEY, SOURCES_KEY, TEXT_HASH_KEY
 from app.rag.embedder import Embedder
+from app.rag.filters import MetadataFilter, source_key
+from app.rag.fingerprint import FINGERPRINT_FIELDS, chunk_digest, combine
 
 logger = structlog.get_logger()
 
+# Payload keys that are bookkeeping rather than chunk metadata
+_INTERNAL_KEYS = frozenset({"text", SIGNATURE_KEY, BANDS_KEY, TEXT_HASH_KEY})
+
+
+def _metadata(payload: dict) -> dict:
+    """Chunk metadata from a point payload."""
+    return {k: v for k, v in payload.items() if k not in _INTERNAL_KEYS}
 
-@dataclass
-class DenseSearchResult:
-    """A single result from dense vector search."""
-    text: str
-    score: float
-    metadata: dict
-    point_id: str
+
+def _owned_key(point) -> str:
+    """Chunk id of a point for its owner (point id for chunks without one)."""
+    return point.payload.get("chunk_id") or str(point.id)
+
+
+def _ref_key(point, ref: dict) -> str:
+    """Chunk id of a duplicate source reference."""
+    return ref.get("chunk_id") or f"{point.id}#{ref.get('chunk_index')}"
 
 
 class DenseRetriever:
@@ -36,83 +62,267 @@ class DenseRetriever:
     document chunk embeddings.
     """
 
-    def __init__(self, embedder: Embedder):
+    COLLECTIONS = ("documents", "content_blocks")
+
+    # Payload fields used by metadata filters and delete_by_document
+    PAYLOAD_INDEXES = {
+        "document_id": models.PayloadSchemaType.INTEGER,
+        "doc_type": models.PayloadSchemaType.KEYWORD,
+        BANDS_KEY: models.PayloadSchemaType.KEYWORD,
+        source_key("document_id"): models.PayloadSchemaType.INTEGER,
+        source_key("doc_type"): models.PayloadSchemaType.KEYWORD,
+    }
+
+    def __init__(self, embedder: Embedder, executor: Executor | None = None):
         self.embedder = embedder
-        self.client: QdrantClient | None = None
+        # Runs the (synchronous) embedding calls; None uses the loop default
+        self.executor = executor
+        self.client: AsyncQdrantClient | None = None
         self.collection_prefix = settings.qdrant_collection_prefix
 
     async def initialize(self):
         """Connect to Qdrant and ensure collections exist."""
-        self.client = QdrantClient(
+        if settings.qdrant_prefer_grpc:
+            transport_options = {}
+        else:
+            # Keep-alive pool shared by all concurrent REST requests
+            transport_options = {
+                "limits": httpx.Limits(
+                    max_connections=settings.qdrant_max_connections,
+                    max_keepalive_connections=settings.qdrant_max_connections,
+                ),
+            }
+
+        self.client = AsyncQdrantClient(
             host=settings.qdrant_host,
             port=settings.qdrant_port,
+            grpc_port=settings.qdrant_grpc_port,
+            prefer_grpc=settings.qdrant_prefer_grpc,
             api_key=settings.qdrant_api_key or None,
+            timeout=settings.qdrant_timeout,
+            **transport_options,
+        )
+        logger.info(
+            "Connected to Qdrant",
+            host=settings.qdrant_host,
+            port=settings.qdrant_grpc_port if settings.qdrant_prefer_grpc else settings.qdrant_port,
+            grpc=settings.qdrant_prefer_grpc,
         )
-        logger.info("Connected to Qdrant", host=settings.qdrant_host, port=settings.qdrant_port)
 
         # Create default collections if they don't exist
-        for collection_name in ["documents", "content_blocks"]:
+        for collection_name in self.COLLECTIONS:
             await self._ensure_collection(collection_name)
 
     async def _ensure_collection(self, name: str):
-        """Create a Qdrant collection if it doesn't exist."""
+        """Create a Qdrant collection if it doesn't exist, or migrate its layout."""
         full_name = f"{self.collection_prefix}{name}"
-        collections = self.client.get_collections().collections
-        existing = [c.name for c in collections]
+        quantization = self._quantization_config()
 
-        if full_name not in existing:
-            self.client.create_collection(
+        if not await self.client.collection_exists(full_name):
+            await self.client.create_collection(
                 collection_name=full_name,
                 vectors_config=models.VectorParams(
                     size=self.embedder.dimension,
                     distance=models.Distance.COSINE,
+                    on_disk=settings.qdrant_on_disk_vectors,
                 ),
+                hnsw_config=models.HnswConfigDiff(
+                    m=settings.qdrant_hnsw_m,
+                    ef_construct=settings.qdrant_hnsw_ef_construct,
+                ),
+                quantization_config=quantization,
             )
             logger.info("Created Qdrant collection", collection=full_name)
+        else:
+            await self._migrate_collection(full_name, quantization)
+
+        await self._ensure_payload_indexes(full_name)
+
+    async def _migrate_collection(self, full_name: str, quantization):
+        """Bring an existing collection's HNSW, quantization and storage settings up to date."""
+        config = (await self.client.get_collection(full_name)).config
+        update: dict = {}
+
+        hnsw = config.hnsw_config
+        wanted_hnsw = (settings.qdrant_hnsw_m, settings.qdrant_hnsw_ef_construct)
+        if (hnsw.m, hnsw.ef_construct) != wanted_hnsw:
+            update["hnsw_config"] = models.HnswConfigDiff(
+                m=settings.qdrant_hnsw_m,
+                ef_construct=settings.qdrant_hnsw_ef_construct,
+            )
+
+        if type(config.quantization_config) is not type(quantization):
+            update["quantization_config"] = quantization or models.Disabled.DISABLED
+
+        vectors = config.params.vectors
+        if (
+            isinstance(vectors, models.VectorParams)
+            and bool(vectors.on_disk) != settings.qdrant_on_disk_vectors
+        ):
+            update["vectors_config"] = {
+                "": models.VectorParamsDiff(on_disk=settings.qdrant_on_disk_vectors),
+            }
+
+        if update:
+            await self.client.update_collection(collection_name=full_name, **update)
+            logger.info("Migrated Qdrant collection", collection=full_name, changed=sorted(update))
+
+    async def _ensure_payload_indexes(self, full_name: str):
+        """Create the payload indexes that are missing from a collection."""
+        info = await self.client.get_collection(full_name)
+        existing = info.payload_schema or {}
+        for field_name, schema in self.PAYLOAD_INDEXES.items():
+            if field_name in existing:
+                continue
+            await self.client.create_payload_index(
+                collection_name=full_name,
+                field_name=field_name,
+                field_schema=schema,
+                wait=True,
+            )
+            logger.info("Created Qdrant payload index", collection=full_name, field=field_name)
+
+    @staticmethod
+    def _quantization_config():
+        """Build the quantization config selected by `qdrant_quantization`."""
+        mode = settings.qdrant_quantization.lower()
+        if mode == "int8":
+            return models.ScalarQuantization(
+                scalar=models.ScalarQuantizationConfig(
+                    type=models.ScalarType.INT8,
+                    quantile=0.99,
+                    always_ram=True,
+                )
+            )
+        if mode == "binary":
+            return models.BinaryQuantization(
+                binary=models.BinaryQuantizationConfig(always_ram=True)
+            )
+        if mode == "none":
+            return None
+        raise ValueError(f"Unknown qdrant_quantization: {settings.qdrant_quantization!r}")
+
+    @staticmethod
+    def _search_params() -> models.SearchParams:
+        """Search-time HNSW and quantization parameters."""
+        quantization = None
+        if settings.qdrant_quantization.lower() != "none":
+            quantization = models.QuantizationSearchParams(
+                rescore=settings.qdrant_quantization_rescore,
+                oversampling=settings.qdrant_quantization_oversampling,
+            )
+        return models.SearchParams(hnsw_ef=settings.qdrant_hnsw_ef, quantization=quantization)
 
-    def index_chunks(
+    async def _run_sync(self, func, *args):
+        """Run a synchronous (CPU-bound) call on the executor."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, func, *args)
+
+    async def index_chunks(
         self,
         texts: list[str],
         metadatas: list[dict],
         collection: str = "documents",
+        embeddings: list[np.ndarray | None] | None = None,
+        extra_payloads: list[dict] | None = None,
     ) -> list[str]:
         """
-        Index a batch of text chunks into Qdrant.
+        Index text chunks into Qdrant.
+
+        `embeddings` may carry precomputed vectors (e.g. pooled from the
+        chunker's sentence embeddings); only chunks without one are embedded.
+        `extra_payloads` are merged into the stored payloads but are not
+        chunk metadata (e.g. dedup fingerprints).
+
+        Chunks are embedded and upserted in batches of
+        `qdrant_upsert_batch_size`. Batch N+1 is embedded while batch N is
+        being upserted with `wait=False`, with at most
+        `qdrant_upsert_max_in_flight` upserts outstanding. Peak memory
+        therefore does not grow with document size. The last batch is
+        upserted with `wait=True` once every earlier batch has been
+        acknowledged, so all points are searchable on return.
 
         Returns a list of point IDs for each indexed chunk.
         """
         full_name = f"{self.collection_prefix}{collection}"
-        embeddings = self.embedder.embed_batch(texts)
-        point_ids = [str(uuid.uuid4()) for _ in texts]
-
-        points = [
-            models.PointStruct(
-                id=point_id,
-                vector=embedding.tolist(),
-                payload={"text": text, **metadata},
-            )
-            for point_id, embedding, text, metadata in zip(
-                point_ids, embeddings, texts, metadatas
-            )
-        ]
+        batch_size = max(1, settings.qdrant_upsert_batch_size)
+        max_in_flight = max(1, settings.qdrant_upsert_max_in_flight)
+        # Stable chunk ids (see versioning) double as point ids
+        point_ids = [metadata.get("chunk_id") or str(uuid.uuid4()) for metadata in metadatas]
+        in_flight: deque[asyncio.Task] = deque()
+
+        try:
+            for start in range(0, len(texts), batch_size):
+                end = start + batch_size
+                vectors = await self._embed_missing(
+                    texts[start:end],
+                    embeddings[start:end] if embeddings is not None else None,
+                )
+                points = [
+                    models.PointStruct(
+                        id=point_id,
+                        vector=embedding.tolist(),
+                        payload={"text": text, **metadata, **extra},
+                    )
+                    for point_id, embedding, text, metadata, extra in zip(
+                        point_ids[start:end],
+                        vectors,
+                        texts[start:end],
+                        metadatas[start:end],
+                        extra_payloads[start:end] if extra_payloads else [{}] * (end - start),
+                    )
+                ]
+                del vectors
+
+                if end >= len(texts):
+                    # Final batch: drain, then wait until everything is applied
+                    while in_flight:
+                        await in_flight.popleft()
+                    await self.client.upsert(collection_name=full_name, points=points, wait=True)
+                    break
+
+                while len(in_flight) >= max_in_flight:
+                    await in_flight.popleft()
+                in_flight.append(asyncio.create_task(
+                    self.client.upsert(collection_name=full_name, points=points, wait=False)
+                ))
+        finally:
+            for task in in_flight:
+                task.cancel()
 
-        # Batch upsert (Qdrant handles batching internally)
-        self.client.upsert(collection_name=full_name, points=points)
         logger.info(
             "Indexed chunks into Qdrant",
             collection=full_name,
-            count=len(points),
+            count=len(point_ids),
+            batches=-(-len(texts) // batch_size),
         )
 
         return point_ids
 
-    def search(
+    async def _embed_missing(
+        self,
+        texts: list[str],
+        precomputed: list[np.ndarray | None] | None,
+    ) -> list[np.ndarray]:
+        """Embed the texts that have no precomputed vector."""
+        if precomputed is None:
+            return list(await self._run_sync(self.embedder.embed_batch, texts))
+
+        vectors = list(precomputed)
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        if missing:
+            computed = await self._run_sync(self.embedder.embed_batch, [texts[i] for i in missing])
+            for i, vector in zip(missing, computed):
+                vectors[i] = vector
+        return vectors
+
+    async def search(
         self,
         query: str,
         top_k: int | None = None,
         collection: str = "documents",
-        filters: dict | None = None,
-    ) -> list[DenseSearchResult]:
+        filters: dict | MetadataFilter | None = None,
+    ) -> list[Candidate]:
         """
         Search for similar chunks using dense vector similarity.
 
@@ -123,73 +333,306 @@ class DenseRetriever:
             filters: Optional metadata filters (e.g., {"doc_type": "proposal"}).
 
         Returns:
-            List of DenseSearchResult ordered by similarity score (descending).
+            List of Candidate ordered by similarity score (descending).
         """
         top_k = top_k or settings.rag_top_k_dense
         full_name = f"{self.collection_prefix}{collection}"
 
-        query_embedding = self.embedder.embed_query(query)
+        query_embedding = await self.embedder.embed_query_async(query)
 
         # Build Qdrant filter conditions
-        qdrant_filter = None
-        if filters:
-            conditions = []
-            for key, value in filters.items():
-                if isinstance(value, list):
-                    conditions.append(
-                        models.FieldCondition(
-                            key=key,
-                            match=models.MatchAny(any=value),
-                        )
-                    )
-                else:
-                    conditions.append(
-                        models.FieldCondition(
-                            key=key,
-                            match=models.MatchValue(value=value),
-                        )
-                    )
-            qdrant_filter = models.Filter(must=conditions)
+        metadata_filter = MetadataFilter.compile(filters)
+        qdrant_filter = metadata_filter.to_qdrant() if metadata_filter else None
 
-        response = self.client.query_points(
+        response = await self.client.query_points(
             collection_name=full_name,
             query=query_embedding.tolist(),
             limit=top_k,
             query_filter=qdrant_filter,
+            search_params=self._search_params(),
         )
 
         search_results = [
-            DenseSearchResult(
-                text=hit.payload.get("text", ""),
-                score=hit.score,
-                metadata={k: v for k, v in hit.payload.items() if k != "text"},
-                point_id=str(hit.id),
-            )
+            Candidate.from_chunk(hit.payload.get("text", ""), _metadata(hit.payload), hit.score)
             for hit in response.points
         ]
 
         logger.debug("Dense search complete", query_len=len(query), results=len(search_results))
         return search_results
 
-    def delete_by_document(self, document_id: int, collection: str = "documents"):
-        """Delete all vectors associated with a specific document."""
+    async def count_chunks(self, collection: str | None = None) -> int:
+        """Count stored chunks in one collection, or in all default collections."""
+        names = [collection] if collection else self.COLLECTIONS
+        total = 0
+        for name in names:
+            result = await self.client.count(
+                collection_name=f"{self.collection_prefix}{name}",
+                exact=True,
+            )
+            total += result.count
+        return total
+
+    async def fingerprint_chunks(
+        self,
+        collection: str | None = None,
+        batch_size: int = 1000,
+    ) -> int:
+        """
+        Fingerprint of the stored chunks (see app.rag.fingerprint).
+
+        Only the identity fields of the payloads are read, not the texts.
+        """
+        names = [collection] if collection else self.COLLECTIONS
+        fingerprint = 0
+        for name in names:
+            offset = None
+            while True:
+                points, offset = await self.client.scroll(
+                    collection_name=f"{self.collection_prefix}{name}",
+                    limit=batch_size,
+                    offset=offset,
+                    with_payload=list(FINGERPRINT_FIELDS),
+                    with_vectors=False,
+                )
+                for point in points:
+                    fingerprint = combine(fingerprint, chunk_digest(point.payload))
+                if offset is None:
+                    break
+        return fingerprint
+
+    async def scroll_chunks(
+        self,
+        collection: str | None = None,
+        batch_size: int = 1000,
+    ) -> AsyncIterator[tuple[str, dict]]:
+        """
+        Iterate over (text, metadata) of every stored chunk.
+
+        Used to rebuild derived indexes (e.g. BM25) from the chunk payloads.
+        """
+        names = [collection] if collection else self.COLLECTIONS
+        for name in names:
+            offset = None
+            while True:
+                points, offset = await self.client.scroll(
+                    collection_name=f"{self.collection_prefix}{name}",
+                    limit=batch_size,
+                    offset=offset,
+                    with_payload=True,
+                    with_vectors=False,
+                )
+                for point in points:
+                    yield point.payload.get("text", ""), _metadata(point.payload)
+                if offset is None:
+                    break
+
+    async def find_by_minhash_bands(
+        self,
+        band_keys: list[str],
+        collection: str = "documents",
+    ) -> list[tuple[str, np.ndarray, list[str], str | None]]:
+        """
+        Stored chunks sharing any LSH band key:
+        (point_id, signature, band_keys, text hash or None).
+        """
+        if not band_keys:
+            return []
+        full_name = f"{self.collection_prefix}{collection}"
+        query_filter = models.Filter(
+            must=[models.FieldCondition(key=BANDS_KEY, match=models.MatchAny(any=band_keys))]
+        )
+
+        found = []
+        offset = None
+        while True:
+            points, offset = await self.client.scroll(
+                collection_name=full_name,
+                scroll_filter=query_filter,
+                limit=1000,
+                offset=offset,
+                with_payload=[SIGNATURE_KEY, BANDS_KEY, TEXT_HASH_KEY],
+                with_vectors=False,
+            )
+            for point in points:
+                signature = np.asarray(point.payload[SIGNATURE_KEY], dtype=np.uint32)
+                found.append((
+                    str(point.id),
+                    signature,
+                    point.payload[BANDS_KEY],
+                    point.payload.get(TEXT_HASH_KEY),
+                ))
+            if offset is None:
+                return found
+
+    async def add_duplicate_sources(
+        self,
+        sources_by_point: dict[str, list[dict]],
+        collection: str = "documents",
+    ) -> list[tuple[str, dict]]:
+        """
+        Append source references of near-duplicate copies to stored chunks.
+
+        Returns (text, metadata) of the updated chunks, so the BM25 index can
+        pick up their new sources.
+        """
+        if not sources_by_point:
+            return []
         full_name = f"{self.collection_prefix}{collection}"
-        self.client.delete(
+        points = await self.client.retrieve(
             collection_name=full_name,
-            points_selector=models.FilterSelector(
-                filter=models.Filter(
-                    must=[
-                        models.FieldCondition(
-                            key="document_id",
-                            match=models.MatchValue(value=document_id),
-                        )
-                    ]
-                )
-            ),
+            ids=list(sources_by_point),
+            with_payload=True,
+        )
+        updated = []
+        for point in points:
+            sources = list(point.payload.get(SOURCES_KEY) or []) + sources_by_point[str(point.id)]
+            await self.client.set_payload(
+                collection_name=full_name,
+                payload={SOURCES_KEY: sources},
+                points=[point.id],
+            )
+            payload = {**point.payload, SOURCES_KEY: sources}
+            updated.append((payload.get("text", ""), _metadata(payload)))
+        return updated
+
+    async def document_chunk_ids(
+        self,
+        document_id: int,
+        collection: str = "documents",
+    ) -> dict[str, str]:
+        """
+        Chunk ids stored for a document, mapped to their point ids.
+
+        Covers the chunks the document owns and those it shares as a
+        `duplicate_sources` entry. Chunks stored before chunk ids existed are
+        keyed by point id, so a re-ingest replaces them.
+        """
+        full_name = f"{self.collection_prefix}{collection}"
+        chunk_ids: dict[str, str] = {}
+        async for point in self._scroll_document(full_name, document_id):
+            payload = point.payload
+            if payload.get("document_id") == document_id:
+                chunk_ids[_owned_key(point)] = str(point.id)
+            for ref in payload.get(SOURCES_KEY) or ():
+                if ref.get("document_id") == document_id:
+                    chunk_ids[_ref_key(point, ref)] = str(point.id)
+        return chunk_ids
+
+    async def release_chunks(
+        self,
+        document_id: int,
+        chunk_ids: set[str] | None = None,
+        collection: str = "documents",
+    ) -> list[tuple[str, dict]]:
+        """
+        Remove a document's claim on the given chunks (all if None).
+
+        Chunks shared with other documents through `duplicate_sources` are
+        kept: ownership passes to the next source, and released references
+        are dropped from chunks owned by others. Chunks nobody else refers to
+        are deleted.
+
+        Returns (text, metadata) of the kept chunks whose owner or sources
+        changed, so the BM25 index can update them.
+        """
+        full_name = f"{self.collection_prefix}{collection}"
+
+        def released(key: str) -> bool:
+            return chunk_ids is None or key in chunk_ids
+
+        to_delete: list = []
+        changed: list = []
+        transferred = 0
+        async for point in self._scroll_document(full_name, document_id):
+            payload = point.payload
+            sources = payload.get(SOURCES_KEY) or []
+            kept = [
+                s for s in sources
+                if s.get("document_id") != document_id or not released(_ref_key(point, s))
+            ]
+            owner_released = (
+                payload.get("document_id") == document_id and released(_owned_key(point))
+            )
+            if owner_released:
+                if not kept:
+                    to_delete.append(point.id)
+                    continue
+                update = {"chunk_id": "", **kept[0], SOURCES_KEY: kept[1:]}
+            elif len(kept) == len(sources):
+                continue
+            else:
+                update = {SOURCES_KEY: kept}
+
+            await self.client.set_payload(
+                collection_name=full_name,
+                payload=update,
+                points=[point.id],
+            )
+            changed.append(point.id)
+            transferred += owner_released
+
+        updated: list[tuple[str, dict]] = []
+        if changed:
+            points = await self.client.retrieve(
+                collection_name=full_name,
+                ids=changed,
+                with_payload=True,
+            )
+            updated = [(p.payload.get("text", ""), _metadata(p.payload)) for p in points]
+        if to_delete:
+            await self.client.delete(
+                collection_name=full_name,
+                points_selector=models.PointIdsList(points=to_delete),
+            )
+
+        logger.info(
+            "Released document chunks",
+            document_id=document_id,
+            deleted=len(to_delete),
+            transferred=transferred,
+            updated=len(updated),
         )
+        return updated
+
+    async def delete_by_document(self, document_id: int, collection: str = "documents"):
+        """
+        Delete all vectors associated with a specific document.
+
+        Chunks shared with other documents through `duplicate_sources` are
+        kept: ownership passes to the next source, and references to the
+        deleted document are dropped from other chunks.
+        """
+        await self.release_chunks(document_id, None, collection)
         logger.info("Deleted vectors for document", document_id=document_id)
 
+    async def _scroll_document(self, full_name: str, document_id: int):
+        """Points a document owns or is a duplicate source of (no text, no vectors)."""
+        document_filter = models.Filter(should=[
+            models.FieldCondition(
+                key="document_id",
+                match=models.MatchValue(value=document_id),
+            ),
+            models.FieldCondition(
+                key=f"{SOURCES_KEY}[].document_id",
+                match=models.MatchValue(value=document_id),
+            ),
+        ])
+        offset = None
+        while True:
+            points, offset = await self.client.scroll(
+                collection_name=full_name,
+                scroll_filter=document_filter,
+                limit=256,
+                offset=offset,
+                with_payload=["document_id", "chunk_id", "chunk_index", SOURCES_KEY],
+                with_vectors=False,
+            )
+            for point in points:
+                yield point
+            if offset is None:
+                break
+
     async def shutdown(self):
         """Close the Qdrant client connection."""
         if self.client:
-            self.client.close()
+            await self.client.close()
@@ -2,17 +2,28 @@
 TenderWriter — Embedding Model Wrapper
 
 Wraps sentence-transformers for generating text embeddings with batch
-processing and optional caching.
+processing and optional caching. Batch embeddings go through a persistent,
+content-addressed `EmbeddingCache`, so only cache misses reach the model;
+query embeddings are kept in an in-memory LRU/TTL `QueryEmbeddingCache`.
+Async query embeddings from concurrent requests are coalesced into batched
+model calls by a `MicroBatcher`; large ingestion batches can be spread over
+an `EmbeddingPool` of worker processes.
 """
 
 from __future__ import annotations
 
-from functools import lru_cache
+import asyncio
+from concurrent.futures import Executor
+from functools import lru_cache, partial
 
 import numpy as np
 import structlog
 
 from app.config import settings
+from app.rag.batching import MicroBatcher, token_budget_buckets
+from app.rag.embedding_cache import EmbeddingCache, QueryEmbeddingCache
+from app.rag.embedding_pool import EmbeddingPool
+from app.rag.inference import load_sentence_transformer
 
 logger = structlog.get_logger()
 
@@ -29,33 +40,62 @@ class Embedder:
         model_name: str | None = None,
         device: str | None = None,
         batch_size: int | None = None,
+        use_cache: bool | None = None,
     ):
         self.model_name = model_name or settings.embedding_model
         self.device = device or settings.embedding_device
         self.batch_size = batch_size or settings.embedding_batch_size
+        self.use_cache = settings.embedding_cache_enabled if use_cache is None else use_cache
         self._model = None
+        self._cache: EmbeddingCache | None = None
+        self.query_cache = QueryEmbeddingCache(
+            max_entries=settings.query_embedding_cache_size,
+            ttl=settings.query_embedding_cache_ttl,
+        )
+        # Executor for the batched async query path (None: the loop default)
+        self.executor: Executor | None = None
+        self._query_batcher: MicroBatcher[str, np.ndarray] | None = None
+        # Query embeddings being computed, by normalized query
+        self._query_tasks: dict[str, asyncio.Task] = {}
+        # Optional worker processes for bulk (ingestion) embedding
+        self.pool: EmbeddingPool | None = None
 
     @property
     def model(self):
         """Lazy-load the embedding model."""
         if self._model is None:
-            from sentence_transformers import SentenceTransformer
-
             logger.info(
                 "Loading embedding model",
                 model=self.model_name,
                 device=self.device,
+                backend=settings.inference_backend,
             )
-            self._model = SentenceTransformer(
-                self.model_name,
-                device=self.device,
-            )
+            self._model = load_sentence_transformer(self.model_name, self.device)
             logger.info(
                 "Embedding model loaded",
                 dimension=self._model.get_sentence_embedding_dimension(),
             )
         return self._model
 
+    @property
+    def cache_key(self) -> str:
+        """Model identity for cache keys; ONNX/int8 vectors differ slightly from torch."""
+        if settings.inference_backend == "torch":
+            return self.model_name
+        suffix = "-int8" if settings.onnx_quantize else ""
+        return f"{self.model_name}:{settings.inference_backend}{suffix}"
+
+    @property
+    def cache(self) -> EmbeddingCache | None:
+        """Lazily open the persistent embedding cache (None when disabled)."""
+        if self._cache is None and self.use_cache:
+            self._cache = EmbeddingCache(
+                settings.embedding_cache_path,
+                model_name=self.cache_key,
+                max_entries=settings.embedding_cache_max_entries,
+            )
+        return self._cache
+
     @property
     def dimension(self) -> int:
         """Return the embedding vector dimension."""
@@ -73,34 +113,184 @@ class Embedder:
         """
         Embed a batch of texts. Returns a 2D numpy array (N x dimension).
 
-        Processes in batches of `self.batch_size` to manage memory.
+        Processes in batches of `self.batch_size` to manage memory. Cached
+        texts are served from the embedding cache; the remaining unique texts
+        are encoded in one model call and added to the cache.
         """
         if not texts:
             return np.array([])
 
-        logger.debug("Embedding batch", count=len(texts), batch_size=self.batch_size)
+        cache = self.cache
+        if cache is None:
+            return self._encode_bulk(texts)
 
-        embeddings = self.model.encode(
-            texts,
-            batch_size=self.batch_size,
-            normalize_embeddings=True,
-            show_progress_bar=False,
-        )
+        cached = cache.get_many(texts)
+        missing = list(dict.fromkeys(t for t, v in zip(texts, cached) if v is None))
+        if missing:
+            # Round-trip through float16 so hits and misses return identical vectors
+            computed = self._encode_bulk(missing).astype(np.float16).astype(np.float32)
+            cache.put_many(missing, computed)
+            by_text = dict(zip(missing, computed))
+            cached = [by_text[t] if v is None else v for t, v in zip(texts, cached)]
+
+        logger.debug("Embedding cache lookup", count=len(texts), misses=len(missing))
+        return np.stack(cached)
+
+    def start_pool(self, workers: int):
+        """Start worker processes for bulk embedding (see `EmbeddingPool`)."""
+        if self.pool is None and workers > 0:
+            self.pool = EmbeddingPool(self.model_name, self.device, self.dimension, workers=workers)
+
+    def shutdown_pool(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def _encode_bulk(self, texts: list[str]) -> np.ndarray:
+        """Encode in the worker pool if there is one and the batch is large enough."""
+        if self.pool is not None and len(texts) >= settings.embedding_pool_min_texts:
+            return self.pool.encode(texts)
+        return self._encode(texts)
+
+    def _encode(self, texts: list[str]) -> np.ndarray:
+        """
+        Run the model over `texts` in length-bucketed batches.
+
+        Texts are sorted by token length and grouped so that each forward
+        pass holds at most `embedding_token_budget` padded tokens: many short
+        sentences share one pass, long chunks get small batches. Results are
+        returned in the original order.
+        """
+        batches = self._length_buckets(texts)
+        logger.debug("Embedding batch", count=len(texts), batches=len(batches))
+
+        embeddings: np.ndarray | None = None
+        for indices in batches:
+            vectors = self.model.encode(
+                [texts[i] for i in indices],
+                batch_size=len(indices),
+                normalize_embeddings=True,
+                show_progress_bar=False,
+            )
+            if embeddings is None:
+                embeddings = np.empty((len(texts), vectors.shape[1]), dtype=vectors.dtype)
+            embeddings[indices] = vectors
 
         logger.debug("Embedding complete", shape=embeddings.shape)
         return embeddings
 
+    def _length_buckets(self, texts: list[str]) -> list[list[int]]:
+        """Group text indices, longest first, into batches within the token budget."""
+        lengths = self._token_lengths(texts)
+        if lengths is None:
+            order = sorted(range(len(texts)), key=lambda i: -len(texts[i]))
+            return [order[i:i + self.batch_size] for i in range(0, len(order), self.batch_size)]
+
+        return token_budget_buckets(
+            lengths,
+            settings.embedding_token_budget,
+            settings.embedding_max_batch_size,
+        )
+
+    def _token_lengths(self, texts: list[str]) -> np.ndarray | None:
+        """Token count per text (truncated to the model's limit), None if unknown."""
+        tokenizer = getattr(self.model, "tokenizer", None)
+        if tokenizer is None:
+            return None
+        max_length = getattr(self.model, "max_seq_length", None) or 512
+        encoded = tokenizer(
+            texts,
+            add_special_tokens=True,
+            truncation=True,
+            max_length=max_length,
+            return_attention_mask=False,
+            return_token_type_ids=False,
+        )
+        return np.fromiter(
+            (len(ids) for ids in encoded["input_ids"]), dtype=np.int64, count=len(texts)
+        )
+
     def embed_query(self, query: str) -> np.ndarray:
         """
         Embed a query string.
 
         For asymmetric models (like BGE), prepend the query instruction.
+        Results are cached per normalized query; the returned array is
+        shared and read-only.
+        """
+        cached = self.query_cache.get(self.cache_key, query)
+        if cached is not None:
+            return cached
+
+        embedding = self.embed(self._query_text(query))
+        self.query_cache.put(self.cache_key, query, embedding)
+        return embedding
+
+    async def embed_query_async(self, query: str) -> np.ndarray:
         """
+        Embed a query string without blocking the event loop.
+
+        Cache misses from concurrent requests are coalesced into one
+        `model.encode` call (see `embedding_query_batch_size` and
+        `embedding_query_batch_wait_ms`), and concurrent misses for the same
+        query share one computation.
+
+        The computation is shielded from the caller: when a retrieval timeout
+        cancels the caller, the vector is still computed and cached, so a
+        retry of a cold query finds it instead of timing out again.
+        """
+        cached = self.query_cache.get(self.cache_key, query)
+        if cached is not None:
+            return cached
+
+        key = QueryEmbeddingCache.normalize(query)
+        task = self._query_tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._embed_query_uncached(query))
+            self._query_tasks[key] = task
+            task.add_done_callback(partial(self._query_task_done, key))
+        return await asyncio.shield(task)
+
+    async def _embed_query_uncached(self, query: str) -> np.ndarray:
+        """Embed a query through the micro-batcher and cache the result."""
+        if self._query_batcher is None:
+            self._query_batcher = MicroBatcher(
+                self._encode,
+                max_batch_size=settings.embedding_query_batch_size,
+                max_wait_ms=settings.embedding_query_batch_wait_ms,
+                executor=self.executor,
+                name="query-embedding",
+            )
+
+        embedding = await self._query_batcher.submit(self._query_text(query))
+        self.query_cache.put(self.cache_key, query, embedding)
+        return embedding
+
+    def _query_task_done(self, key: str, task: asyncio.Task):
+        """Forget a finished query embedding; its result is in the cache."""
+        self._query_tasks.pop(key, None)
+        if not task.cancelled() and task.exception() is not None:
+            # Every caller may have timed out already; log rather than lose it
+            logger.warning("Query embedding failed", error=str(task.exception()))
+
+    def _query_text(self, query: str) -> str:
+        """Normalize a query and add the model's query instruction, if any."""
+        text = QueryEmbeddingCache.normalize(query)
         # BGE models require a query prefix for retrieval
         if "bge" in self.model_name.lower():
-            query = f"Represent this sentence for searching relevant passages: {query}"
+            text = f"Represent this sentence for searching relevant passages: {text}"
+        return text
+
+    def cache_stats(self) -> dict:
+        """Stats of the query and persistent embedding caches."""
+        return {
+            "query": self.query_cache.stats(),
+            "persistent": self._cache.stats() if self._cache is not None else None,
+        }
 
-        return self.embed(query)
+    def batching_stats(self) -> dict | None:
+        """Stats of the async query micro-batcher (None before first use)."""
+        return self._query_batcher.stats() if self._query_batcher is not None else None
 
 
 @lru_cache(maxsize=1)
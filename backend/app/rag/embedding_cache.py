@@ -0,0 +1,205 @@
+"""
+TenderWriter — Embedding Caches
+
+Content-addressed, disk-backed cache of text embeddings so re-ingesting
+unchanged documents (or boilerplate repeated across proposals) skips the
+embedding model, plus a small in-memory cache for repeated query vectors.
+
+Entries are keyed by sha256(model_name, text) and stored in SQLite as
+float16 blobs. The cache is bounded by `embedding_cache_max_entries`:
+least-recently-used entries are evicted once it grows past the limit.
+SQLite runs in WAL mode, so several workers may share one cache file.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+import structlog
+
+logger = structlog.get_logger()
+
+# Keys per SQL statement, well below SQLite's bound-variable limit
+_SQL_BATCH = 500
+
+
+class EmbeddingCache:
+    """SQLite-backed LRU cache of float16 embeddings for one model."""
+
+    def __init__(self, path: str | Path, model_name: str, max_entries: int):
+        self.path = Path(path)
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key BLOB PRIMARY KEY,"
+            " vector BLOB NOT NULL,"
+            " last_used REAL NOT NULL"
+            ") WITHOUT ROWID"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)"
+        )
+        self._conn.commit()
+        self._entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+        logger.info("Embedding cache opened", path=str(self.path), entries=self._entries)
+
+    def _key(self, text: str) -> bytes:
+        digest = hashlib.sha256(self.model_name.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(text.encode("utf-8"))
+        return digest.digest()
+
+    def get_many(self, texts: list[str]) -> list[np.ndarray | None]:
+        """
+        Look up embeddings for `texts`.
+
+        Returns:
+            One float32 vector per text, or None where the text is not cached.
+        """
+        keys = [self._key(t) for t in texts]
+        found: dict[bytes, bytes] = {}
+        with self._lock:
+            for i in range(0, len(keys), _SQL_BATCH):
+                batch = keys[i:i + _SQL_BATCH]
+                rows = self._conn.execute(
+                    "SELECT key, vector FROM embeddings WHERE key IN "
+                    f"({','.join('?' * len(batch))})",
+                    batch,
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found],
+                )
+                self._conn.commit()
+
+        results: list[np.ndarray | None] = []
+        for key in keys:
+            blob = found.get(key)
+            results.append(
+                None if blob is None else np.frombuffer(blob, dtype=np.float16).astype(np.float32)
+            )
+
+        hits = sum(r is not None for r in results)
+        self.hits += hits
+        self.misses += len(results) - hits
+        return results
+
+    def put_many(self, texts: list[str], vectors: np.ndarray):
+        """Store embeddings (as float16) and evict LRU entries past the size bound."""
+        now = time.time()
+        rows = [
+            (self._key(t), np.asarray(v, dtype=np.float16).tobytes(), now)
+            for t, v in zip(texts, vectors)
+        ]
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                rows,
+            )
+            self._entries += self._conn.total_changes - before
+
+            overflow = self._entries - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (overflow,),
+                )
+                self._entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+                logger.debug("Embedding cache evicted", entries=overflow)
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current size."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": self._entries,
+            "max_entries": self.max_entries,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class QueryEmbeddingCache:
+    """
+    Bounded in-memory LRU cache of query vectors with a time-to-live.
+
+    Keys are (model_name, normalized query). Thread-safe: queries are embedded
+    on executor threads.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[tuple[str, str], tuple[float, np.ndarray]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        """Collapse whitespace so trivially different spellings share an entry."""
+        return " ".join(query.split())
+
+    def get(self, model_name: str, query: str) -> np.ndarray | None:
+        key = (model_name, self.normalize(query))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, model_name: str, query: str, vector: np.ndarray):
+        # Shared between callers, so make sure nobody mutates it in place
+        vector.flags.writeable = False
+        key = (model_name, self.normalize(query))
+        with self._lock:
+            self._entries[key] = (time.monotonic(), vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current size."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+        }
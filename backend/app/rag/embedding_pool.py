@@ -0,0 +1,107 @@
+"""
+TenderWriter — Multi-Process Embedding Pool
+
+Spreads bulk (ingestion) embedding over several worker processes, so the
+tokenizer and model run outside the API process's GIL. Each worker loads the
+model once at startup and runs `embedding_pool_threads` intra-op threads.
+
+Work is sharded by batch. Workers write their vectors straight into one
+shared-memory block allocated by the caller, and return only a row count,
+so no vectors are pickled.
+
+Query embedding never goes through the pool. It keeps running in the API
+process, so size `embedding_pool_workers * embedding_pool_threads` to leave
+cores free for interactive traffic.
+"""
+
+from __future__ import annotations
+
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import structlog
+
+from app.config import settings
+
+logger = structlog.get_logger()
+
+# Per-process model, set by _init_worker
+_worker_embedder = None
+
+
+def _init_worker(model_name: str, device: str, threads: int):
+    """Load the model once per worker process."""
+    global _worker_embedder
+    try:
+        import torch
+
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+    from app.rag.embedder import Embedder
+
+    _worker_embedder = Embedder(model_name=model_name, device=device, use_cache=False)
+    _ = _worker_embedder.model  # load eagerly, not on the first shard
+
+
+def _embed_shard(texts: list[str], shm_name: str, shape: tuple[int, int], start: int) -> int:
+    """Embed one shard into rows [start, start + len(texts)) of the shared block."""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        out = np.ndarray(shape, dtype=np.float32, buffer=shm.buf)
+        out[start:start + len(texts)] = _worker_embedder._encode(texts)
+        del out
+    finally:
+        shm.close()
+    return len(texts)
+
+
+class EmbeddingPool:
+    """Process pool that embeds large text lists for `Embedder.embed_batch`."""
+
+    def __init__(
+        self,
+        model_name: str,
+        device: str,
+        dimension: int,
+        workers: int | None = None,
+        threads: int | None = None,
+    ):
+        self.dimension = dimension
+        self.workers = workers or settings.embedding_pool_workers
+        self.shard_size = settings.embedding_pool_shard_size
+        # spawn: never fork a process that already runs torch / executor threads
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=mp.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(model_name, device, threads or settings.embedding_pool_threads),
+        )
+        logger.info("Embedding pool started", workers=self.workers, model=model_name)
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        """Embed `texts` across the worker processes, preserving order."""
+        shape = (len(texts), self.dimension)
+        shm = shared_memory.SharedMemory(create=True, size=max(1, len(texts) * self.dimension * 4))
+        try:
+            futures = [
+                self._executor.submit(
+                    _embed_shard, texts[start:start + self.shard_size], shm.name, shape, start
+                )
+                for start in range(0, len(texts), self.shard_size)
+            ]
+            for future in futures:
+                future.result()
+            result = np.ndarray(shape, dtype=np.float32, buffer=shm.buf).copy()
+        finally:
+            shm.close()
+            shm.unlink()
+
+        logger.debug("Embedding pool batch complete", count=len(texts), shards=len(futures))
+        return result
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
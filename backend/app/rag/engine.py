@@ -7,21 +7,30 @@ fuses results, re-ranks them, and generates responses using a local LLM.
 
 from __future__ import annotations
 
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
 from enum import Enum
-from typing import AsyncIterator
+from functools import partial
+from typing import AsyncIterator, Awaitable, Collection, Iterable, Iterator
 
 import structlog
 
 from app.config import settings
+from app.rag.candidate import Candidate
 from app.rag.chunker import SemanticChunker, ChunkMetadata, TextChunk
+from app.rag.dedup import SOURCES_KEY, ChunkDeduplicator
 from app.rag.dense_retriever import DenseRetriever
 from app.rag.embedder import Embedder, get_embedder
+from app.rag.filters import MetadataFilter
 from app.rag.fusion import RankFusion
 from app.rag.generator import Generator, GenerationResult
 from app.rag.graph_retriever import GraphRetriever
+from app.rag.planner import QueryPlanner, RetrievalPlan
 from app.rag.reranker import Reranker
 from app.rag.sparse_retriever import SparseRetriever
+from app.rag.versioning import DocumentDiff
 
 logger = structlog.get_logger()
 
@@ -52,6 +61,10 @@ class RAGQuery:
     document_text: str = ""
     temperature: float = 0.3
     stream: bool = False
+    # Re-ranking budget override; None uses the mode's reranker_budget_ms
+    rerank_budget_ms: float | None = None
+    # Retrieval profile ("default" or "fast"); None uses settings.rag_profile
+    profile: str | None = None
 
 
 @dataclass
@@ -80,11 +93,14 @@ class HybridRAGEngine:
         self.embedder: Embedder | None = None
         self.chunker: SemanticChunker | None = None
         self.dense_retriever: DenseRetriever | None = None
+        self.deduplicator: ChunkDeduplicator | None = None
         self.sparse_retriever: SparseRetriever | None = None
         self.graph_retriever: GraphRetriever | None = None
         self.fusion: RankFusion | None = None
         self.reranker: Reranker | None = None
         self.generator: Generator | None = None
+        self.planner = QueryPlanner()
+        self._retrieval_executor: ThreadPoolExecutor | None = None
         self._initialized = False
 
     async def initialize(self):
@@ -94,25 +110,56 @@ class HybridRAGEngine:
                     qdrant_port=settings.qdrant_port,
                     neo4j_uri=settings.neo4j_uri)
 
+        # Dedicated pool for the synchronous retrieval legs, so embedding and
+        # BM25 scoring never run on the event loop thread
+        self._retrieval_executor = ThreadPoolExecutor(
+            max_workers=settings.rag_retrieval_workers,
+            thread_name_prefix="rag-retrieval",
+        )
+
         # Embedder
         self.embedder = get_embedder()
+        self.embedder.executor = self._retrieval_executor
+        if settings.embedding_pool_workers:
+            try:
+                self.embedder.start_pool(settings.embedding_pool_workers)
+            except Exception as e:
+                logger.warning("Embedding pool unavailable, embedding in-process", error=str(e))
 
         # Chunker
+        boundary_embedder = None
+        boundary_model = settings.chunk_boundary_model
+        if boundary_model and boundary_model != self.embedder.model_name:
+            boundary_embedder = Embedder(model_name=boundary_model)
         self.chunker = SemanticChunker(
             embedder=self.embedder,
             min_chunk_size=settings.chunk_min_size,
             max_chunk_size=settings.chunk_max_size,
+            boundary_embedder=boundary_embedder,
+            embedding_reuse=settings.chunk_embedding_reuse,
+            reencode_min_chars=settings.chunk_reencode_min_chars,
+            embed_window=settings.chunk_embed_window,
         )
 
         # Dense retriever (Qdrant)
-        self.dense_retriever = DenseRetriever(self.embedder)
+        self.dense_retriever = DenseRetriever(self.embedder, executor=self._retrieval_executor)
         try:
             await self.dense_retriever.initialize()
         except Exception as e:
             logger.warning("Dense retriever init failed (Qdrant may be unavailable)", error=str(e))
 
-        # Sparse retriever (BM25)
+        # Near-duplicate detection at ingestion (fingerprints live in Qdrant)
+        if settings.dedup_enabled:
+            self.deduplicator = ChunkDeduplicator(self.dense_retriever)
+
+        # Sparse retriever (BM25), restored from its snapshot; the chunk
+        # payloads in Qdrant are the source of truth for staleness checks
         self.sparse_retriever = SparseRetriever()
+        await self.sparse_retriever.restore(
+            fingerprint_stored=self.dense_retriever.fingerprint_chunks,
+            iter_stored=self.dense_retriever.scroll_chunks,
+        )
+        self.sparse_retriever.start_sync()
 
         # Graph retriever (Neo4j)
         self.graph_retriever = GraphRetriever()
@@ -124,8 +171,9 @@ class HybridRAGEngine:
         # Fusion
         self.fusion = RankFusion()
 
-        # Re-ranker
+        # Re-ranker (model calls batched across requests on the retrieval pool)
         self.reranker = Reranker()
+        self.reranker.executor = self._retrieval_executor
 
         # Generator (Ollama)
         self.generator = Generator()
@@ -152,112 +200,199 @@ class HybridRAGEngine:
             query_len=len(rag_query.text),
         )
 
-        # ─── Step 1: Retrieve from all sources ───
-        dense_results = []
-        sparse_results = []
-        graph_results = []
+        context_texts, sources = await self._search(rag_query)
+        context = "\n\n---\n\n".join(context_texts)
 
-        # Dense retrieval
-        try:
-            raw_dense = self.dense_retriever.search(
-                query=rag_query.text,
-                top_k=rag_query.top_k or settings.rag_top_k_dense,
-                filters=rag_query.filters,
+        # ─── Step 4: Search-only mode ───
+        if rag_query.mode == QueryMode.SEARCH:
+            return RAGResponse(
+                answer="",
+                sources=sources,
+                mode=rag_query.mode,
             )
-            dense_results = [
-                {"text": r.text, "score": r.score, "metadata": r.metadata}
-                for r in raw_dense
-            ]
-        except Exception as e:
-            logger.warning("Dense retrieval failed", error=str(e))
 
-        # Sparse retrieval
-        try:
-            raw_sparse = self.sparse_retriever.search(
-                query=rag_query.text,
-                top_k=rag_query.top_k or settings.rag_top_k_sparse,
-                filters=rag_query.filters,
-            )
-            sparse_results = [
-                {"text": r.text, "score": r.score, "metadata": r.metadata}
-                for r in raw_sparse
-            ]
-        except Exception as e:
-            logger.warning("Sparse retrieval failed", error=str(e))
+        # ─── Step 5: Generate response ───
+        generation_result = await self._generate(rag_query, context)
 
-        # Graph retrieval
-        try:
-            raw_graph = await self.graph_retriever.search(
-                query=rag_query.text,
-                top_k=rag_query.top_k or settings.rag_top_k_graph,
-                filters=rag_query.filters,
-            )
-            graph_results = [
-                {"text": r.text, "score": r.score, "metadata": r.metadata}
-                for r in raw_graph
-            ]
-        except Exception as e:
-            logger.warning("Graph retrieval failed", error=str(e))
+        return RAGResponse(
+            answer=generation_result.text,
+            sources=sources,
+            mode=rag_query.mode,
+            generation_result=generation_result,
+        )
+
+    async def _search(self, rag_query: RAGQuery) -> tuple[list[str], list[dict]]:
+        """
+        Retrieve, fuse and re-rank for a query, as far as its plan says.
+
+        The planner (see app.rag.planner) picks leg depths, whether the graph
+        leg and the re-ranker run, and whether the query may exit early once
+        the dense and sparse legs agree.
+
+        Returns:
+            Tuple of (context_texts, sources) for the top results.
+        """
+        plan = self.planner.plan(rag_query)
+        top_k_final = rag_query.top_k or settings.rag_top_k_final
+        start = time.perf_counter()
+
+        # ─── Step 1: Retrieve from the planned sources (concurrently) ───
+        dense_results, sparse_results, graph_results, exited = await self._retrieve(rag_query, plan)
+        retrieved = time.perf_counter()
 
         # ─── Step 2: Fuse results ───
+        rerank = plan.rerank and not exited
         fused = self.fusion.fuse(
             dense_results=dense_results,
             sparse_results=sparse_results,
             graph_results=graph_results,
-            top_k=20,  # Send top 20 to re-ranker
+            top_k=plan.fusion_k if rerank else top_k_final,
         )
+        fused_at = time.perf_counter()
 
         # ─── Step 3: Re-rank ───
-        top_k_final = rag_query.top_k or settings.rag_top_k_final
-        reranked = []
-        if fused:
+        reranked: list[Candidate] = fused[:top_k_final]
+        if fused and rerank:
             try:
-                fused_dicts = [
-                    {"text": f.text, "score": f.score, "metadata": f.metadata, "sources": f.sources}
-                    for f in fused
-                ]
-                reranked = self.reranker.rerank(
+                reranked = await self.reranker.rerank(
                     query=rag_query.text,
-                    results=fused_dicts,
+                    results=fused,
                     top_k=top_k_final,
+                    survivors=plan.rerank_survivors,
+                    budget_ms=plan.rerank_budget_ms,
                 )
             except Exception as e:
                 logger.warning("Re-ranking failed, using fusion order", error=str(e))
                 # Fallback: use fusion results directly
                 reranked = fused[:top_k_final]
 
+        end = time.perf_counter()
+        logger.info(
+            "Query stages",
+            mode=rag_query.mode.value,
+            profile=plan.profile,
+            early_exit=exited,
+            reranked=rerank and bool(fused),
+            results=len(reranked),
+            retrieve_ms=round((retrieved - start) * 1000, 1),
+            fuse_ms=round((fused_at - retrieved) * 1000, 1),
+            rerank_ms=round((end - fused_at) * 1000, 1),
+            total_ms=round((end - start) * 1000, 1),
+        )
+
         # Build context from top results
-        context_texts = []
-        sources = []
-        for r in reranked:
-            text = r.text if hasattr(r, "text") else r.get("text", "")
-            metadata = r.metadata if hasattr(r, "metadata") else r.get("metadata", {})
-            context_texts.append(text)
-            sources.append({
-                "text": text[:200] + "..." if len(text) > 200 else text,
-                "score": r.score if hasattr(r, "score") else r.get("score", 0),
-                "metadata": metadata,
-            })
+        context_texts = [c.text for c in reranked]
+        sources = [
+            {
+                "text": c.text[:200] + "..." if len(c.text) > 200 else c.text,
+                "score": c.score,
+                "metadata": c.metadata,
+                "chunk_id": c.chunk_id,
+            }
+            for c in reranked
+        ]
 
-        context = "\n\n---\n\n".join(context_texts)
+        return context_texts, sources
 
-        # ─── Step 4: Search-only mode ───
-        if rag_query.mode == QueryMode.SEARCH:
-            return RAGResponse(
-                answer="",
-                sources=sources,
-                mode=rag_query.mode,
-            )
+    async def _retrieve(
+        self,
+        rag_query: RAGQuery,
+        plan: RetrievalPlan,
+    ) -> tuple[list[Candidate], list[Candidate], list[Candidate], bool]:
+        """
+        Run the planned dense, sparse and graph retrieval concurrently.
 
-        # ─── Step 5: Generate response ───
-        generation_result = await self._generate(rag_query, context)
+        The sparse leg runs on the retrieval executor while the dense and graph
+        legs run natively on the event loop. Each leg has its own
+        timeout; a leg that fails or times out contributes no results.
+        When the plan allows an early exit and the dense and sparse top hits
+        agree, the graph leg is abandoned.
 
-        return RAGResponse(
-            answer=generation_result.text,
-            sources=sources,
-            mode=rag_query.mode,
-            generation_result=generation_result,
+        Returns:
+            Tuple of (dense_results, sparse_results, graph_results, early_exit).
+        """
+        loop = asyncio.get_running_loop()
+        # Compile the filters once; every leg applies the same representation
+        filters = MetadataFilter.compile(rag_query.filters)
+
+        graph_task = None
+        if plan.graph_k:
+            graph_task = asyncio.ensure_future(self._run_leg(
+                "graph",
+                self.graph_retriever.search(
+                    query=rag_query.text,
+                    top_k=plan.graph_k,
+                    filters=filters,
+                ),
+                plan.graph_timeout,
+            ))
+
+        sparse_call = partial(
+            self.sparse_retriever.search,
+            query=rag_query.text,
+            top_k=plan.sparse_k,
+            filters=filters,
         )
+        try:
+            dense_results, sparse_results = await asyncio.gather(
+                self._run_leg(
+                    "dense",
+                    self.dense_retriever.search(
+                        query=rag_query.text,
+                        top_k=plan.dense_k,
+                        filters=filters,
+                    ),
+                    plan.dense_timeout,
+                ),
+                self._run_leg(
+                    "sparse",
+                    loop.run_in_executor(self._retrieval_executor, sparse_call),
+                    plan.sparse_timeout,
+                ),
+            )
+        except BaseException:
+            if graph_task is not None:
+                graph_task.cancel()
+            raise
+
+        exited = False
+        if plan.early_exit:
+            agreement = self.planner.agreement(dense_results, sparse_results)
+            exited = agreement >= settings.rag_early_exit_overlap
+            logger.info(
+                "Early exit" if exited else "No early exit",
+                agreement=round(agreement, 2),
+                threshold=settings.rag_early_exit_overlap,
+                graph_abandoned=exited and graph_task is not None and not graph_task.done(),
+            )
+
+        graph_results: list[Candidate] = []
+        if graph_task is not None:
+            if exited:
+                graph_task.cancel()
+            else:
+                graph_results = [r.to_candidate() for r in await graph_task]
+        return dense_results, sparse_results, graph_results, exited
+
+    async def _run_leg(self, name: str, call: Awaitable, timeout: float) -> list:
+        """Await a single retrieval leg with a timeout."""
+        start = time.perf_counter()
+        try:
+            raw = await asyncio.wait_for(call, timeout=timeout)
+        except TimeoutError:
+            logger.warning(f"{name.capitalize()} retrieval timed out", timeout=timeout)
+            return []
+        except Exception as e:
+            logger.warning(f"{name.capitalize()} retrieval failed", error=str(e))
+            return []
+
+        logger.debug(
+            "Retrieval leg complete",
+            leg=name,
+            results=len(raw),
+            elapsed_ms=round((time.perf_counter() - start) * 1000, 1),
+        )
+        return raw
 
     async def query_stream(self, rag_query: RAGQuery) -> AsyncIterator[str]:
         """
@@ -265,16 +400,9 @@ class HybridRAGEngine:
 
         Retrieval + fusion + re-ranking happen first, then generation is streamed.
         """
-        # Run retrieval pipeline (same as query, but stream the generation)
-        # For brevity, we reuse the query method's retrieval logic
-        rag_query_copy = RAGQuery(
-            text=rag_query.text,
-            mode=QueryMode.SEARCH,
-            filters=rag_query.filters,
-            top_k=rag_query.top_k,
-        )
-        search_result = await self.query(rag_query_copy)
-        context = "\n\n---\n\n".join(s["text"] for s in search_result.sources)
+        # Run the retrieval pipeline (same as query, but stream the generation)
+        context_texts, _ = await self._search(rag_query)
+        context = "\n\n---\n\n".join(context_texts)
 
         # Determine template and variables
         template, variables = self._resolve_template(rag_query, context)
@@ -352,22 +480,105 @@ class HybridRAGEngine:
         """Chunk a document and prepare it for indexing."""
         return self.chunker.chunk_text(text, metadata)
 
-    def index_chunks(
+    def iter_chunks(
+        self,
+        texts: Iterable[str],
+        metadata: ChunkMetadata | None = None,
+    ) -> Iterator[TextChunk]:
+        """Stream chunks from page/element texts with bounded memory."""
+        return self.chunker.iter_chunks(texts, metadata)
+
+    async def index_chunks(
         self,
         chunks: list[TextChunk],
         collection: str = "documents",
+        exclude_points: Collection[str] = (),
     ) -> list[str]:
-        """Index chunks into the dense retriever (Qdrant)."""
-        texts = [c.text for c in chunks]
-        metadatas = [c.metadata.__dict__ for c in chunks]
+        """
+        Index chunks into the dense retriever (Qdrant) and the BM25 index.
 
-        # Index in dense retriever
-        point_ids = self.dense_retriever.index_chunks(texts, metadatas, collection)
+        Near-duplicates of stored chunks, or of other chunks in the batch,
+        are not indexed again; their source is recorded on the stored chunk
+        and its point id is returned for them. Stored points in
+        `exclude_points` (a re-ingested document's previous version) are
+        never treated as duplicates.
+        """
+        if self.deduplicator is None:
+            unique = list(range(len(chunks)))
+            extra_payloads = None
+        else:
+            plan = await self.deduplicator.plan(
+                [c.text for c in chunks],
+                [c.metadata.__dict__ for c in chunks],
+                collection,
+                exclude=exclude_points,
+            )
+            unique = plan.unique
+            extra_payloads = plan.payloads
+
+        texts = [chunks[i].text for i in unique]
+        metadatas = [chunks[i].metadata.__dict__ for i in unique]
+
+        # Index in dense retriever, reusing chunk vectors from chunking if any
+        unique_ids = await self.dense_retriever.index_chunks(
+            texts,
+            metadatas,
+            collection,
+            embeddings=[chunks[i].embedding for i in unique],
+            extra_payloads=extra_payloads,
+        )
+
+        if self.deduplicator is None:
+            # Add to sparse retriever and persist the snapshot in the background
+            self.sparse_retriever.add_chunks(texts, metadatas)
+            self.sparse_retriever.commit()
+            return unique_ids
+
+        # BM25 keeps duplicate sources too, so filters match shared chunks
+        self.sparse_retriever.add_chunks(
+            texts,
+            [{**m, SOURCES_KEY: p[SOURCES_KEY]} for m, p in zip(metadatas, plan.payloads)],
+        )
+        updated = await self.dense_retriever.add_duplicate_sources(
+            plan.existing_sources, collection
+        )
+        if updated:
+            self.sparse_retriever.update_chunks(*map(list, zip(*updated)))
+        self.sparse_retriever.commit()
+
+        point_id_of = dict(zip(unique, unique_ids))
+        point_id_of.update(plan.existing)
+        for i, unique_idx in plan.in_batch.items():
+            point_id_of[i] = point_id_of[unique_idx]
+        return [point_id_of[i] for i in range(len(chunks))]
+
+    async def diff_document(self, document_id: int, collection: str = "documents") -> DocumentDiff:
+        """Start a (re-)ingest: diff state against the document's stored chunks."""
+        previous = await self.dense_retriever.document_chunk_ids(document_id, collection)
+        if previous and self.reranker is not None and self.reranker.score_cache is not None:
+            self.reranker.score_cache.invalidate_document(document_id)
+        return DocumentDiff(document_id, previous)
+
+    async def remove_stale_chunks(self, diff: DocumentDiff, collection: str = "documents") -> int:
+        """
+        Remove the chunks of the previous version missing from the new one.
 
-        # Add to sparse retriever
-        self.sparse_retriever.add_chunks(texts, metadatas)
+        Call after the new chunks are indexed. Removed chunks shared with
+        other documents stay stored under their next owner.
+        """
+        removed = diff.removed
+        if not removed:
+            return 0
 
-        return point_ids
+        updated = await self.dense_retriever.release_chunks(
+            diff.document_id, removed, collection
+        )
+        self.sparse_retriever.remove_chunks(diff.document_id, removed)
+        if updated:
+            # Shared chunks stay indexed, under their new owner and sources
+            self.sparse_retriever.update_chunks(*map(list, zip(*updated)))
+        self.sparse_retriever.commit()
+        return len(removed)
 
     async def shutdown(self):
         """Gracefully shutdown all components."""
@@ -376,5 +587,11 @@ class HybridRAGEngine:
             await self.dense_retriever.shutdown()
         if self.graph_retriever:
             await self.graph_retriever.shutdown()
+        if self.sparse_retriever:
+            self.sparse_retriever.shutdown()
+        if self.embedder:
+            self.embedder.shutdown_pool()
+        if self._retrieval_executor:
+            self._retrieval_executor.shutdown(wait=False, cancel_futures=True)
         self._initialized = False
         logger.info("HybridRAG Engine shut down")
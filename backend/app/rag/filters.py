@@ -0,0 +1,251 @@
+"""
+TenderWriter — Metadata Filters
+
+Compiles the `filters` dict of a RAG query once into a `MetadataFilter`
+that every retriever can apply in its own way:
+
+- Sparse retriever: evaluated against `MetadataBitmapIndex` into a boolean
+  mask over index slots, so filtering happens before BM25 scoring.
+- Dense retriever: translated into a Qdrant payload filter.
+- Graph retriever: pushed down into the Cypher WHERE clause.
+
+Semantics match the original post-filtering: every field must match, a
+list value means "any of", and chunks without the field never match.
+
+A near-duplicate chunk is stored once, under its first document, and lists
+the other documents in `duplicate_sources` (see app.rag.dedup). Clauses on the
+fields copied into those references (document_id, doc_type, source_file) also
+match a chunk through any of its duplicate sources, so filtered searches still
+find chunks a document shares with another.
+"""
+
+from __future__ import annotations
+
+from array import array
+from dataclasses import dataclass
+from typing import Hashable
+
+import numpy as np
+
+from app.rag.dedup import SOURCE_FIELDS, SOURCES_KEY
+
+# Metadata values of these types are indexed by MetadataBitmapIndex
+_INDEXABLE = (str, int, float, bool)
+# Unique per chunk: a slot list per value would cost memory and never narrow a filter
+_UNINDEXED_KEYS = frozenset({"chunk_id"})
+
+
+def source_key(key: str) -> str:
+    """Index key of a duplicate source field (Qdrant's nested-field syntax)."""
+    return f"{SOURCES_KEY}[].{key}"
+
+
+@dataclass(frozen=True)
+class MetadataFilter:
+    """A compiled conjunction of field -> allowed-values clauses."""
+    clauses: tuple[tuple[str, frozenset], ...]
+
+    @classmethod
+    def compile(cls, filters: dict | MetadataFilter | None) -> MetadataFilter | None:
+        """Compile a filters dict; passes compiled filters through, None if empty."""
+        if filters is None or isinstance(filters, MetadataFilter):
+            return filters
+        if not filters:
+            return None
+
+        clauses = []
+        for key, value in filters.items():
+            values = value if isinstance(value, (list, tuple, set, frozenset)) else [value]
+            clauses.append((key, frozenset(values)))
+        return cls(clauses=tuple(clauses))
+
+    @property
+    def on_sources(self) -> bool:
+        """Whether any clause can also match through a duplicate source."""
+        return any(key in SOURCE_FIELDS for key, _ in self.clauses)
+
+    def matches(self, metadata: dict) -> bool:
+        """Check if a metadata dict (or one of its duplicate sources) satisfies every clause."""
+        if self._matches(metadata, metadata):
+            return True
+        if not self.on_sources:
+            return False
+        return any(self._matches(metadata, ref) for ref in metadata.get(SOURCES_KEY) or ())
+
+    def _matches(self, metadata: dict, source: dict) -> bool:
+        """Clauses on source fields checked against `source`, the rest against `metadata`."""
+        for key, allowed in self.clauses:
+            meta_value = (source if key in SOURCE_FIELDS else metadata).get(key)
+            if meta_value is None:
+                return False
+            try:
+                if meta_value not in allowed:
+                    return False
+            except TypeError:  # unhashable metadata value
+                return False
+        return True
+
+    def to_qdrant(self):
+        """
+        Translate into a Qdrant payload filter.
+
+        Clauses on source fields are ORed with a nested condition requiring
+        one `duplicate_sources` entry to satisfy all of them.
+        """
+        from qdrant_client import models
+
+        def condition(key: str, allowed: frozenset):
+            if len(allowed) == 1:
+                match = models.MatchValue(value=next(iter(allowed)))
+            else:
+                match = models.MatchAny(any=list(allowed))
+            return models.FieldCondition(key=key, match=match)
+
+        owner = models.Filter(must=[condition(key, allowed) for key, allowed in self.clauses])
+        if not self.on_sources:
+            return owner
+
+        shared = models.Filter(must=[
+            models.NestedCondition(nested=models.Nested(
+                key=SOURCES_KEY,
+                filter=models.Filter(must=[
+                    condition(key, allowed)
+                    for key, allowed in self.clauses
+                    if key in SOURCE_FIELDS
+                ]),
+            )),
+            *(
+                condition(key, allowed)
+                for key, allowed in self.clauses
+                if key not in SOURCE_FIELDS
+            ),
+        ])
+        return models.Filter(should=[owner, shared])
+
+    def to_cypher(self, alias: str) -> tuple[str, dict]:
+        """
+        Translate into a Cypher predicate over the properties of `alias`.
+
+        Returns:
+            Tuple of (predicate, parameters); the predicate is "" when there
+            is nothing to filter.
+        """
+        conditions = []
+        params: dict = {}
+        for i, (key, allowed) in enumerate(self.clauses):
+            conditions.append(f"{alias}[$filter_key_{i}] IN $filter_values_{i}")
+            params[f"filter_key_{i}"] = key
+            params[f"filter_values_{i}"] = list(allowed)
+        return " AND ".join(conditions), params
+
+
+class MetadataBitmapIndex:
+    """
+    Per-field inverted index from metadata values to chunk slots.
+
+    Every scalar metadata field is indexed (document_id, doc_type,
+    section_title, ...), except per-chunk unique ones like `chunk_id`. The
+    source fields of `duplicate_sources` entries are indexed under
+    `source_key(field)`. Slots per value are kept as sorted integer arrays and
+    turned into a boolean mask over all slots when a filter is evaluated.
+    """
+
+    def __init__(self):
+        self._fields: dict[str, dict[Hashable, array]] = {}
+
+    def add(self, slot: int, metadata: dict):
+        """Index the metadata of a newly appended slot."""
+        for key, value in metadata.items():
+            if key in _UNINDEXED_KEYS or not isinstance(value, _INDEXABLE):
+                continue
+            values = self._fields.setdefault(key, {})
+            slots = values.get(value)
+            if slots is None:
+                values[value] = array("q", [slot])
+            else:
+                slots.append(slot)
+
+        for ref in metadata.get(SOURCES_KEY) or ():
+            for key in SOURCE_FIELDS:
+                value = ref.get(key)
+                if not isinstance(value, _INDEXABLE):
+                    continue
+                slots = self._fields.setdefault(source_key(key), {}).setdefault(value, array("q"))
+                if not slots or slots[-1] != slot:  # two sources in one document
+                    slots.append(slot)
+
+    def compact(self, survivors: list[int], num_slots: int):
+        """Renumber slots after index compaction, dropping removed slots."""
+        remap = np.full(num_slots, -1, dtype=np.int64)
+        remap[survivors] = np.arange(len(survivors))
+
+        fields: dict[str, dict[Hashable, array]] = {}
+        for key, values in self._fields.items():
+            for value, slots in values.items():
+                new_slots = remap[np.frombuffer(slots, dtype=np.int64)]
+                new_slots = new_slots[new_slots >= 0]
+                if len(new_slots):
+                    fields.setdefault(key, {})[value] = array("q", new_slots.tobytes())
+        self._fields = fields
+
+    def export_state(self) -> tuple[list[list], dict[str, np.ndarray]]:
+        """Return ([field, value] keys, {"meta_indptr", "meta_slots"}) for snapshots."""
+        keys: list[list] = []
+        parts: list[np.ndarray] = []
+        for key, values in self._fields.items():
+            for value, slots in values.items():
+                keys.append([key, value])
+                parts.append(np.array(slots, dtype=np.int64))
+        indptr = np.zeros(len(parts) + 1, dtype=np.int64)
+        np.cumsum([len(p) for p in parts], out=indptr[1:])
+        slots = np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64)
+        return keys, {"meta_indptr": indptr, "meta_slots": slots}
+
+    @classmethod
+    def from_state(cls, keys: list[list], arrays: dict[str, np.ndarray]) -> MetadataBitmapIndex:
+        """Rebuild from `export_state` output."""
+        index = cls()
+        indptr, slots = arrays["meta_indptr"], arrays["meta_slots"]
+        for i, (key, value) in enumerate(keys):
+            index._fields.setdefault(key, {})[value] = array(
+                "q", slots[indptr[i]:indptr[i + 1]].tobytes()
+            )
+        return index
+
+    def slots(self, key: str, value: Hashable) -> np.ndarray:
+        """Slots whose `key` field equals `value`."""
+        try:
+            slots = self._fields.get(key, {}).get(value)
+        except TypeError:
+            slots = None
+        if slots is None:
+            return np.zeros(0, dtype=np.int64)
+        return np.frombuffer(slots, dtype=np.int64)
+
+    def mask(self, metadata_filter: MetadataFilter | None, size: int) -> np.ndarray | None:
+        """
+        Evaluate a filter into a boolean mask over `size` slots.
+
+        Returns None when there is no filter (every slot allowed). Clauses on
+        source fields also match through duplicate sources; unlike the Qdrant
+        filter, each such clause may be satisfied by a different source.
+        """
+        if metadata_filter is None:
+            return None
+
+        owner = np.ones(size, dtype=bool)
+        shared = np.ones(size, dtype=bool)
+        for key, allowed in metadata_filter.clauses:
+            clause = self._clause(key, allowed, size)
+            owner &= clause
+            if key in SOURCE_FIELDS:
+                clause = self._clause(source_key(key), allowed, size)
+            shared &= clause
+        return owner | shared if metadata_filter.on_sources else owner
+
+    def _clause(self, key: str, allowed: frozenset, size: int) -> np.ndarray:
+        """Mask of the slots whose `key` field is any of `allowed`."""
+        clause = np.zeros(size, dtype=bool)
+        for value in allowed:
+            clause[self.slots(key, value)] = True
+        return clause
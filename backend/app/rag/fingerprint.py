@@ -0,0 +1,45 @@
+"""
+TenderWriter — Corpus Fingerprint
+
+An order-independent fingerprint of the chunks stored in Qdrant, used to tell
+whether a BM25 snapshot still matches them (see `SparseRetriever.restore`).
+
+Each chunk contributes a 64-bit digest of its identity: its chunk id, its
+owner document and its duplicate sources. The chunk id is derived from the
+chunk's content (see app.rag.versioning), so an edit changes it; ownership
+transfers and new duplicate sources change the rest. The fingerprint is the
+sum of the digests modulo 2**64, so it can be maintained incrementally (add
+on insert, subtract on delete) and compared to one computed from a scroll of
+the Qdrant payloads, without reading chunk texts.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+
+from app.rag.dedup import SOURCES_KEY
+
+# Fields of a chunk's metadata that the fingerprint covers
+FINGERPRINT_FIELDS = ("chunk_id", "document_id", SOURCES_KEY)
+
+_MASK = (1 << 64) - 1
+
+
+def chunk_digest(metadata: dict) -> int:
+    """64-bit digest of a chunk's identity (chunk id, owner, duplicate sources)."""
+    sources = sorted(
+        (str(source.get("document_id")), source.get("chunk_id") or "")
+        for source in metadata.get(SOURCES_KEY) or ()
+    )
+    identity = json.dumps(
+        [metadata.get("chunk_id") or "", str(metadata.get("document_id")), sources],
+        separators=(",", ":"),
+    )
+    digest = hashlib.blake2b(identity.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def combine(fingerprint: int, digest: int, sign: int = 1) -> int:
+    """Add (`sign=1`) or remove (`sign=-1`) a chunk digest from a fingerprint."""
+    return (fingerprint + sign * digest) & _MASK
@@ -5,29 +5,21 @@ Merges ranked result lists from multiple retrievers (dense, sparse, graph)
 into a single unified ranking using the RRF formula.
 
 RRF is robust and doesn't require score normalization across different
-retrieval methods.
+retrieval methods. Results are merged on their stable chunk ids (see
+app.rag.candidate) and scores are accumulated in one array.
 """
 
 from __future__ import annotations
 
-from dataclasses import dataclass
-
+import numpy as np
 import structlog
 
 from app.config import settings
+from app.rag.candidate import Candidate
 
 logger = structlog.get_logger()
 
 
-@dataclass
-class FusedResult:
-    """A single result after rank fusion from multiple sources."""
-    text: str
-    score: float
-    metadata: dict
-    sources: list[str]  # Which retrievers contributed this result
-
-
 class RankFusion:
     """
     Reciprocal Rank Fusion (RRF) for combining ranked lists.
@@ -55,16 +47,18 @@ class RankFusion:
 
     def fuse(
         self,
-        dense_results: list[dict] | None = None,
-        sparse_results: list[dict] | None = None,
-        graph_results: list[dict] | None = None,
+        dense_results: list[Candidate] | None = None,
+        sparse_results: list[Candidate] | None = None,
+        graph_results: list[Candidate] | None = None,
         top_k: int | None = None,
-    ) -> list[FusedResult]:
+    ) -> list[Candidate]:
         """
         Combine results from multiple retrievers using RRF.
 
-        Each result dict should have at minimum {"text": str, "metadata": dict}.
-        Results are identified by their text content for deduplication.
+        Results are identified by their stable chunk id, so a chunk returned
+        by several retrievers is merged exactly. The first retriever to
+        return it provides the Candidate; later ones only add their source
+        name and any metadata keys it lacks.
 
         Args:
             dense_results: Results from vector search.
@@ -73,70 +67,55 @@ class RankFusion:
             top_k: Number of fused results to return.
 
         Returns:
-            List of FusedResult sorted by fused score (descending).
+            Candidates sorted by fused score (descending), with `score` and
+            `fused_score` set to it.
         """
         dense_results = dense_results or []
         sparse_results = sparse_results or []
         graph_results = graph_results or []
 
-        # Track scores and sources per unique result
-        # Key: normalized text (first 200 chars for dedup)
-        score_map: dict[str, dict] = {}
-
-        def _dedup_key(text: str) -> str:
-            """Create a deduplication key from text."""
-            return text.strip().lower()[:200]
-
-        # Process each retriever's results
         retriever_configs = [
             (dense_results, self.dense_weight, "dense"),
             (sparse_results, self.sparse_weight, "sparse"),
             (graph_results, self.graph_weight, "graph"),
         ]
 
+        # Assign each unique chunk a slot, and record (slot, rank) per hit
+        slot_of: dict[str, int] = {}
+        candidates: list[Candidate] = []
+        hit_slots: list[int] = []
+        hit_scores: list[float] = []
         for results, weight, source_name in retriever_configs:
-            for rank, result in enumerate(results, start=1):
-                text = result.get("text", "")
-                key = _dedup_key(text)
-
-                if not key:
+            for rank, candidate in enumerate(results, start=1):
+                if not candidate.text:
                     continue
-
-                rrf_score = weight / (self.k + rank)
-
-                if key not in score_map:
-                    score_map[key] = {
-                        "text": text,
-                        "score": 0.0,
-                        "metadata": result.get("metadata", {}),
-                        "sources": [],
-                    }
-
-                score_map[key]["score"] += rrf_score
-                if source_name not in score_map[key]["sources"]:
-                    score_map[key]["sources"].append(source_name)
-
-                # Merge metadata from multiple sources
-                for mk, mv in result.get("metadata", {}).items():
-                    if mk not in score_map[key]["metadata"]:
-                        score_map[key]["metadata"][mk] = mv
-
-        # Sort by fused score
-        sorted_results = sorted(score_map.values(), key=lambda x: x["score"], reverse=True)
-
-        # Apply top_k
+                slot = slot_of.get(candidate.chunk_id)
+                if slot is None:
+                    slot = slot_of[candidate.chunk_id] = len(candidates)
+                    candidates.append(candidate)
+                    candidate.sources = [source_name]
+                else:
+                    first = candidates[slot]
+                    if source_name not in first.sources:
+                        first.sources.append(source_name)
+                    for mk, mv in candidate.metadata.items():
+                        first.metadata.setdefault(mk, mv)
+                hit_slots.append(slot)
+                hit_scores.append(weight / (self.k + rank))
+
+        scores = np.zeros(len(candidates), dtype=np.float64)
+        np.add.at(scores, np.asarray(hit_slots, dtype=np.intp), np.asarray(hit_scores))
+
+        # Stable sort keeps first-seen order among equal scores
+        order = np.argsort(-scores, kind="stable")
         if top_k:
-            sorted_results = sorted_results[:top_k]
-
-        fused = [
-            FusedResult(
-                text=r["text"],
-                score=r["score"],
-                metadata=r["metadata"],
-                sources=r["sources"],
-            )
-            for r in sorted_results
-        ]
+            order = order[:top_k]
+
+        fused = []
+        for slot, score in zip(order.tolist(), scores[order].tolist()):
+            candidate = candidates[slot]
+            candidate.score = candidate.fused_score = score
+            fused.append(candidate)
 
         logger.debug(
             "Rank fusion complete",
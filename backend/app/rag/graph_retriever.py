@@ -15,6 +15,8 @@ import structlog
 from neo4j import AsyncGraphDatabase
 
 from app.config import settings
+from app.rag.candidate import Candidate, entity_chunk_id
+from app.rag.filters import MetadataFilter
 
 logger = structlog.get_logger()
 
@@ -28,6 +30,16 @@ class GraphSearchResult:
     entity_type: str
     relationships: list[dict]
 
+    def to_candidate(self) -> Candidate:
+        """Candidate for fusion, with a stable id for the entity."""
+        entity_id = self.metadata.get("entity_id")
+        return Candidate(
+            entity_chunk_id(self.entity_type, entity_id if entity_id is not None else self.text),
+            self.text,
+            self.metadata,
+            self.score,
+        )
+
 
 class GraphRetriever:
     """
@@ -70,6 +82,8 @@ class GraphRetriever:
             "CREATE INDEX IF NOT EXISTS FOR (p:Project) ON (p.name)",
             "CREATE INDEX IF NOT EXISTS FOR (t:TeamMember) ON (t.name)",
             "CREATE INDEX IF NOT EXISTS FOR (p:Project) ON (p.category)",
+            "CREATE INDEX IF NOT EXISTS FOR (p:Project) ON (p.document_id)",
+            "CREATE INDEX IF NOT EXISTS FOR (t:TeamMember) ON (t.document_id)",
         ]
 
         async with self._driver.session() as session:
@@ -88,6 +102,7 @@ class GraphRetriever:
 
         Expected keys: id, name, description, category, client, team_members,
                        certifications, value, year
+        Optional keys: document_id, doc_type (source document, used by filters)
         """
         query = """
         MERGE (p:Project {id: $id})
@@ -96,6 +111,8 @@ class GraphRetriever:
             p.category = $category,
             p.value = $value,
             p.year = $year,
+            p.document_id = $document_id,
+            p.doc_type = $doc_type,
             p.updated_at = datetime()
 
         // Link to client
@@ -112,8 +129,9 @@ class GraphRetriever:
             MERGE (p)-[:HAS_CATEGORY]->(cat)
         )
         """
+        params = {"document_id": None, "doc_type": None, **project}
         async with self._driver.session() as session:
-            await session.run(query, **project)
+            await session.run(query, **params)
 
         # Add team member relationships
         for member in project.get("team_members", []):
@@ -159,6 +177,7 @@ class GraphRetriever:
         Add or update a team member node.
 
         Expected keys: id, name, title, years_experience, certifications, skills
+        Optional keys: document_id, doc_type (source document, used by filters)
         """
         query = """
         MERGE (t:TeamMember {id: $id})
@@ -166,6 +185,8 @@ class GraphRetriever:
             t.title = $title,
             t.years_experience = $years_experience,
             t.skills = $skills,
+            t.document_id = $document_id,
+            t.doc_type = $doc_type,
             t.updated_at = datetime()
         """
         async with self._driver.session() as session:
@@ -176,6 +197,8 @@ class GraphRetriever:
                 title=member.get("title", ""),
                 years_experience=member.get("years_experience", 0),
                 skills=member.get("skills", []),
+                document_id=member.get("document_id"),
+                doc_type=member.get("doc_type"),
             )
 
         # Link certifications
@@ -217,15 +240,18 @@ class GraphRetriever:
         self,
         query: str,
         top_k: int | None = None,
-        filters: dict | None = None,
+        filters: dict | MetadataFilter | None = None,
     ) -> list[GraphSearchResult]:
         """
         Search the knowledge graph for relevant entities and relationships.
 
         Uses full-text matching on node properties and returns structured
-        context including entity relationships.
+        context including entity relationships. Metadata filters are pushed
+        down into the Cypher query against the entities' source-document
+        properties.
         """
         top_k = top_k or settings.rag_top_k_graph
+        filters = MetadataFilter.compile(filters)
         results: list[GraphSearchResult] = []
 
         # Search projects
@@ -247,16 +273,18 @@ class GraphRetriever:
         self,
         query: str,
         top_k: int,
-        filters: dict | None,
+        filters: MetadataFilter | None,
     ) -> list[GraphSearchResult]:
         """Search for projects matching the query."""
+        filter_clause, filter_params = self._filter_clause(filters, "p")
         # Use CONTAINS for simple text matching
         # In production, consider Neo4j full-text indexes
         cypher = """
         MATCH (p:Project)
-        WHERE toLower(p.name) CONTAINS toLower($query)
+        WHERE (toLower(p.name) CONTAINS toLower($query)
            OR toLower(p.description) CONTAINS toLower($query)
-           OR toLower(p.category) CONTAINS toLower($query)
+           OR toLower(p.category) CONTAINS toLower($query))
+        """ + filter_clause + """
         OPTIONAL MATCH (p)-[:FOR_CLIENT]->(c:Client)
         OPTIONAL MATCH (p)-[:HAS_CATEGORY]->(cat:Category)
         OPTIONAL MATCH (t:TeamMember)-[r:DELIVERED]->(p)
@@ -269,7 +297,9 @@ class GraphRetriever:
 
         results: list[GraphSearchResult] = []
         async with self._driver.session() as session:
-            cursor = await session.run(cypher, {"query": query, "top_k": top_k})
+            cursor = await session.run(
+                cypher, {"query": query, "top_k": top_k, **filter_params}
+            )
             records = await cursor.data()
 
             for record in records:
@@ -307,7 +337,12 @@ class GraphRetriever:
                 results.append(GraphSearchResult(
                     text="\n".join(text_parts),
                     score=1.0,  # Exact match from graph
-                    metadata={"source": "knowledge_graph", "entity_id": project.get("id")},
+                    metadata={
+                        "source": "knowledge_graph",
+                        "entity_id": project.get("id"),
+                        "document_id": project.get("document_id"),
+                        "doc_type": project.get("doc_type"),
+                    },
                     entity_type="Project",
                     relationships=[r for r in relationships if r.get("target")],
                 ))
@@ -318,14 +353,16 @@ class GraphRetriever:
         self,
         query: str,
         top_k: int,
-        filters: dict | None,
+        filters: MetadataFilter | None,
     ) -> list[GraphSearchResult]:
         """Search for team members matching the query."""
+        filter_clause, filter_params = self._filter_clause(filters, "t")
         cypher = """
         MATCH (t:TeamMember)
-        WHERE toLower(t.name) CONTAINS toLower($query)
+        WHERE (toLower(t.name) CONTAINS toLower($query)
            OR toLower(t.title) CONTAINS toLower($query)
-           OR ANY(skill IN t.skills WHERE toLower(skill) CONTAINS toLower($query))
+           OR ANY(skill IN t.skills WHERE toLower(skill) CONTAINS toLower($query)))
+        """ + filter_clause + """
         OPTIONAL MATCH (t)-[:HOLDS]->(cert:Certification)
         OPTIONAL MATCH (t)-[r:DELIVERED]->(p:Project)
         RETURN t,
@@ -336,7 +373,9 @@ class GraphRetriever:
 
         results: list[GraphSearchResult] = []
         async with self._driver.session() as session:
-            cursor = await session.run(cypher, {"query": query, "top_k": top_k})
+            cursor = await session.run(
+                cypher, {"query": query, "top_k": top_k, **filter_params}
+            )
             records = await cursor.data()
 
             for record in records:
@@ -369,13 +408,26 @@ class GraphRetriever:
                 results.append(GraphSearchResult(
                     text="\n".join(text_parts),
                     score=0.9,
-                    metadata={"source": "knowledge_graph", "entity_id": member.get("id")},
+                    metadata={
+                        "source": "knowledge_graph",
+                        "entity_id": member.get("id"),
+                        "document_id": member.get("document_id"),
+                        "doc_type": member.get("doc_type"),
+                    },
                     entity_type="TeamMember",
                     relationships=[r for r in relationships if r.get("target")],
                 ))
 
         return results
 
+    @staticmethod
+    def _filter_clause(filters: MetadataFilter | None, alias: str) -> tuple[str, dict]:
+        """Build an `AND ...` Cypher fragment (and its parameters) for a filter."""
+        if filters is None:
+            return "", {}
+        predicate, params = filters.to_cypher(alias)
+        return f"AND {predicate}", params
+
     async def get_compliance_context(self, requirement_text: str) -> list[GraphSearchResult]:
         """
         Find projects and team members related to a specific requirement.
@@ -0,0 +1,160 @@
+"""
+TenderWriter — Model Inference Backends
+
+Loads the sentence-transformers models used by `Embedder` and `Reranker`
+with the backend selected by `inference_backend`:
+
+- "torch": the default PyTorch models.
+- "onnx":  the models exported to ONNX, optionally with dynamic int8
+  quantization, run by onnxruntime with `onnx_threads` intra-op threads.
+  Exports are cached under `onnx_model_dir`, so only the first start pays
+  for them. Requires `pip install tenderwriter-backend[onnx]`; without it
+  the torch backend is used.
+
+`check_parity` compares both backends on sample inputs.
+"""
+
+from __future__ import annotations
+
+import os
+import platform
+from pathlib import Path
+
+import numpy as np
+import structlog
+
+from app.config import settings
+
+logger = structlog.get_logger()
+
+ONNX_FILE = "onnx/model.onnx"
+
+
+def load_sentence_transformer(model_name: str, device: str, backend: str | None = None):
+    """Load a SentenceTransformer with the configured inference backend."""
+    from sentence_transformers import SentenceTransformer
+
+    if _use_onnx(backend):
+        return _load_onnx(SentenceTransformer, model_name)
+    return SentenceTransformer(model_name, device=device)
+
+
+def load_cross_encoder(model_name: str, backend: str | None = None):
+    """Load a CrossEncoder with the configured inference backend."""
+    from sentence_transformers import CrossEncoder
+
+    if _use_onnx(backend):
+        return _load_onnx(CrossEncoder, model_name)
+    return CrossEncoder(model_name)
+
+
+def _use_onnx(backend: str | None) -> bool:
+    backend = (backend or settings.inference_backend).lower()
+    if backend == "torch":
+        return False
+    if backend != "onnx":
+        raise ValueError(f"Unknown inference_backend: {backend!r}")
+    try:
+        import onnxruntime  # noqa: F401
+        import optimum.onnxruntime  # noqa: F401
+    except ImportError:
+        logger.warning("onnxruntime/optimum not available, using the torch backend")
+        return False
+    return True
+
+
+def _load_onnx(model_cls, model_name: str):
+    """Export (once) and load an ONNX model, quantized if configured."""
+    export_dir = Path(settings.onnx_model_dir) / model_name.replace("/", "__")
+    file_name = ONNX_FILE
+    if settings.onnx_quantize:
+        config = _quantization_config()
+        file_name = f"onnx/model_qint8_{config}.onnx"
+
+    if not (export_dir / file_name).exists():
+        logger.info("Exporting model to ONNX", model=model_name, path=str(export_dir))
+        model = model_cls(model_name, backend="onnx", device="cpu")
+        model.save_pretrained(str(export_dir))
+        if settings.onnx_quantize:
+            _quantize(model, config, export_dir)
+
+    logger.info("Loading ONNX model", model=model_name, file=file_name)
+    return model_cls(
+        str(export_dir),
+        backend="onnx",
+        device="cpu",
+        model_kwargs={
+            "file_name": file_name,
+            "provider": "CPUExecutionProvider",
+            "session_options": _session_options(),
+        },
+    )
+
+
+def _quantize(model, config: str, export_dir: Path):
+    """Write a dynamically int8-quantized copy of an exported model."""
+    from sentence_transformers import export_dynamic_quantized_onnx_model
+
+    export_dynamic_quantized_onnx_model(
+        model,
+        quantization_config=config,
+        model_name_or_path=str(export_dir),
+    )
+
+
+def _quantization_config() -> str:
+    """Pick the int8 kernel set for this CPU ("arm64", "avx512_vnni" or "avx2")."""
+    if settings.onnx_quantization_config != "auto":
+        return settings.onnx_quantization_config
+    if platform.machine().lower() in ("arm64", "aarch64"):
+        return "arm64"
+    try:
+        with open("/proc/cpuinfo") as f:
+            flags = f.read()
+    except OSError:
+        flags = ""
+    return "avx512_vnni" if "avx512_vnni" in flags else "avx2"
+
+
+def _session_options():
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    # One intra-op pool per model; inter-op parallelism does not help these graphs
+    options.intra_op_num_threads = settings.onnx_threads or (os.cpu_count() or 1)
+    options.inter_op_num_threads = 1
+    return options
+
+
+def check_parity(
+    texts: list[str],
+    pairs: list[tuple[str, str]],
+) -> dict:
+    """
+    Compare the ONNX backend against torch on sample inputs.
+
+    Returns:
+        dict with the minimum embedding cosine similarity, the maximum
+        absolute cross-encoder score difference, and whether the
+        cross-encoder ranking of `pairs` is identical.
+    """
+    if not _use_onnx("onnx"):
+        raise RuntimeError("The ONNX backend is not available")
+
+    torch_embedder = load_sentence_transformer(settings.embedding_model, "cpu", backend="torch")
+    onnx_embedder = load_sentence_transformer(settings.embedding_model, "cpu", backend="onnx")
+    a = torch_embedder.encode(texts, normalize_embeddings=True, show_progress_bar=False)
+    b = onnx_embedder.encode(texts, normalize_embeddings=True, show_progress_bar=False)
+    cosine = np.sum(a * b, axis=1)
+
+    torch_ce = load_cross_encoder(settings.reranker_model, backend="torch")
+    onnx_ce = load_cross_encoder(settings.reranker_model, backend="onnx")
+    s = np.asarray(torch_ce.predict(pairs, show_progress_bar=False))
+    t = np.asarray(onnx_ce.predict(pairs, show_progress_bar=False))
+
+    return {
+        "embedding_min_cosine": float(cosine.min()),
+        "reranker_max_abs_diff": float(np.abs(s - t).max()),
+        "reranker_same_ranking": bool((np.argsort(-s) == np.argsort(-t)).all()),
+    }
@@ -0,0 +1,192 @@
+"""
+TenderWriter — Adaptive Retrieval Planner
+
+Decides, per query, how much of the retrieval pipeline to run instead of
+always running every retriever at fixed depth followed by the cross-encoder.
+
+A plan sets:
+- the dense / sparse / graph depths and timeouts; the graph leg is skipped
+  when it cannot contribute (retrieval modes without a detected entity);
+- whether to re-rank, and the re-ranker's depth, survivors and budget
+  (short lookup queries in search mode skip it);
+- whether the query may exit early: if the dense and sparse top hits agree
+  strongly, the graph leg is abandoned and re-ranking is skipped.
+
+Profiles
+--------
+"default": the adaptive behavior above, with re-ranking settings per mode
+(`reranker_depth`, `reranker_survivors`, `reranker_budget_ms`).
+
+"fast": for search-as-you-type and lookups; targets under 50 ms p95 on a
+warm instance. Dense + sparse only at depth `rag_fast_top_k`, leg timeouts
+of `rag_fast_dense_timeout` / `rag_fast_sparse_timeout`, no graph, no
+cross-encoder; results are the RRF fusion of the two legs. The target holds
+for queries whose embedding is cached (an HNSW search and a BM25 lookup of a
+few ms each). A cold query embedding costs 20-80 ms on CPU for a base-size
+model, so the dense timeout leaves room for it; the vector is cached even if
+the leg times out, so the next keystroke or retry is warm.
+
+Every plan and early-exit decision is logged ("Query plan", "Early exit"),
+with the reasons, so the thresholds can be tuned from the logs.
+"""
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+
+import structlog
+
+from app.config import settings
+
+logger = structlog.get_logger()
+
+PROFILES = ("default", "fast")
+
+# Modes that only retrieve or answer from text, where the graph adds little
+# unless the query names an entity
+_TEXT_MODES = frozenset({"search", "qa"})
+# Lookup modes, where results go straight to the user: short keyword queries
+# skip the cross-encoder. Modes that generate from the context always re-rank.
+_LOOKUP_MODES = frozenset({"search"})
+
+# Certification / standard codes (ISO 9001, ISO-27001, EN 1090) and acronyms
+_CODE_RE = re.compile(r"\b[A-Z]{2,}[- ]?\d{2,}\b|\b[A-Z]{3,}\b")
+# Capitalized words after the first one: names of people, clients, projects
+_NAME_RE = re.compile(r"(?<=\s)[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*")
+# Words that point at the knowledge graph's entity types
+_GRAPH_TERMS = frozenset({
+    "project", "projects", "client", "clients", "team", "member", "members",
+    "certification", "certifications", "certified", "experience", "cv", "cvs",
+    "reference", "references", "delivered", "expert", "experts",
+})
+
+
+@dataclass
+class RetrievalPlan:
+    """How much of the pipeline to run for one query."""
+    profile: str
+    dense_k: int
+    sparse_k: int
+    graph_k: int  # 0 skips the graph leg
+    dense_timeout: float
+    sparse_timeout: float
+    graph_timeout: float
+    fusion_k: int
+    rerank: bool
+    rerank_survivors: int | None
+    rerank_budget_ms: float | None
+    early_exit: bool  # may stop after dense + sparse if they agree
+    entities: list[str] = field(default_factory=list)
+    reasons: list[str] = field(default_factory=list)
+
+
+class QueryPlanner:
+    """Builds a RetrievalPlan from the query mode, length and detected entities."""
+
+    def plan(self, rag_query) -> RetrievalPlan:
+        mode = rag_query.mode.value
+        profile = rag_query.profile or settings.rag_profile
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown retrieval profile: {profile!r}")
+
+        if profile == "fast":
+            top_k = rag_query.top_k or settings.rag_fast_top_k
+            plan = RetrievalPlan(
+                profile=profile,
+                dense_k=top_k,
+                sparse_k=top_k,
+                graph_k=0,
+                dense_timeout=settings.rag_fast_dense_timeout,
+                sparse_timeout=settings.rag_fast_sparse_timeout,
+                graph_timeout=0.0,
+                fusion_k=top_k,
+                rerank=False,
+                rerank_survivors=None,
+                rerank_budget_ms=None,
+                early_exit=False,
+                reasons=["fast profile: dense + sparse only, no re-ranking"],
+            )
+            self._log(rag_query, plan)
+            return plan
+
+        plan = RetrievalPlan(
+            profile=profile,
+            dense_k=rag_query.top_k or settings.rag_top_k_dense,
+            sparse_k=rag_query.top_k or settings.rag_top_k_sparse,
+            graph_k=rag_query.top_k or settings.rag_top_k_graph,
+            dense_timeout=settings.rag_dense_timeout,
+            sparse_timeout=settings.rag_sparse_timeout,
+            graph_timeout=settings.rag_graph_timeout,
+            fusion_k=settings.reranker_depth.get(mode, 20),
+            rerank=True,
+            rerank_survivors=settings.reranker_survivors.get(mode),
+            rerank_budget_ms=(
+                rag_query.rerank_budget_ms if rag_query.rerank_budget_ms is not None
+                else settings.reranker_budget_ms.get(mode)
+            ),
+            early_exit=False,
+        )
+        if not settings.rag_planner_enabled:
+            plan.reasons.append("planner disabled: full pipeline")
+            self._log(rag_query, plan)
+            return plan
+
+        plan.entities = self.detect_entities(rag_query.text)
+        num_tokens = len(rag_query.text.split())
+
+        if mode in _TEXT_MODES and not plan.entities:
+            plan.graph_k = 0
+            plan.reasons.append(f"no entities in a {mode} query: skip graph")
+
+        if mode in _LOOKUP_MODES and num_tokens <= settings.rag_short_query_tokens:
+            # Lookup-style queries: keywords carry them, the cross-encoder adds little
+            plan.rerank = False
+            plan.dense_k = min(plan.dense_k, settings.rag_fast_top_k)
+            plan.reasons.append(f"short query ({num_tokens} tokens): no re-ranking")
+
+        if plan.rerank and mode in settings.rag_early_exit_modes:
+            plan.early_exit = True
+            plan.reasons.append("early exit allowed if dense and sparse agree")
+
+        self._log(rag_query, plan)
+        return plan
+
+    @staticmethod
+    def detect_entities(text: str) -> list[str]:
+        """Cheap entity spotting: codes, capitalized names and graph terms."""
+        entities = _CODE_RE.findall(text) + _NAME_RE.findall(text)
+        entities += [w for w in re.findall(r"[a-z]+", text.lower()) if w in _GRAPH_TERMS]
+        return list(dict.fromkeys(entities))
+
+    @staticmethod
+    def agreement(dense_results: list, sparse_results: list) -> float:
+        """
+        Agreement of the dense and sparse top hits, in [0, 1].
+
+        0 unless both legs have the same top hit; otherwise the overlap of
+        their top `rag_early_exit_depth` chunk ids.
+        """
+        if not dense_results or not sparse_results:
+            return 0.0
+        if dense_results[0].chunk_id != sparse_results[0].chunk_id:
+            return 0.0
+        depth = settings.rag_early_exit_depth
+        dense_top = {c.chunk_id for c in dense_results[:depth]}
+        sparse_top = {c.chunk_id for c in sparse_results[:depth]}
+        return len(dense_top & sparse_top) / max(1, min(depth, len(dense_top), len(sparse_top)))
+
+    @staticmethod
+    def _log(rag_query, plan: RetrievalPlan):
+        logger.info(
+            "Query plan",
+            mode=rag_query.mode.value,
+            profile=plan.profile,
+            dense_k=plan.dense_k,
+            sparse_k=plan.sparse_k,
+            graph_k=plan.graph_k,
+            rerank=plan.rerank,
+            early_exit=plan.early_exit,
+            entities=plan.entities,
+            reasons=plan.reasons,
+        )
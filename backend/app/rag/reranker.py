@@ -5,30 +5,37 @@ Re-ranks fused retrieval results using a cross-encoder model that
 jointly encodes the query and each candidate passage. This provides
 much more accurate relevance scoring than embedding-based similarity
 at the cost of higher latency (applied only to top-N candidates).
+
+To bound that latency, re-ranking runs as a cascade (a small cross-encoder
+shortlists, the full model re-scores the shortlist) within a time budget.
+Depth, shortlist size and budget are configured per query mode. Scores are
+cached per (model, query, chunk content), so repeated queries over the same
+candidates only score the new pairs.
+
+Pairs from concurrent requests are coalesced (`MicroBatcher`) into larger
+model calls, sorted by token length so each padded batch stays within
+`reranker_token_budget`.
 """
 
 from __future__ import annotations
 
-from dataclasses import dataclass
-from functools import lru_cache
+import time
+from concurrent.futures import Executor
+from functools import lru_cache, partial
 
+import numpy as np
 import structlog
 
 from app.config import settings
+from app.rag.batching import MicroBatcher, token_budget_buckets
+from app.rag.candidate import Candidate
+from app.rag.inference import load_cross_encoder
+from app.rag.score_cache import ScoreCache
+from app.rag.versioning import content_hash
 
 logger = structlog.get_logger()
 
 
-@dataclass
-class RerankedResult:
-    """A result after cross-encoder re-ranking."""
-    text: str
-    score: float
-    original_score: float
-    metadata: dict
-    sources: list[str]
-
-
 class Reranker:
     """
     Cross-encoder re-ranker using sentence-transformers CrossEncoder.
@@ -36,80 +43,260 @@ class Reranker:
     Takes the top-N results from rank fusion and re-scores them
     using a cross-encoder that considers query-passage interaction
     at the token level.
+
+    Re-ranking is a cascade: a small first-pass cross-encoder scores every
+    candidate, and only the best `survivors` go through the full model. The
+    full model scores survivors in batches and stops once the next batch
+    would overrun the request's time budget; survivors it did not reach
+    keep their first-pass order and score, below the fully scored ones.
+
+    Model calls go through one micro-batcher per model, running on
+    `executor`, so concurrent requests share forward passes.
     """
 
-    def __init__(self, model_name: str | None = None):
+    def __init__(self, model_name: str | None = None, first_pass_model_name: str | None = None):
         self.model_name = model_name or settings.reranker_model
+        self.first_pass_model_name = (
+            settings.reranker_first_pass_model if first_pass_model_name is None
+            else first_pass_model_name
+        )
         self._model = None
+        self._first_pass_model = None
+        self.score_cache = (
+            ScoreCache(settings.reranker_cache_size) if settings.reranker_cache_enabled else None
+        )
+        self.executor: Executor | None = None
+        self._batchers: dict[str, MicroBatcher[tuple[str, str], float]] = {}
 
     @property
     def model(self):
         """Lazy-load the cross-encoder model."""
         if self._model is None:
-            from sentence_transformers import CrossEncoder
-
-            logger.info("Loading re-ranker model", model=self.model_name)
-            self._model = CrossEncoder(self.model_name)
+            logger.info(
+                "Loading re-ranker model",
+                model=self.model_name,
+                backend=settings.inference_backend,
+            )
+            self._model = load_cross_encoder(self.model_name)
             logger.info("Re-ranker model loaded")
         return self._model
 
-    def rerank(
+    @property
+    def first_pass_model(self):
+        """Lazy-load the first-pass model; None disables the cascade."""
+        if self._first_pass_model is None and self.first_pass_model_name:
+            try:
+                self._first_pass_model = load_cross_encoder(self.first_pass_model_name)
+                logger.info("First-pass re-ranker model loaded", model=self.first_pass_model_name)
+            except Exception as e:
+                logger.warning(
+                    "First-pass re-ranker unavailable, using the full model only",
+                    model=self.first_pass_model_name,
+                    error=str(e),
+                )
+                self.first_pass_model_name = ""
+        return self._first_pass_model
+
+    async def rerank(
         self,
         query: str,
-        results: list[dict],
+        results: list[Candidate],
         top_k: int | None = None,
-    ) -> list[RerankedResult]:
+        survivors: int | None = None,
+        budget_ms: float | None = None,
+    ) -> list[Candidate]:
         """
-        Re-rank results using the cross-encoder.
+        Re-rank results using the cross-encoder cascade.
 
         Args:
             query: The original search query.
-            results: List of candidate results with "text", "score",
-                     "metadata", and "sources" keys.
+            results: Fused candidates, best first.
             top_k: Number of re-ranked results to return.
+            survivors: Candidates kept after the first pass for the full
+                       model (None: every candidate, no first pass).
+            budget_ms: Re-ranking time budget (None or 0: unbounded).
 
         Returns:
-            List of RerankedResult sorted by cross-encoder score (descending).
+            Copies of the top candidates sorted by cross-encoder score
+            (descending), with `score` set to it (`fused_score` keeps the
+            fusion score). `results` is left unchanged.
         """
         top_k = top_k or settings.rag_top_k_final
 
         if not results:
             return []
 
-        # Build query-passage pairs for the cross-encoder
-        pairs = [(query, r["text"]) for r in results]
+        start = time.perf_counter()
+        deadline = start + budget_ms / 1000 if budget_ms else None
+        texts = [c.text for c in results]
+        if self.score_cache is not None:
+            query_key = self.score_cache.query_key(query)
+            hashes = [content_hash(t) for t in texts]
+            document_ids = [c.metadata.get("document_id") for c in results]
 
-        # Score all pairs
-        scores = self.model.predict(pairs, show_progress_bar=False)
+        async def score(model_name: str, indices: list[int]) -> list[float]:
+            if self.score_cache is None:
+                return await self._predict(model_name, query, [texts[i] for i in indices])
+            return await self._score_cached(
+                model_name,
+                query,
+                query_key,
+                [texts[i] for i in indices],
+                [hashes[i] for i in indices],
+                [document_ids[i] for i in indices],
+            )
 
-        # Combine with original results
-        reranked = []
-        for result, ce_score in zip(results, scores):
-            reranked.append(
-                RerankedResult(
-                    text=result["text"],
-                    score=float(ce_score),
-                    original_score=result.get("score", 0.0),
-                    metadata=result.get("metadata", {}),
-                    sources=result.get("sources", []),
+        # Stage 1: cheap scores for every candidate, keep the best survivors
+        order = list(range(len(results)))
+        first_scores = None
+        if survivors and max(survivors, top_k) < len(results) and self.first_pass_model_name:
+            try:
+                first_scores = await score(self.first_pass_model_name, order)
+            except Exception as e:
+                logger.warning(
+                    "First-pass re-ranking failed, using the full model only", error=str(e)
                 )
-            )
+            else:
+                order.sort(key=lambda i: first_scores[i], reverse=True)
+                order = order[:max(survivors, top_k)]
 
-        # Sort by cross-encoder score
-        reranked.sort(key=lambda x: x.score, reverse=True)
+        # Stage 2: full model on the survivors, batch by batch within the budget
+        full_scores: dict[int, float] = {}
+        batch_size = max(1, settings.reranker_batch_size)
+        last_batch = 0.0
+        for pos in range(0, len(order), batch_size):
+            now = time.perf_counter()
+            if deadline is not None and now + last_batch > deadline and (
+                full_scores or first_scores is not None
+            ):
+                break
+            batch = order[pos:pos + batch_size]
+            full_scores.update(zip(batch, await score(self.model_name, batch)))
+            last_batch = time.perf_counter() - now
 
-        # Take top_k
-        reranked = reranked[:top_k]
+        # Fully scored candidates first, then the rest in first-pass order
+        ranked = sorted(full_scores, key=full_scores.get, reverse=True)
+        ranked += [i for i in order if i not in full_scores]
+
+        # Rescored copies: the caller's candidates keep their fusion scores
+        reranked = []
+        for i in ranked[:top_k]:
+            candidate = results[i]
+            if i in full_scores:
+                candidate = candidate.rescored(full_scores[i])
+            elif first_scores is not None:
+                candidate = candidate.rescored(first_scores[i])
+            reranked.append(candidate)
 
         logger.debug(
             "Re-ranking complete",
             candidates=len(results),
+            survivors=len(order),
+            fully_scored=len(full_scores),
             returned=len(reranked),
+            elapsed_ms=round((time.perf_counter() - start) * 1000, 1),
+            budget_ms=budget_ms,
             top_score=reranked[0].score if reranked else None,
         )
 
         return reranked
 
+    async def _score_cached(
+        self,
+        model_name: str,
+        query: str,
+        query_key: str,
+        texts: list[str],
+        hashes: list[str],
+        document_ids: list[int | None],
+    ) -> list[float]:
+        """Scores from the cache, running the model only on uncached pairs."""
+        scores = self.score_cache.get_many(model_name, query_key, hashes)
+        missing = [i for i, s in enumerate(scores) if s is None]
+        if missing:
+            start = time.perf_counter()
+            fresh = await self._predict(model_name, query, [texts[i] for i in missing])
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            for i, s in zip(missing, fresh):
+                scores[i] = s
+            self.score_cache.put_many(
+                model_name,
+                query_key,
+                [(hashes[i], document_ids[i], scores[i]) for i in missing],
+                elapsed_ms,
+            )
+        return scores
+
+    async def _predict(self, model_name: str, query: str, texts: list[str]) -> list[float]:
+        """Cross-encoder scores of (query, text) pairs, batched across requests."""
+        batcher = self._batchers.get(model_name)
+        if batcher is None:
+            batcher = self._batchers[model_name] = MicroBatcher(
+                partial(self._predict_batch, model_name),
+                max_batch_size=settings.reranker_max_batch_pairs,
+                max_wait_ms=settings.reranker_batch_wait_ms,
+                executor=self.executor,
+                name=f"rerank:{model_name}",
+                max_concurrent=1,
+            )
+        return await batcher.submit_many([(query, text) for text in texts])
+
+    def _predict_batch(self, model_name: str, pairs: list[tuple[str, str]]) -> list[float]:
+        """
+        Score pairs from any number of requests (runs on the executor).
+
+        Pairs are sorted by token length and split so that each forward pass
+        holds at most `reranker_token_budget` padded tokens.
+        """
+        model = self.model if model_name == self.model_name else self.first_pass_model
+        if model is None:
+            raise RuntimeError(f"Re-ranker model {model_name!r} is unavailable")
+
+        scores = np.empty(len(pairs), dtype=np.float32)
+        for indices in self._length_buckets(model, pairs):
+            batch_scores = model.predict(
+                [pairs[i] for i in indices],
+                batch_size=len(indices),
+                show_progress_bar=False,
+            )
+            scores[indices] = batch_scores
+        return scores.tolist()
+
+    @staticmethod
+    def _length_buckets(model, pairs: list[tuple[str, str]]) -> list[list[int]]:
+        """Group pair indices, longest first, into batches within the token budget."""
+        tokenizer = getattr(model, "tokenizer", None)
+        if tokenizer is None:
+            # Roughly four characters per token
+            lengths = np.fromiter(
+                ((len(q) + len(t)) // 4 + 3 for q, t in pairs), dtype=np.int64, count=len(pairs)
+            )
+        else:
+            max_length = getattr(model, "max_length", None) or 512
+            encoded = tokenizer(
+                [q for q, _ in pairs],
+                [t for _, t in pairs],
+                truncation=True,
+                max_length=max_length,
+                return_attention_mask=False,
+                return_token_type_ids=False,
+            )
+            lengths = np.fromiter(
+                (len(ids) for ids in encoded["input_ids"]), dtype=np.int64, count=len(pairs)
+            )
+        return token_budget_buckets(
+            lengths,
+            settings.reranker_token_budget,
+            settings.reranker_max_batch_pairs,
+        )
+
+    def stats(self) -> dict:
+        """Stats of the score cache (None when disabled) and the per-model batchers."""
+        return {
+            "cache": self.score_cache.stats() if self.score_cache is not None else None,
+            "batching": {name: b.stats() for name, b in self._batchers.items()},
+        }
+
 
 @lru_cache(maxsize=1)
 def get_reranker() -> Reranker:
@@ -0,0 +1,142 @@
+"""
+TenderWriter — Re-Ranker Score Cache
+
+Compliance checks and section regeneration send the same (or trivially
+reworded) queries against the same candidate chunks again and again. This
+bounded in-memory LRU cache keeps cross-encoder scores so only unseen
+(query, chunk) pairs reach the model.
+
+Entries are keyed by (model_name, hash of the normalized query, content hash
+of the chunk text). Because the key covers the chunk's content, an entry can
+never score different text; dropping a re-ingested document's entries
+(`invalidate_document`) mainly frees what its old version used.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Weight of the latest model call in the per-pair latency estimate
+_LATENCY_SMOOTHING = 0.2
+
+
+class ScoreCache:
+    """
+    LRU cache of cross-encoder scores, indexed by document for invalidation.
+
+    Also estimates what cache hits saved: each model keeps a running average
+    of milliseconds per scored pair, credited once per hit. Thread-safe:
+    re-ranking runs on executor threads.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.time_saved_ms = 0.0
+        self._entries: OrderedDict[tuple[str, str, str], tuple[float, int | None]] = OrderedDict()
+        self._by_document: dict[int, set[tuple[str, str, str]]] = {}
+        self._ms_per_pair: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def query_key(query: str) -> str:
+        """
+        Hash of the query with case and whitespace normalized.
+
+        The default re-rankers are uncased, so case never changes a score.
+        """
+        normalized = " ".join(query.lower().split())
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+    def get_many(
+        self,
+        model_name: str,
+        query_key: str,
+        content_hashes: list[str],
+    ) -> list[float | None]:
+        """Cached scores for each chunk hash (None where missing)."""
+        scores: list[float | None] = []
+        with self._lock:
+            for content_hash in content_hashes:
+                key = (model_name, query_key, content_hash)
+                entry = self._entries.get(key)
+                if entry is None:
+                    scores.append(None)
+                    continue
+                self._entries.move_to_end(key)
+                scores.append(entry[0])
+            found = sum(s is not None for s in scores)
+            self.hits += found
+            self.misses += len(scores) - found
+            self.time_saved_ms += found * self._ms_per_pair.get(model_name, 0.0)
+        return scores
+
+    def put_many(
+        self,
+        model_name: str,
+        query_key: str,
+        items: list[tuple[str, int | None, float]],
+        elapsed_ms: float,
+    ):
+        """
+        Store (content_hash, document_id, score) items scored in one model call.
+
+        `elapsed_ms` is the duration of that call, for the time-saved estimate.
+        """
+        if not items:
+            return
+        with self._lock:
+            per_pair = elapsed_ms / len(items)
+            previous = self._ms_per_pair.get(model_name)
+            self._ms_per_pair[model_name] = per_pair if previous is None else (
+                previous + _LATENCY_SMOOTHING * (per_pair - previous)
+            )
+
+            for content_hash, document_id, score in items:
+                key = (model_name, query_key, content_hash)
+                self._entries[key] = (score, document_id)
+                self._entries.move_to_end(key)
+                if document_id is not None:
+                    self._by_document.setdefault(document_id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                key, (_, document_id) = self._entries.popitem(last=False)
+                self._forget(key, document_id)
+                self.evictions += 1
+
+    def invalidate_document(self, document_id: int) -> int:
+        """Drop every entry for chunks of a document; returns the count."""
+        with self._lock:
+            keys = self._by_document.pop(document_id, set())
+            for key in keys:
+                self._entries.pop(key, None)
+            self.invalidations += len(keys)
+        return len(keys)
+
+    def _forget(self, key: tuple[str, str, str], document_id: int | None):
+        """Remove an evicted key from the document index (caller holds the lock)."""
+        if document_id is None:
+            return
+        keys = self._by_document.get(document_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_document[document_id]
+
+    def stats(self) -> dict:
+        """Hit/miss counters, estimated time saved and current size."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "time_saved_ms": round(self.time_saved_ms, 1),
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+        }
@@ -3,18 +3,46 @@ TenderWriter — Sparse Retriever (BM25 Keyword Search)
 
 Performs keyword-based retrieval using the BM25 algorithm.
 Chunks and their BM25 tokens are stored in PostgreSQL for persistence.
-The BM25 index is rebuilt on startup and incrementally updated.
+The BM25 index is updated incrementally; deletions are tombstoned and
+reclaimed by a background compaction pass. The index is persisted as a
+memory-mapped snapshot so it survives restarts. Chunk texts and metadata
+live in compact `ChunkStore` byte buffers rather than Python objects, and
+are decoded only for the chunks a search returns.
+
+In shared mode (`sparse_shared_mode`) several uvicorn workers or replicas
+share one snapshot root. A worker applies its mutations locally and queues
+them; the background saver takes the cross-process writer lock, loads any
+generation published by another worker meanwhile, replays the queued
+mutations on top and publishes the result as a new generation. The other
+workers swap it in via mmap — optionally woken up by a Redis notification —
+without re-tokenizing the corpus. Mutations never wait for the lock.
 """
 
 from __future__ import annotations
 
+import asyncio
+import json
 import re
-from dataclasses import dataclass
+import threading
+import time
+from contextlib import nullcontext
+from pathlib import Path
+from typing import AsyncIterable, Awaitable, Callable
 
 import structlog
-from rank_bm25 import BM25Okapi
 
 from app.config import settings
+from app.rag.bm25_index import BM25Index
+from app.rag.candidate import Candidate
+from app.rag.chunk_store import ChunkStore
+from app.rag.filters import MetadataBitmapIndex, MetadataFilter
+from app.rag.fingerprint import chunk_digest, combine
+from app.rag.sparse_snapshot import (
+    current_generation,
+    read_snapshot,
+    snapshot_lock,
+    write_snapshot,
+)
 
 logger = structlog.get_logger()
 
@@ -31,15 +59,6 @@ STOP_WORDS = {
 }
 
 
-@dataclass
-class SparseSearchResult:
-    """A single result from BM25 search."""
-    text: str
-    score: float
-    metadata: dict
-    chunk_index: int
-
-
 class SparseRetriever:
     """
     Sparse retrieval using BM25 (Best Matching 25).
@@ -49,11 +68,39 @@ class SparseRetriever:
     might miss (technical specs, model numbers, certification codes, etc.).
     """
 
-    def __init__(self):
-        self._corpus_texts: list[str] = []
-        self._corpus_metadata: list[dict] = []
-        self._tokenized_corpus: list[list[str]] = []
-        self._bm25: BM25Okapi | None = None
+    def __init__(self, snapshot_dir: str | None = None):
+        self._corpus_texts = ChunkStore()
+        self._corpus_metadata = ChunkStore()  # compact JSON per slot
+        self._index = BM25Index()
+        self._meta_index = MetadataBitmapIndex()
+        # Fingerprint of the live chunks, compared with Qdrant's on restore
+        self._fingerprint = 0
+        # Guards the index and the slot-aligned corpus stores; searches run on
+        # executor threads while ingestion and compaction mutate the index.
+        self._lock = threading.RLock()
+        self._compaction_thread: threading.Thread | None = None
+
+        # Snapshot persistence
+        self.snapshot_dir = Path(snapshot_dir or settings.sparse_snapshot_dir)
+        self._dirty = False
+        self._save_lock = threading.Lock()
+        self._save_pending = False
+        self._save_thread: threading.Thread | None = None
+        # Set to skip the wait between background writes (shutdown)
+        self._save_wake = threading.Event()
+        self._last_save = 0.0
+        self._generation = 0
+        # Shared mode: mutations applied locally but not yet published, as
+        # (method, args); replayed onto newer generations from other workers
+        self._pending: list[tuple[str, tuple]] = []
+        # Serializes loading and publishing generations
+        self._publish_lock = threading.RLock()
+
+        # Shared mode: follow generations published by other workers
+        self._sync_thread: threading.Thread | None = None
+        self._sync_stop = threading.Event()
+        self._redis = None
+        self._redis_checked = False
 
     def _tokenize(self, text: str) -> list[str]:
         """
@@ -77,51 +124,68 @@ class SparseRetriever:
             texts: List of chunk texts.
             metadatas: List of metadata dicts, one per chunk.
         """
-        self._corpus_texts = texts
-        self._corpus_metadata = metadatas
-        self._tokenized_corpus = [self._tokenize(t) for t in texts]
+        self._mutate("_apply_rebuild", texts, metadatas)
 
-        if self._tokenized_corpus:
-            self._bm25 = BM25Okapi(self._tokenized_corpus)
+        if texts:
             logger.info("BM25 index built", corpus_size=len(texts))
         else:
-            self._bm25 = None
             logger.warning("BM25 index is empty — no documents to index")
 
     def add_chunks(self, texts: list[str], metadatas: list[dict]):
         """
         Incrementally add chunks to the existing BM25 index.
 
-        Note: BM25Okapi doesn't support true incremental updates,
-        so we rebuild the full index. For large corpora, consider
-        periodic batch rebuilds in a background task.
+        Only the new chunks are tokenized and appended to the postings,
+        so the cost is proportional to the size of the upload.
         """
-        self._corpus_texts.extend(texts)
-        self._corpus_metadata.extend(metadatas)
-        self._tokenized_corpus.extend([self._tokenize(t) for t in texts])
+        self._mutate("_apply_add", texts, metadatas)
+        logger.debug("BM25 index updated", new_chunks=len(texts), total=self.corpus_size)
+
+    def _reset(self):
+        """Start from an empty index (caller holds the lock)."""
+        self._corpus_texts = ChunkStore()
+        self._corpus_metadata = ChunkStore()
+        self._index = BM25Index()
+        self._meta_index = MetadataBitmapIndex()
+        self._fingerprint = 0
+
+    def _append(self, texts: list[str], metadatas: list[dict]):
+        """Tokenize and append chunks to the index (caller holds the lock)."""
+        for text, metadata in zip(texts, metadatas):
+            slot = self._index.add(self._tokenize(text))
+            self._meta_index.add(slot, metadata)
+            self._corpus_texts.append(text)
+            self._corpus_metadata.append(
+                json.dumps(metadata, ensure_ascii=False, separators=(",", ":"), default=str)
+            )
+            self._fingerprint = combine(self._fingerprint, chunk_digest(metadata))
 
-        if self._tokenized_corpus:
-            self._bm25 = BM25Okapi(self._tokenized_corpus)
-            logger.debug("BM25 index updated", new_chunks=len(texts), total=len(self._corpus_texts))
+    def _tombstone(self, slot: int, metadata: dict | None = None):
+        """Delete a live slot from the index (caller holds the lock)."""
+        if metadata is None:
+            metadata = json.loads(self._corpus_metadata[slot])
+        self._index.delete(slot, self._tokenize(self._corpus_texts[slot]))
+        self._fingerprint = combine(self._fingerprint, chunk_digest(metadata), -1)
 
     def search(
         self,
         query: str,
         top_k: int | None = None,
-        filters: dict | None = None,
-    ) -> list[SparseSearchResult]:
+        filters: dict | MetadataFilter | None = None,
+    ) -> list[Candidate]:
         """
         Search the BM25 index for relevant chunks.
 
         Args:
             query: The search query text.
             top_k: Number of results to return.
-            filters: Optional metadata filters (applied post-retrieval).
+            filters: Optional metadata filters, pushed down through the
+                     metadata bitmap index so only matching chunks are scored.
 
         Returns:
-            List of SparseSearchResult ordered by BM25 score (descending).
+            List of Candidate ordered by BM25 score (descending).
         """
-        if self._bm25 is None or not self._corpus_texts:
+        if not self.corpus_size:
             logger.warning("BM25 search called but index is empty")
             return []
 
@@ -131,64 +195,462 @@ class SparseRetriever:
         if not query_tokens:
             return []
 
-        scores = self._bm25.get_scores(query_tokens)
+        metadata_filter = MetadataFilter.compile(filters)
+        # Only collect the postings under the lock and score outside it, so
+        # concurrent searches do not queue behind each other. The corpus stores
+        # are append-only and compaction replaces them, so the references taken
+        # here stay aligned with the slots being scored.
+        with self._lock:
+            mask = self._meta_index.mask(metadata_filter, self._index.num_slots)
+            prepared = self._index.prepare(query_tokens)
+            texts, metadatas = self._corpus_texts, self._corpus_metadata
+
+        slots, scores = prepared.search(
+            top_k=top_k,
+            mask=mask,
+            prune_min_terms=settings.sparse_maxscore_min_terms,
+        )
+        results = [
+            Candidate.from_chunk(texts[slot], json.loads(metadatas[slot]), score)
+            for slot, score in zip(slots.tolist(), scores.tolist())
+        ]
 
-        # Get top-k indices
-        scored_indices = sorted(enumerate(scores), key=lambda x: x[1], reverse=True)
+        logger.debug("BM25 search complete", query_tokens=len(query_tokens), results=len(results))
+        return results
 
-        results: list[SparseSearchResult] = []
-        for idx, score in scored_indices:
-            if score <= 0:
-                continue
+    def remove_by_document(self, document_id: int):
+        """
+        Remove all chunks belonging to a specific document.
+
+        Chunks are tombstoned rather than removed; once the tombstone ratio
+        exceeds `sparse_compaction_ratio` a background compaction reclaims them.
+        """
+        removed = self._mutate("_apply_remove", document_id, None)
+        logger.info("Removed document from BM25 index", document_id=document_id, chunks=removed)
+
+    def remove_chunks(self, document_id: int, chunk_ids: set[str]) -> int:
+        """
+        Remove the given chunks of a document (delta re-ingestion).
+
+        Chunks indexed before chunk ids existed have none and are removed
+        too: a re-ingest replaces all of them.
+        """
+        if not chunk_ids:
+            return 0
+        removed = self._mutate("_apply_remove", document_id, frozenset(chunk_ids))
+        logger.info("Removed chunks from BM25 index", document_id=document_id, chunks=removed)
+        return removed
+
+    def update_chunks(self, texts: list[str], metadatas: list[dict]):
+        """
+        Replace stored chunks whose metadata changed (owner, duplicate sources).
 
-            metadata = self._corpus_metadata[idx]
+        The live slot with the same owner document and chunk id (or text, for
+        chunks without an id) is tombstoned and the new version appended.
+        Chunks not found are simply added.
+        """
+        if not texts:
+            return
+        self._mutate("_apply_update", texts, metadatas)
+        logger.debug("BM25 chunks updated", chunks=len(texts), total=self.corpus_size)
 
-            # Apply post-retrieval filters
-            if filters:
-                if not self._matches_filters(metadata, filters):
+    def _mutate(self, method: str, *args) -> int:
+        """
+        Apply a mutation (an `_apply_*` method) to the in-memory index.
+
+        In shared mode the mutation is also queued. The background saver
+        replays queued mutations on top of any generation another worker
+        published in the meantime before publishing (see `save_snapshot`), so
+        mutations never wait for the cross-process lock or a snapshot write.
+        """
+        with self._lock:
+            changed = getattr(self, method)(*args)
+            if changed:
+                self._dirty = True
+                if settings.sparse_shared_mode:
+                    self._pending.append((method, args))
+
+        if changed and method in ("_apply_remove", "_apply_update"):
+            self._schedule_compaction()
+        return changed
+
+    def _apply_rebuild(self, texts: list[str], metadatas: list[dict]) -> int:
+        self._reset()
+        self._append(texts, metadatas)
+        return len(texts) or 1  # an emptied index is a change too
+
+    def _apply_add(self, texts: list[str], metadatas: list[dict]) -> int:
+        self._append(texts, metadatas)
+        return len(texts)
+
+    def _apply_remove(self, document_id: int, chunk_ids: frozenset[str] | None) -> int:
+        """Tombstone a document's chunks (all if `chunk_ids` is None, plus those without an id)."""
+        removed = 0
+        for slot in self._meta_index.slots("document_id", document_id).tolist():
+            if not self._index.is_live(slot):
+                continue
+            metadata = json.loads(self._corpus_metadata[slot])
+            if chunk_ids is not None:
+                chunk_id = metadata.get("chunk_id")
+                if chunk_id and chunk_id not in chunk_ids:
+                    continue
+            self._tombstone(slot, metadata)
+            removed += 1
+        return removed
+
+    def _apply_update(self, texts: list[str], metadatas: list[dict]) -> int:
+        for text, metadata in zip(texts, metadatas):
+            chunk_id = metadata.get("chunk_id")
+            owned = self._meta_index.slots("document_id", metadata.get("document_id")).tolist()
+            for slot in owned:
+                if not self._index.is_live(slot):
                     continue
+                stored = json.loads(self._corpus_metadata[slot])
+                if chunk_id:
+                    same = stored.get("chunk_id") == chunk_id
+                else:
+                    same = self._corpus_texts[slot] == text
+                if same:
+                    self._tombstone(slot, stored)
+                    break
+        self._append(texts, metadatas)
+        return len(texts)
+
+    def _schedule_compaction(self):
+        """Start a background compaction if enough of the index is tombstoned."""
+        if self._index.tombstone_ratio < settings.sparse_compaction_ratio:
+            return
+        if self._compaction_thread is not None and self._compaction_thread.is_alive():
+            return
+
+        self._compaction_thread = threading.Thread(
+            target=self.compact,
+            name="bm25-compaction",
+            daemon=True,
+        )
+        self._compaction_thread.start()
+
+    def compact(self):
+        """
+        Drop tombstoned chunks from the postings and the corpus storage.
 
-            results.append(
-                SparseSearchResult(
-                    text=self._corpus_texts[idx],
-                    score=float(score),
-                    metadata=metadata,
-                    chunk_index=idx,
-                )
-            )
+        Compaction changes slot numbers, not content, so it is not queued as a
+        mutation in shared mode: it is published with the next snapshot.
+        """
+        with self._lock:
+            before = self._index.num_slots
+            survivors = self._index.compact()
+            self._corpus_texts = self._corpus_texts.take(survivors)
+            self._corpus_metadata = self._corpus_metadata.take(survivors)
+            self._meta_index.compact(survivors, before)
+            self._dirty = True
+
+        logger.info("BM25 index compacted", reclaimed=before - len(survivors), total=len(survivors))
+
+    # ──────────────────────────────────────────────
+    # Persistence
+    # ──────────────────────────────────────────────
+
+    def _writer_lock(self):
+        """Cross-process writer lock in shared mode, a no-op otherwise."""
+        if settings.sparse_shared_mode:
+            return snapshot_lock(self.snapshot_dir)
+        return nullcontext()
+
+    async def restore(
+        self,
+        fingerprint_stored: Callable[[], Awaitable[int]],
+        iter_stored: Callable[[], AsyncIterable[tuple[str, dict]]],
+    ):
+        """
+        Load the snapshot, rebuilding from the stored chunks only when the
+        snapshot is missing or stale.
 
-            if len(results) >= top_k:
-                break
+        Staleness is decided by the corpus fingerprint (see
+        app.rag.fingerprint), not the chunk count: replacing N chunks with N
+        others, or moving a shared chunk to another owner, changes it.
 
-        logger.debug("BM25 search complete", query_tokens=len(query_tokens), results=len(results))
-        return results
+        The stored chunks are read without holding the writer lock; the
+        rebuilt index is published under it on an executor thread.
 
-    def _matches_filters(self, metadata: dict, filters: dict) -> bool:
-        """Check if a chunk's metadata matches the given filters."""
-        for key, value in filters.items():
-            meta_value = metadata.get(key)
-            if meta_value is None:
-                return False
-            if isinstance(value, list):
-                if meta_value not in value:
-                    return False
-            elif meta_value != value:
+        Args:
+            fingerprint_stored: Returns the fingerprint of the chunks in the
+                                source of truth.
+            iter_stored: Yields (text, metadata) for every stored chunk.
+        """
+        loaded = self.load_snapshot()
+
+        try:
+            stored = await fingerprint_stored()
+        except Exception as e:
+            logger.warning("Cannot verify BM25 snapshot against stored chunks", error=str(e))
+            return
+
+        if loaded and self.fingerprint == stored:
+            return
+
+        logger.info(
+            "Rebuilding BM25 index from stored chunks",
+            snapshot_chunks=self.corpus_size if loaded else None,
+            stale=loaded,
+        )
+        texts: list[str] = []
+        metadatas: list[dict] = []
+        async for text, metadata in iter_stored():
+            texts.append(text)
+            metadatas.append(metadata)
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._publish_rebuild, texts, metadatas)
+        logger.info("BM25 index rebuilt", corpus_size=self.corpus_size)
+
+    def _publish_rebuild(self, texts: list[str], metadatas: list[dict]):
+        """Replace the index with a rebuilt one and publish it, unless a peer just did."""
+        expected = 0
+        for metadata in metadatas:
+            expected = combine(expected, chunk_digest(metadata))
+        with self._writer_lock():
+            # Another worker may have rebuilt while we were reading the chunks
+            if settings.sparse_shared_mode and self.refresh() and self.fingerprint == expected:
+                return
+            with self._lock:
+                self._reset()
+                self._append(texts, metadatas)
+                self._pending.clear()
+            self._publish()
+
+    def refresh(self) -> bool:
+        """
+        Load the newest published snapshot if it is newer than ours.
+
+        Mutations queued but not yet published are replayed on top of it.
+        """
+        with self._publish_lock:
+            if current_generation(self.snapshot_dir) <= self._generation:
                 return False
+            return self.load_snapshot()
+
+    def load_snapshot(self) -> bool:
+        """
+        Replace the in-memory index with the latest on-disk snapshot.
+
+        Returns:
+            True if a snapshot was loaded.
+        """
+        snapshot = read_snapshot(self.snapshot_dir)
+        if snapshot is None:
+            logger.info("No BM25 snapshot found", path=str(self.snapshot_dir))
+            return False
+
+        arrays, documents = snapshot["arrays"], snapshot["json"]
+        index = BM25Index.from_state(arrays, snapshot["manifest"]["index"], documents["terms"])
+        meta_index = MetadataBitmapIndex.from_state(documents["meta_keys"], arrays)
+        with self._lock:
+            self._index = index
+            self._meta_index = meta_index
+            self._corpus_texts = snapshot["stores"]["texts"]
+            self._corpus_metadata = snapshot["stores"]["metadata"]
+            self._generation = snapshot["manifest"]["generation"]
+            self._fingerprint = snapshot["manifest"].get("fingerprint")
+            if self._fingerprint is None:
+                # Written before fingerprints were recorded
+                self._fingerprint = self._compute_fingerprint()
+            for method, args in self._pending:
+                getattr(self, method)(*args)
+            self._dirty = bool(self._pending)
+
+        logger.info(
+            "BM25 snapshot loaded",
+            generation=snapshot["manifest"]["generation"],
+            corpus_size=self.corpus_size,
+            replayed=len(self._pending),
+        )
         return True
 
-    def remove_by_document(self, document_id: int):
-        """Remove all chunks belonging to a specific document and rebuild."""
-        new_texts = []
-        new_metas = []
-        for text, meta in zip(self._corpus_texts, self._corpus_metadata):
-            if meta.get("document_id") != document_id:
-                new_texts.append(text)
-                new_metas.append(meta)
+    def save_snapshot(self):
+        """
+        Write the current index to a new snapshot generation.
 
-        self.build_index(new_texts, new_metas)
-        logger.info("Removed document from BM25 index", document_id=document_id)
+        In shared mode this holds the writer lock, and first loads any
+        generation another worker published since ours, with our queued
+        mutations replayed on top, so no worker's changes are lost. It runs
+        on the background saver thread (`commit`) or at shutdown, never
+        while a request is waiting.
+        """
+        with self._writer_lock():
+            if settings.sparse_shared_mode:
+                self.refresh()
+            self._publish()
+
+    def _publish(self):
+        """Write and publish the in-memory index (caller holds the writer lock)."""
+        with self._publish_lock:
+            # Only copies under the lock; the tail merge and the file writes
+            # run outside it, so searches and ingestion are not held up
+            with self._lock:
+                index = self._index.export_copy()
+                meta_keys, meta_arrays = self._meta_index.export_state()
+                texts = self._corpus_texts.snapshot()
+                metadatas = self._corpus_metadata.snapshot()
+                fingerprint = self._fingerprint
+                published = len(self._pending)
+                self._dirty = False
+
+            arrays, scalars, terms = index.export_state()
+            generation = write_snapshot(
+                self.snapshot_dir,
+                arrays={**arrays, **meta_arrays},
+                json_files={"terms": terms, "meta_keys": meta_keys},
+                stores={"texts": texts, "metadata": metadatas},
+                manifest={"index": scalars, "fingerprint": fingerprint},
+                keep=settings.sparse_snapshot_keep,
+                prune_grace=settings.sparse_snapshot_prune_grace,
+            )
+            with self._lock:
+                self._generation = generation
+                del self._pending[:published]
+        self._notify()
+
+    def commit(self):
+        """
+        Persist pending changes in the background.
+
+        Writes are at least `sparse_snapshot_interval` seconds apart; commits
+        that arrive in between (one per ingested batch) or while a snapshot
+        is being written are coalesced into a single follow-up write.
+        """
+        if not self._dirty:
+            return
+
+        with self._save_lock:
+            self._save_pending = True
+            if self._save_thread is None:
+                self._save_thread = threading.Thread(
+                    target=self._save_loop,
+                    name="bm25-snapshot",
+                    daemon=True,
+                )
+                self._save_thread.start()
+
+    def _save_loop(self):
+        while True:
+            with self._save_lock:
+                if not self._save_pending:
+                    self._save_thread = None
+                    return
+            # Commits arriving during the wait are written together after it
+            delay = self._last_save + settings.sparse_snapshot_interval - time.monotonic()
+            if delay > 0:
+                self._save_wake.wait(delay)
+            with self._save_lock:
+                self._save_pending = False
+            try:
+                self.save_snapshot()
+            except Exception as e:
+                logger.error("BM25 snapshot write failed", error=str(e))
+            self._last_save = time.monotonic()
+
+    # ──────────────────────────────────────────────
+    # Shared mode (multi-worker)
+    # ──────────────────────────────────────────────
+
+    def start_sync(self):
+        """Start following generations published by other workers (shared mode only)."""
+        if not settings.sparse_shared_mode or self._sync_thread is not None:
+            return
+
+        self._sync_stop.clear()
+        self._sync_thread = threading.Thread(
+            target=self._sync_loop,
+            name="bm25-sync",
+            daemon=True,
+        )
+        self._sync_thread.start()
+
+    def _sync_loop(self):
+        """Reload newer generations on Redis notifications, or by polling `CURRENT`."""
+        pubsub = None
+        client = self._redis_client()
+        if client is not None:
+            try:
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(settings.sparse_shared_channel)
+            except Exception as e:
+                logger.warning("BM25 sync subscription failed, polling instead", error=str(e))
+                pubsub = None
+
+        interval = settings.sparse_shared_poll_interval
+        while not self._sync_stop.is_set():
+            if pubsub is not None:
+                try:
+                    pubsub.get_message(timeout=interval)
+                except Exception as e:
+                    logger.warning("BM25 sync subscription lost, polling instead", error=str(e))
+                    pubsub = None
+            else:
+                self._sync_stop.wait(interval)
+
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning("BM25 snapshot refresh failed", error=str(e))
+
+        if pubsub is not None:
+            pubsub.close()
+
+    def _redis_client(self):
+        """Lazily create the Redis client used for change notifications."""
+        if not self._redis_checked and settings.sparse_shared_notify:
+            self._redis_checked = True
+            try:
+                import redis
+            except ImportError:
+                logger.warning("redis not available, BM25 sync falls back to polling")
+                return None
+            self._redis = redis.Redis.from_url(settings.redis_url)
+        return self._redis
+
+    def _notify(self):
+        """Tell the other workers that a new generation was published."""
+        if not settings.sparse_shared_mode:
+            return
+        client = self._redis_client()
+        if client is None:
+            return
+        try:
+            client.publish(settings.sparse_shared_channel, self._generation)
+        except Exception as e:
+            logger.warning("BM25 change notification failed", error=str(e))
+
+    def shutdown(self):
+        """Stop syncing, wait for background writes and flush any unsaved changes."""
+        if self._sync_thread is not None:
+            self._sync_stop.set()
+            self._sync_thread.join()
+            self._sync_thread = None
+
+        self._save_wake.set()
+        thread = self._save_thread
+        if thread is not None:
+            thread.join()
+        if self._dirty:
+            self.save_snapshot()
+
+    def _compute_fingerprint(self) -> int:
+        """Fingerprint of the live chunks from their metadata (caller holds the lock)."""
+        fingerprint = 0
+        for slot in range(self._index.num_slots):
+            if self._index.is_live(slot):
+                metadata = json.loads(self._corpus_metadata[slot])
+                fingerprint = combine(fingerprint, chunk_digest(metadata))
+        return fingerprint
 
     @property
     def corpus_size(self) -> int:
-        """Number of chunks in the index."""
-        return len(self._corpus_texts)
+        """Number of live chunks in the index."""
+        return self._index.num_docs
+
+    @property
+    def fingerprint(self) -> int:
+        """Fingerprint of the live chunks (see app.rag.fingerprint)."""
+        return self._fingerprint
@@ -0,0 +1,204 @@
+"""
+TenderWriter — Sparse Index Snapshots
+
+On-disk format for the BM25 index so it survives restarts without
+re-tokenizing the corpus.
+
+Layout under the snapshot root:
+
+    CURRENT                  name of the active generation directory
+    gen-00000042/
+        manifest.json        format version, BM25 parameters, corpus statistics
+        terms.json           vocabulary, in term-id order
+        meta_keys.json       (field, value) keys of the metadata bitmap index
+        indptr.npy ...       CSR postings, doc lengths, tombstones, df per term,
+                             metadata bitmap slots
+        texts.bin            chunk texts (UTF-8), one ChunkStore
+        texts_offsets.npy
+        metadata.bin         chunk metadata (JSON), one ChunkStore
+        metadata_offsets.npy
+
+Each generation is written to a fresh directory and published by atomically
+replacing `CURRENT`, so readers never observe a half-written snapshot.
+Superseded generations are pruned only after a grace period, and a reader
+whose generation was pruned anyway follows `CURRENT` again.
+Arrays are loaded with `mmap_mode="r"`, so startup cost does not depend on
+the size of the postings. Several processes may share one snapshot root:
+writers serialize on `LOCK` and readers follow `CURRENT`.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+import structlog
+
+from app.rag.chunk_store import ChunkStore
+
+logger = structlog.get_logger()
+
+SNAPSHOT_FORMAT = 3
+CURRENT_FILE = "CURRENT"
+MANIFEST_FILE = "manifest.json"
+LOCK_FILE = "LOCK"
+# Reads that race with pruning follow CURRENT again this many times
+_READ_ATTEMPTS = 3
+
+
+@contextmanager
+def snapshot_lock(root: Path) -> Iterator[None]:
+    """Hold the exclusive cross-process writer lock of a snapshot root."""
+    import fcntl
+
+    root.mkdir(parents=True, exist_ok=True)
+    with open(root / LOCK_FILE, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def current_generation(root: Path) -> int:
+    """Return the generation number published in `CURRENT` (0 if none)."""
+    try:
+        name = (root / CURRENT_FILE).read_text().strip()
+        return int(name.removeprefix("gen-"))
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def write_snapshot(
+    root: Path,
+    arrays: dict[str, np.ndarray],
+    json_files: dict[str, object],
+    stores: dict[str, ChunkStore],
+    manifest: dict,
+    keep: int = 2,
+    prune_grace: float = 0.0,
+) -> int:
+    """
+    Write a new snapshot generation and publish it.
+
+    Args:
+        arrays: Written as `<name>.npy`.
+        json_files: Written as `<name>.json`.
+        stores: Written as `<name>.bin` plus `<name>_offsets.npy`.
+        keep: Generations kept beyond the grace period (at least 1).
+        prune_grace: Seconds a superseded generation stays on disk.
+
+    Returns:
+        The generation number that was written.
+    """
+    root.mkdir(parents=True, exist_ok=True)
+    generation = current_generation(root) + 1
+    name = f"gen-{generation:08d}"
+    tmp_dir = root / f".{name}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir()
+
+    for key, array in arrays.items():
+        np.save(tmp_dir / f"{key}.npy", array)
+    for key, store in stores.items():
+        store.write(tmp_dir / f"{key}.bin", tmp_dir / f"{key}_offsets.npy")
+    for key, value in json_files.items():
+        with open(tmp_dir / f"{key}.json", "w", encoding="utf-8") as f:
+            json.dump(value, f, ensure_ascii=False)
+    with open(tmp_dir / MANIFEST_FILE, "w", encoding="utf-8") as f:
+        json.dump({**manifest, "format": SNAPSHOT_FORMAT, "generation": generation}, f)
+
+    os.replace(tmp_dir, root / name)
+    pointer = root / f".{CURRENT_FILE}.tmp-{os.getpid()}"
+    pointer.write_text(name)
+    os.replace(pointer, root / CURRENT_FILE)
+
+    _prune_generations(root, keep, prune_grace)
+    logger.info("BM25 snapshot written", generation=generation)
+    return generation
+
+
+def read_snapshot(root: Path) -> dict | None:
+    """
+    Load the active snapshot generation.
+
+    Arrays and stores are memory-mapped read-only; JSON files are parsed.
+    If the generation named by `CURRENT` is pruned while it is being opened,
+    `CURRENT` is read again.
+
+    Returns:
+        dict with keys "manifest", "arrays", "json" and "stores", or None if
+        there is no usable snapshot.
+    """
+    for _ in range(_READ_ATTEMPTS):
+        generation = current_generation(root)
+        if not generation:
+            return None
+        path = root / f"gen-{generation:08d}"
+        try:
+            return _read_generation(path)
+        except OSError as e:
+            if current_generation(root) != generation:
+                continue  # superseded and pruned while opening it
+            logger.warning("BM25 snapshot unreadable", path=str(path), error=str(e))
+            return None
+        except ValueError as e:
+            logger.warning("BM25 snapshot unreadable", path=str(path), error=str(e))
+            return None
+    return None
+
+
+def _read_generation(path: Path) -> dict | None:
+    """Open one generation directory (None if its format is outdated)."""
+    with open(path / MANIFEST_FILE, encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format") != SNAPSHOT_FORMAT:
+        logger.warning("BM25 snapshot format mismatch", found=manifest.get("format"))
+        return None
+
+    stores = {
+        p.stem: ChunkStore.open(p, path / f"{p.stem}_offsets.npy")
+        for p in path.glob("*.bin")
+    }
+    arrays = {
+        p.stem: np.load(p, mmap_mode="r")
+        for p in path.glob("*.npy")
+        if p.stem.removesuffix("_offsets") not in stores
+    }
+    json_files = {}
+    for p in path.glob("*.json"):
+        if p.name != MANIFEST_FILE:
+            with open(p, encoding="utf-8") as f:
+                json_files[p.stem] = json.load(f)
+
+    return {
+        "manifest": manifest,
+        "arrays": arrays,
+        "json": json_files,
+        "stores": stores,
+    }
+
+
+def _prune_generations(root: Path, keep: int, grace: float = 0.0):
+    """
+    Remove generation directories beyond the newest `keep`.
+
+    A generation is removed only once the generation that replaced it has
+    been published for `grace` seconds, so a reader that has just resolved
+    it from `CURRENT` can still open it.
+    """
+    generations = sorted(p for p in root.glob("gen-*") if p.is_dir())
+    now = time.time()
+    for old, successor in zip(generations[:-max(1, keep)], generations[1:]):
+        try:
+            superseded_at = successor.stat().st_mtime
+        except OSError:
+            continue
+        if now - superseded_at >= grace:
+            shutil.rmtree(old, ignore_errors=True)
@@ -0,0 +1,96 @@
+"""
+TenderWriter — Versioned (Delta) Ingestion
+
+Re-ingesting a revised document only embeds and indexes the chunks that
+changed. Every chunk gets a stable id derived from its document and a hash of
+its whitespace-normalized text. The ids of the new version are diffed against
+those stored for the previous version:
+
+- chunks whose id is already stored are left untouched (no embedding, no upsert)
+- new ids are indexed as usual
+- stored ids missing from the new version are removed from Qdrant and BM25
+
+The chunk id doubles as the Qdrant point id, so the diff needs no extra
+bookkeeping beyond a `chunk_id` payload field.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
+
+from app.rag.chunker import TextChunk
+
+# Fixed namespace, so ids are stable across processes and releases
+CHUNK_ID_NAMESPACE = uuid.UUID("3f1c9a52-6d0e-4c1b-9b7a-0e5d2f8a4c61")
+
+
+def content_hash(text: str) -> str:
+    """Hash of a chunk's text, insensitive to whitespace-only changes."""
+    normalized = " ".join(text.split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def stable_chunk_id(document_id: int | None, digest: str, occurrence: int = 0) -> str:
+    """
+    Stable id of a chunk with content hash `digest` within its document.
+
+    `occurrence` tells apart identical chunks repeated in one document.
+    """
+    return str(uuid.uuid5(CHUNK_ID_NAMESPACE, f"{document_id}:{digest}:{occurrence}"))
+
+
+@dataclass
+class DocumentDiff:
+    """
+    Chunks of a new document version, matched against the stored version.
+
+    `previous` maps the chunk ids stored for the document to their point
+    ids. Feed every chunk of the new version through `assign` in order, then
+    remove `removed` once the new chunks are indexed.
+    """
+    document_id: int | None
+    previous: dict[str, str]
+    current: set[str] = field(default_factory=set)
+    unchanged: int = 0
+    added: int = 0
+    _occurrences: Counter = field(default_factory=Counter)
+
+    def assign(self, chunk: TextChunk) -> str | None:
+        """
+        Set the chunk's stable id.
+
+        Returns the stored point id if the chunk is unchanged, else None
+        (the chunk must be indexed).
+        """
+        digest = content_hash(chunk.text)
+        occurrence = self._occurrences[digest]
+        self._occurrences[digest] += 1
+        chunk.metadata.chunk_id = stable_chunk_id(self.document_id, digest, occurrence)
+        self.current.add(chunk.metadata.chunk_id)
+
+        point_id = self.previous.get(chunk.metadata.chunk_id)
+        if point_id is None:
+            self.added += 1
+        else:
+            self.unchanged += 1
+        return point_id
+
+    @property
+    def previous_point_ids(self) -> set[str]:
+        """Point ids stored for the previous version (excluded from dedup)."""
+        return set(self.previous.values())
+
+    @property
+    def removed(self) -> set[str]:
+        """Stored chunk ids that are not part of the new version."""
+        return set(self.previous) - self.current
+
+    def stats(self) -> dict:
+        return {
+            "chunks_added": self.added,
+            "chunks_unchanged": self.unchanged,
+            "chunks_removed": len(self.removed),
+        }
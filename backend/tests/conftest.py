@@ -0,0 +1,73 @@
+"""
+TenderWriter — Test fixtures
+
+The RAG tests run against an in-memory Qdrant (qdrant-client local mode) and
+a deterministic hashing embedder, so they need no server and no model.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+
+import numpy as np
+import pytest
+
+from app.config import settings
+
+
+class HashEmbedder:
+    """Bag-of-words vectors from hashed tokens; texts sharing words are similar."""
+
+    model_name = "test-hash"
+    dimension = 64
+    executor = None
+
+    def embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for token in re.findall(r"\w+", text.lower()):
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=4).digest()
+            vector[int.from_bytes(digest, "little") % self.dimension] += 1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def embed_batch(self, texts: list[str]) -> np.ndarray:
+        return np.vstack([self.embed(t) for t in texts]) if texts else np.zeros((0, self.dimension))
+
+    async def embed_query_async(self, query: str) -> np.ndarray:
+        return self.embed(query)
+
+
+@pytest.fixture
+def sparse_dir(tmp_path, monkeypatch):
+    path = tmp_path / "sparse_index"
+    monkeypatch.setattr(settings, "sparse_snapshot_dir", str(path))
+    monkeypatch.setattr(settings, "sparse_shared_mode", False)
+    return path
+
+
+@pytest.fixture
+async def engine(sparse_dir):
+    """A HybridRAGEngine with dense, sparse and dedup wired to in-memory stores."""
+    qdrant_client = pytest.importorskip("qdrant_client")
+
+    from app.rag.chunker import SemanticChunker
+    from app.rag.dedup import ChunkDeduplicator
+    from app.rag.dense_retriever import DenseRetriever
+    from app.rag.engine import HybridRAGEngine
+    from app.rag.sparse_retriever import SparseRetriever
+
+    engine = HybridRAGEngine()
+    engine.embedder = HashEmbedder()
+    engine.chunker = SemanticChunker(embedder=None, max_chunk_size=1500)
+    engine.dense_retriever = DenseRetriever(engine.embedder)
+    engine.dense_retriever.client = qdrant_client.AsyncQdrantClient(location=":memory:")
+    for collection in DenseRetriever.COLLECTIONS:
+        await engine.dense_retriever._ensure_collection(collection)
+    engine.deduplicator = ChunkDeduplicator(engine.dense_retriever)
+    engine.sparse_retriever = SparseRetriever(snapshot_dir=str(sparse_dir))
+
+    yield engine
+
+    engine.sparse_retriever.shutdown()
+    await engine.dense_retriever.client.close()
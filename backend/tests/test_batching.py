@@ -0,0 +1,139 @@
+"""Tests for dynamic micro-batching (app.rag.batching)."""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from app.rag.batching import MicroBatcher, token_budget_buckets
+
+
+def test_buckets_stay_within_the_token_budget_longest_first():
+    lengths = np.array([10, 300, 12, 40, 600, 8, 40, 11])
+
+    batches = token_budget_buckets(lengths, token_budget=640, max_batch_size=4)
+
+    assert batches == [[4], [1, 3], [6, 2, 7, 0], [5]]
+    assert sorted(i for batch in batches for i in batch) == list(range(len(lengths)))
+    for batch in batches:
+        # Padded to the first (longest) member
+        assert len(batch) * lengths[batch[0]] <= 640 or len(batch) == 1
+        assert lengths[batch[0]] == max(lengths[batch])
+
+
+def test_a_text_over_the_budget_gets_a_batch_of_its_own():
+    assert token_budget_buckets(np.array([5, 900, 5]), token_budget=512, max_batch_size=8) == [
+        [1], [0, 2],
+    ]
+    assert token_budget_buckets(np.array([], dtype=np.int64), 512, 8) == []
+
+
+class RecordingFn:
+    """Doubles each item, recording the batches it was called with."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.batches: list[list[int]] = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, items):
+        with self._lock:
+            self.batches.append(list(items))
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+        return [2 * item for item in items]
+
+
+async def test_concurrent_submits_are_coalesced():
+    fn = RecordingFn()
+    batcher = MicroBatcher(fn, max_batch_size=16, max_wait_ms=20)
+
+    results = await asyncio.gather(
+        batcher.submit(1), batcher.submit_many([2, 3]), batcher.submit(4)
+    )
+
+    assert results == [2, [4, 6], 8]
+    assert fn.batches == [[1, 2, 3, 4]]
+    assert batcher.stats()["mean_batch_size"] == 4
+
+
+async def test_partial_batch_is_flushed_after_max_wait():
+    fn = RecordingFn()
+    batcher = MicroBatcher(fn, max_batch_size=16, max_wait_ms=50)
+
+    start = time.perf_counter()
+    assert await batcher.submit(1) == 2
+    assert time.perf_counter() - start >= 0.045
+    assert fn.batches == [[1]]
+
+
+async def test_full_batches_go_out_without_waiting():
+    fn = RecordingFn()
+    batcher = MicroBatcher(fn, max_batch_size=2, max_wait_ms=10_000)
+
+    results = await asyncio.wait_for(batcher.submit_many([1, 2, 3, 4]), 1)
+
+    assert results == [2, 4, 6, 8]
+    assert fn.batches == [[1, 2], [3, 4]]
+    assert batcher.stats()["max_batch_size"] == 2
+
+
+async def test_max_concurrent_holds_items_until_a_batch_finishes():
+    fn = RecordingFn(delay=0.05)
+    batcher = MicroBatcher(fn, max_batch_size=8, max_wait_ms=1, max_concurrent=1)
+
+    first = asyncio.ensure_future(batcher.submit_many([1, 2]))
+    await asyncio.sleep(0.01)
+    # Arrive while the first batch runs, then go out together once it is done
+    third = asyncio.ensure_future(batcher.submit(3))
+    await asyncio.sleep(0.01)
+    rest = await asyncio.gather(third, batcher.submit(4), batcher.submit(5))
+
+    assert await first == [2, 4]
+    assert rest == [6, 8, 10]
+    assert fn.max_active == 1
+    assert fn.batches == [[1, 2], [3, 4, 5]]
+
+
+async def test_batch_failure_is_raised_in_every_caller():
+    def failing(items):
+        raise ValueError("model unavailable")
+
+    batcher = MicroBatcher(failing, max_batch_size=16, max_wait_ms=5)
+    results = await asyncio.gather(
+        batcher.submit(1), batcher.submit(2), return_exceptions=True
+    )
+
+    assert [type(r) for r in results] == [ValueError, ValueError]
+    assert batcher._running == 0
+
+
+async def test_cancelled_batch_cancels_its_callers():
+    release = threading.Event()
+
+    def blocked(items):
+        release.wait(5)
+        return items
+
+    batcher = MicroBatcher(blocked, max_batch_size=2, max_wait_ms=1000)
+    callers = [asyncio.ensure_future(batcher.submit(i)) for i in range(2)]
+    await asyncio.sleep(0.05)
+    [task] = batcher._tasks
+
+    task.cancel()
+    try:
+        for caller in callers:
+            with pytest.raises(asyncio.CancelledError):
+                await asyncio.wait_for(caller, 1)
+        assert batcher._running == 0
+    finally:
+        release.set()
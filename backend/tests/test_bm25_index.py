@@ -0,0 +1,126 @@
+"""Tests for app.rag.bm25_index: scores must match rank_bm25.BM25Okapi."""
+
+from __future__ import annotations
+
+import random
+
+import numpy as np
+import pytest
+from rank_bm25 import BM25Okapi
+
+from app.rag.bm25_index import BM25Index
+
+VOCABULARY = [f"term{i}" for i in range(40)]
+
+
+def make_corpus(num_docs: int, seed: int = 7) -> list[list[str]]:
+    rng = random.Random(seed)
+    # Skewed term choice, so some terms occur in most documents (negative raw IDF)
+    def term() -> str:
+        return VOCABULARY[int(rng.paretovariate(1.0)) % len(VOCABULARY)]
+
+    return [[term() for _ in range(rng.randint(3, 30))] for _ in range(num_docs)]
+
+
+def reference_scores(corpus: list[list[str]], query: list[str]) -> np.ndarray:
+    return BM25Okapi(corpus).get_scores(query)
+
+
+def index_scores(index: BM25Index, query: list[str], num_slots: int) -> np.ndarray:
+    scores = np.zeros(num_slots)
+    slots, values = index.search(query)
+    scores[slots] = values
+    return scores
+
+
+QUERIES = [["term0"], ["term1", "term5"], ["term3", "term3", "term17"], ["term0", "term39"]]
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_scores_match_bm25okapi(query):
+    corpus = make_corpus(200)
+    index = BM25Index()
+    for tokens in corpus:
+        index.add(tokens)
+
+    expected = reference_scores(corpus, query)
+    # The index only returns positive scores
+    np.testing.assert_allclose(
+        index_scores(index, query, len(corpus)), np.clip(expected, 0, None), rtol=1e-9
+    )
+    for term in set(query):
+        assert index.idf(term) == pytest.approx(BM25Okapi(corpus).idf.get(term, 0.0))
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_scores_match_after_deletes_and_compaction(query):
+    corpus = make_corpus(200)
+    index = BM25Index()
+    for tokens in corpus:
+        index.add(tokens)
+    deleted = set(range(0, 200, 3))
+    for slot in sorted(deleted):
+        index.delete(slot, corpus[slot])
+
+    live = [tokens for slot, tokens in enumerate(corpus) if slot not in deleted]
+    expected = np.clip(reference_scores(live, query), 0, None)
+    scores = index_scores(index, query, len(corpus))
+    np.testing.assert_allclose(
+        scores[[s for s in range(len(corpus)) if s not in deleted]], expected, rtol=1e-9
+    )
+    assert not scores[sorted(deleted)].any()
+
+    index.compact()
+    np.testing.assert_allclose(index_scores(index, query, len(live)), expected, rtol=1e-9)
+
+
+def test_pruned_top_k_matches_exhaustive_search():
+    corpus = make_corpus(500, seed=11)
+    index = BM25Index()
+    for tokens in corpus:
+        index.add(tokens)
+    query = ["term1", "term2", "term4", "term8", "term16"]
+
+    slots, scores = index.search(query, top_k=10)
+    pruned_slots, pruned_scores = index.search(query, top_k=10, prune_min_terms=2)
+    np.testing.assert_allclose(pruned_scores, scores, rtol=1e-9)
+    assert pruned_slots.tolist() == slots.tolist()
+
+
+def test_prepared_query_is_unaffected_by_later_appends_and_compaction():
+    corpus = make_corpus(300, seed=3)
+    index = BM25Index()
+    index.merge_min_postings = 64  # merge often, so CSR arrays are replaced
+    for tokens in corpus[:200]:
+        index.add(tokens)
+    for slot in range(0, 200, 4):
+        index.delete(slot, corpus[slot])
+    query = ["term1", "term2", "term6"]
+
+    expected = index.search(query, top_k=20)
+    prepared = index.prepare(query)
+    for tokens in corpus[200:]:
+        index.add(tokens)
+    index.compact()
+
+    slots, scores = prepared.search(top_k=20)
+    assert slots.tolist() == expected[0].tolist()
+    np.testing.assert_allclose(scores, expected[1], rtol=1e-12)
+
+
+def test_export_copy_exports_the_same_state_without_merging_the_original():
+    corpus = make_corpus(50, seed=5)
+    index = BM25Index()
+    for tokens in corpus:
+        index.add(tokens)
+    index.delete(3, corpus[3])
+    tail = index._tail_nnz
+    assert tail
+
+    arrays, scalars, terms = index.export_copy().export_state()
+    assert index._tail_nnz == tail  # the live index keeps its tail
+
+    restored = BM25Index.from_state(arrays, scalars, terms)
+    query = ["term0", "term2"]
+    for expected, actual in zip(index.search(query), restored.search(query), strict=True):
+        np.testing.assert_allclose(actual, expected, rtol=1e-12)
@@ -0,0 +1,57 @@
+"""Tests for semantic chunking and sentence-embedding reuse (app.rag.chunker)."""
+
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from app.rag.chunker import SemanticChunker
+from tests.conftest import HashEmbedder
+
+BRIDGE = [
+    "The bridge deck is inspected every quarter.",
+    "Each bridge deck inspection is reported to the owner.",
+]
+SAFETY = [
+    "All site personnel hold a valid safety certificate.",
+    "Safety training for site personnel is repeated yearly.",
+    "The safety plan names one coordinator for all site personnel.",
+]
+
+
+def chunk(embedding_reuse: str, **kwargs) -> list:
+    chunker = SemanticChunker(
+        embedder=HashEmbedder(),
+        min_chunk_size=10,
+        similarity_threshold=0.2,
+        embedding_reuse=embedding_reuse,
+        **kwargs,
+    )
+    return chunker.chunk_text(" ".join(BRIDGE + SAFETY))
+
+
+def test_mean_reuse_gives_each_chunk_its_normalized_sentence_mean():
+    chunks = chunk("mean")
+
+    assert [c.text for c in chunks] == [" ".join(BRIDGE), " ".join(SAFETY)]
+    embedder = HashEmbedder()
+    for c, sentences in zip(chunks, (BRIDGE, SAFETY), strict=True):
+        mean = embedder.embed_batch(sentences).mean(axis=0)
+        np.testing.assert_allclose(c.embedding, mean / np.linalg.norm(mean), rtol=1e-6)
+        assert np.linalg.norm(c.embedding) == pytest.approx(1.0)
+
+
+def test_selective_reuse_leaves_long_chunks_to_be_reencoded():
+    cutoff = len(" ".join(BRIDGE))
+    chunks = chunk("selective", reencode_min_chars=cutoff)
+
+    assert len(chunks[0].text) == cutoff and chunks[0].embedding is not None
+    assert len(chunks[1].text) > cutoff and chunks[1].embedding is None
+
+
+@pytest.mark.parametrize("embedding_reuse", ["off", "mean", "selective"])
+def test_boundary_embedder_vectors_are_never_reused(embedding_reuse):
+    chunks = chunk(embedding_reuse, boundary_embedder=HashEmbedder())
+
+    assert len(chunks) == 2
+    assert all(c.embedding is None for c in chunks)
@@ -0,0 +1,44 @@
+"""Tests for near-duplicate chunk detection (app.rag.dedup)."""
+
+from __future__ import annotations
+
+from app.ingestion.pipeline import IngestionPipeline
+from app.rag.dedup import ChunkDeduplicator, MinHasher
+from tests.test_versioning import PRICING, QUALITY, SAFETY
+
+EDITED = PRICING.replace("120000", "135000")
+
+
+class NoStoredChunks:
+    async def find_by_minhash_bands(self, band_keys, collection="documents"):
+        return []
+
+
+async def test_one_token_edit_is_not_an_in_batch_duplicate():
+    deduplicator = ChunkDeduplicator(NoStoredChunks(), threshold=0.5)
+    hasher = deduplicator.hasher
+    assert MinHasher.similarity(hasher.signature(PRICING), hasher.signature(EDITED)) > 0.9
+
+    plan = await deduplicator.plan(
+        [PRICING, EDITED, " ".join(PRICING.split())],
+        [{"document_id": i} for i in range(3)],
+        "documents",
+    )
+    assert plan.unique == [0, 1]
+    assert plan.in_batch == {2: 0}
+
+
+async def test_one_token_edit_is_indexed_separately(engine):
+    pipeline = IngestionPipeline(engine)
+    await pipeline.ingest_text(PRICING, document_id=1)
+    await pipeline.ingest_text(EDITED, document_id=2)
+    await pipeline.ingest_text(PRICING, document_id=3)  # exact copy, stored once
+    await pipeline.ingest_text(SAFETY, document_id=4)
+    await pipeline.ingest_text(QUALITY, document_id=5)
+    assert await engine.dense_retriever.count_chunks("documents") == 4
+
+    filters, query = {"document_id": 2}, "contract price EUR 135000"
+    dense = await engine.dense_retriever.search(query, top_k=5, filters=filters)
+    sparse = engine.sparse_retriever.search(query, top_k=5, filters=filters)
+    assert [c.text for c in dense] == [EDITED]
+    assert [c.text for c in sparse] == [EDITED]
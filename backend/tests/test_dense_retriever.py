@@ -0,0 +1,42 @@
+"""Tests for Qdrant indexing (app.rag.dense_retriever)."""
+
+from __future__ import annotations
+
+import asyncio
+
+from app.config import settings
+
+
+async def test_pipelined_upserts_store_every_batch(engine, monkeypatch):
+    monkeypatch.setattr(settings, "qdrant_upsert_batch_size", 4)
+    monkeypatch.setattr(settings, "qdrant_upsert_max_in_flight", 2)
+    dense = engine.dense_retriever
+    client_upsert = dense.client.upsert
+    calls: list[tuple[int, bool]] = []
+    active = [0, 0]  # current, max outstanding
+
+    async def upsert(collection_name, points, wait=True):
+        calls.append((len(points), wait))
+        active[0] += 1
+        active[1] = max(active)
+        try:
+            await asyncio.sleep(0.01)
+            return await client_upsert(collection_name=collection_name, points=points, wait=wait)
+        finally:
+            active[0] -= 1
+
+    monkeypatch.setattr(dense.client, "upsert", upsert)
+    texts = [f"Work package {i} covers inspection lot {i}." for i in range(11)]
+    metadatas = [{"document_id": 1, "chunk_index": i} for i in range(11)]
+    # Some chunks bring a vector from the chunker, the rest are embedded
+    embeddings = [engine.embedder.embed(t) if i % 3 == 0 else None for i, t in enumerate(texts)]
+
+    point_ids = await dense.index_chunks(texts, metadatas, embeddings=embeddings)
+
+    assert calls == [(4, False), (4, False), (3, True)]
+    assert active == [0, 2]
+    assert await dense.count_chunks("documents") == 11
+    stored = await dense.client.retrieve(
+        f"{dense.collection_prefix}documents", ids=point_ids, with_payload=True
+    )
+    assert sorted(p.payload["chunk_index"] for p in stored) == list(range(11))
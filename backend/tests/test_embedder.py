@@ -0,0 +1,54 @@
+"""Tests for the async query embedding path (app.rag.embedder)."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+
+import numpy as np
+import pytest
+
+from app.rag.embedder import Embedder
+
+
+class SlowModel:
+    """Stands in for a SentenceTransformer whose encode takes `delay` seconds."""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.encoded: list[str] = []
+
+    def encode(self, texts, batch_size=32, normalize_embeddings=True, show_progress_bar=False):
+        time.sleep(self.delay)
+        self.encoded.extend(texts)
+        return np.ones((len(texts), 4), dtype=np.float32) / 2
+
+
+@pytest.fixture
+def embedder():
+    embedder = Embedder(model_name="test-model", use_cache=False)
+    embedder._model = SlowModel(delay=0.05)
+    return embedder
+
+
+async def test_query_embedding_is_cached_when_the_caller_times_out(embedder):
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(embedder.embed_query_async("bridge maintenance"), 0.01)
+
+    await asyncio.sleep(0.1)
+    assert embedder.query_cache.get(embedder.cache_key, "bridge maintenance") is not None
+
+    vector = await asyncio.wait_for(embedder.embed_query_async("bridge maintenance"), 0.01)
+    assert vector.shape == (4,)
+    assert len(embedder._model.encoded) == 1
+
+
+async def test_concurrent_misses_for_one_query_share_a_computation(embedder):
+    vectors = await asyncio.gather(
+        embedder.embed_query_async("ISO 9001"),
+        embedder.embed_query_async("ISO  9001"),
+        embedder.embed_query_async("VCA"),
+    )
+    assert all(v.shape == (4,) for v in vectors)
+    assert len(embedder._model.encoded) == 2
+    assert not embedder._query_tasks
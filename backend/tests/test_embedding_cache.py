@@ -0,0 +1,130 @@
+"""Tests for the embedding caches (app.rag.embedding_cache)."""
+
+from __future__ import annotations
+
+import itertools
+
+import numpy as np
+import pytest
+
+from app.config import settings
+from app.rag import embedding_cache
+from app.rag.embedder import Embedder
+from app.rag.embedding_cache import EmbeddingCache, QueryEmbeddingCache
+
+
+class CountingModel:
+    """Stands in for a SentenceTransformer; vectors are not exact in float16."""
+
+    def __init__(self):
+        self.encoded: list[str] = []
+
+    def encode(self, texts, batch_size=32, normalize_embeddings=True, show_progress_bar=False):
+        self.encoded.extend(texts)
+        return np.array(
+            [[len(t) / 3, 1 / 7, -len(t) / 11, 0.1] for t in texts], dtype=np.float32
+        )
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A strictly increasing `time.time`, so LRU order does not depend on clock resolution."""
+    ticks = itertools.count(1_000_000)
+    monkeypatch.setattr(embedding_cache.time, "time", lambda: float(next(ticks)))
+
+
+def vectors(n: int) -> np.ndarray:
+    return np.arange(n * 4, dtype=np.float32).reshape(n, 4)
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    cache = EmbeddingCache(tmp_path / "cache.sqlite3", model_name="m", max_entries=3)
+    for text in ("a", "b", "c"):
+        cache.put_many([text], vectors(1))
+    cache.get_many(["a"])  # "b" is now the least recently used
+
+    cache.put_many(["d"], vectors(1))
+    assert cache.stats()["entries"] == 3
+    assert [v is not None for v in cache.get_many(["a", "b", "c", "d"])] == [
+        True, False, True, True,
+    ]
+    cache.close()
+
+    reopened = EmbeddingCache(tmp_path / "cache.sqlite3", model_name="m", max_entries=3)
+    assert reopened.stats()["entries"] == 3
+    reopened.close()
+
+
+def test_entries_are_separated_by_model_name(tmp_path, monkeypatch):
+    path = tmp_path / "cache.sqlite3"
+    monkeypatch.setattr(settings, "embedding_cache_path", str(path))
+    monkeypatch.setattr(settings, "inference_backend", "torch")
+    torch_key = Embedder(model_name="m", use_cache=True).cache_key
+    monkeypatch.setattr(settings, "inference_backend", "onnx")
+    monkeypatch.setattr(settings, "onnx_quantize", True)
+    onnx_key = Embedder(model_name="m", use_cache=True).cache_key
+    assert torch_key != onnx_key
+
+    torch_cache = EmbeddingCache(path, model_name=torch_key, max_entries=10)
+    onnx_cache = EmbeddingCache(path, model_name=onnx_key, max_entries=10)
+    torch_cache.put_many(["bridge"], vectors(1))
+    assert onnx_cache.get_many(["bridge"]) == [None]
+    assert torch_cache.get_many(["bridge"])[0] is not None
+    torch_cache.close()
+    onnx_cache.close()
+
+
+def test_cache_hits_return_the_vectors_of_the_first_embedding(tmp_path):
+    embedder = Embedder(model_name="m", use_cache=True)
+    embedder._model = CountingModel()
+    embedder._cache = EmbeddingCache(tmp_path / "cache.sqlite3", model_name="m", max_entries=10)
+    texts = ["bridge maintenance", "ISO 9001", "bridge maintenance"]
+
+    first = embedder.embed_batch(texts)
+    second = embedder.embed_batch(texts)
+
+    assert embedder._model.encoded == ["bridge maintenance", "ISO 9001"]
+    assert first.dtype == second.dtype == np.float32
+    np.testing.assert_array_equal(first, second)
+    stats = embedder.cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (3, 3, 2)
+    assert stats["hit_rate"] == 0.5
+    embedder.cache.close()
+
+
+def test_query_entries_expire_after_the_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(embedding_cache.time, "monotonic", lambda: now[0])
+    cache = QueryEmbeddingCache(max_entries=10, ttl=60.0)
+    cache.put("m", "bridge maintenance", vectors(1)[0])
+
+    now[0] += 60.0
+    assert cache.get("m", "bridge maintenance") is not None
+    now[0] += 0.5
+    assert cache.get("m", "bridge maintenance") is None
+    assert cache.stats()["entries"] == 0
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_query_cache_keeps_the_most_recently_used_entries():
+    cache = QueryEmbeddingCache(max_entries=2, ttl=60.0)
+    cache.put("m", "a", vectors(1)[0])
+    cache.put("m", "b", vectors(1)[0])
+    cache.get("m", "a")  # "b" is now the least recently used
+
+    cache.put("m", "c", vectors(1)[0])
+    assert cache.get("m", "b") is None
+    assert cache.get("m", "a") is not None
+    assert cache.get("m", "c") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_query_cache_normalizes_whitespace_per_model():
+    cache = QueryEmbeddingCache(max_entries=10, ttl=60.0)
+    vector = vectors(1)[0]
+    cache.put("m", "  ISO\t9001\n certificate ", vector)
+
+    assert cache.get("m", "ISO 9001 certificate") is vector
+    assert not vector.flags.writeable
+    assert cache.get("other", "ISO 9001 certificate") is None
+    assert cache.get("m", "iso 9001 certificate") is None
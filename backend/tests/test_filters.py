@@ -0,0 +1,74 @@
+"""Tests for metadata filters (app.rag.filters), including shared near-duplicate chunks."""
+
+from __future__ import annotations
+
+from app.ingestion.pipeline import IngestionPipeline
+from app.rag.dedup import SOURCES_KEY
+from app.rag.filters import MetadataBitmapIndex, MetadataFilter
+from tests.test_versioning import PRICING, QUALITY, SAFETY
+
+SHARED = {
+    "document_id": 1,
+    "doc_type": "proposal",
+    SOURCES_KEY: [{"document_id": 2, "doc_type": "tender", "chunk_id": "b"}],
+}
+
+
+def test_compile_passes_through_and_drops_empty():
+    compiled = MetadataFilter.compile({"doc_type": ["cv", "reference"]})
+    assert MetadataFilter.compile(compiled) is compiled
+    assert MetadataFilter.compile({}) is None
+    assert compiled.matches({"doc_type": "cv"})
+    assert not compiled.matches({"doc_type": "tender"})
+    assert not compiled.matches({})
+
+
+def test_filter_matches_through_duplicate_sources():
+    assert MetadataFilter.compile({"document_id": 2}).matches(SHARED)
+    assert MetadataFilter.compile({"document_id": 2, "doc_type": "tender"}).matches(SHARED)
+    # Owner and source fields are not mixed within one match
+    assert not MetadataFilter.compile({"document_id": 2, "doc_type": "proposal"}).matches(SHARED)
+    assert not MetadataFilter.compile({"document_id": 3}).matches(SHARED)
+
+
+def test_bitmap_mask_includes_duplicate_sources():
+    index = MetadataBitmapIndex()
+    index.add(0, SHARED)
+    index.add(1, {"document_id": 2, "doc_type": "tender"})
+    index.add(2, {"document_id": 3, "doc_type": "cv"})
+
+    def mask(filters):
+        return index.mask(MetadataFilter.compile(filters), 3).tolist()
+
+    assert mask({"document_id": 2}) == [True, True, False]
+    assert mask({"doc_type": "tender"}) == [True, True, False]
+    assert mask({"doc_type": "proposal"}) == [True, False, False]
+    assert mask({"document_id": [1, 3]}) == [True, False, True]
+
+    restored = MetadataBitmapIndex.from_state(*index.export_state())
+    assert restored.mask(MetadataFilter.compile({"document_id": 2}), 3).tolist() == [
+        True, True, False,
+    ]
+
+
+async def test_filtered_search_finds_chunks_shared_by_another_document(engine):
+    pipeline = IngestionPipeline(engine)
+    await pipeline.ingest_text(PRICING, document_id=1, doc_type="proposal")
+    await pipeline.ingest_text(PRICING, document_id=2, doc_type="tender")
+    await pipeline.ingest_text(SAFETY, document_id=3, doc_type="cv")
+    await pipeline.ingest_text(QUALITY, document_id=4, doc_type="cv")
+    assert await engine.dense_retriever.count_chunks("documents") == 3
+
+    for filters in ({"document_id": 2}, {"doc_type": "tender"}):
+        dense = await engine.dense_retriever.search("contract price", top_k=5, filters=filters)
+        sparse = engine.sparse_retriever.search("contract price", top_k=5, filters=filters)
+        assert [c.text for c in dense] == [PRICING]
+        assert [c.text for c in sparse] == [PRICING]
+
+    # Once document 2 no longer contains the chunk, its filter stops matching it
+    await pipeline.ingest_text(QUALITY, document_id=2, doc_type="tender")
+    filters = {"document_id": 2}
+    dense = await engine.dense_retriever.search("contract price", top_k=5, filters=filters)
+    sparse = engine.sparse_retriever.search("contract price", top_k=5, filters=filters)
+    assert PRICING not in [c.text for c in dense]
+    assert PRICING not in [c.text for c in sparse]
@@ -0,0 +1,43 @@
+"""Tests for reciprocal rank fusion (app.rag.fusion)."""
+
+from __future__ import annotations
+
+import pytest
+
+from app.rag.candidate import Candidate
+from app.rag.fusion import RankFusion
+
+
+def hit(chunk_id: str, **metadata) -> Candidate:
+    return Candidate.from_chunk(f"text of {chunk_id}", {"chunk_id": chunk_id, **metadata}, 1.0)
+
+
+def test_a_chunk_from_every_retriever_is_fused_into_one_candidate():
+    fusion = RankFusion(k=60, dense_weight=1.0, sparse_weight=0.5, graph_weight=0.25)
+    shared = hit("a", document_id=1)
+
+    fused = fusion.fuse(
+        dense_results=[hit("b"), shared],
+        sparse_results=[hit("a", section="pricing")],
+        graph_results=[hit("c"), hit("a", entity="bridge")],
+    )
+
+    assert [c.chunk_id for c in fused] == ["a", "b", "c"]
+    merged = fused[0]
+    assert merged is shared
+    assert merged.sources == ["dense", "sparse", "graph"]
+    assert merged.metadata == {
+        "chunk_id": "a", "document_id": 1, "section": "pricing", "entity": "bridge",
+    }
+    assert merged.score == merged.fused_score == pytest.approx(1 / 62 + 0.5 / 61 + 0.25 / 62)
+    assert fused[1].score == pytest.approx(1 / 61)
+
+
+def test_repeated_ids_accumulate_every_rank():
+    fusion = RankFusion(k=60, dense_weight=1.0, sparse_weight=1.0, graph_weight=1.0)
+
+    fused = fusion.fuse(dense_results=[hit("a"), hit("b"), hit("a")], top_k=1)
+
+    assert [c.chunk_id for c in fused] == ["a"]
+    assert fused[0].score == pytest.approx(1 / 61 + 1 / 63)
+    assert fused[0].sources == ["dense"]
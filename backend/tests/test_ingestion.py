@@ -0,0 +1,51 @@
+"""Tests for the ingestion pipeline (app.ingestion.pipeline)."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+
+from app.ingestion.pipeline import IngestionPipeline
+from app.rag.chunker import SemanticChunker
+from tests.conftest import HashEmbedder
+
+
+class SlowBoundaryEmbedder(HashEmbedder):
+    """Boundary-detection embedder whose every call blocks its thread for `delay`."""
+
+    delay = 0.05
+
+    def embed_batch(self, texts):
+        time.sleep(self.delay)
+        return super().embed_batch(texts)
+
+
+async def test_chunking_does_not_block_the_event_loop(engine, tmp_path):
+    engine.chunker = SemanticChunker(
+        embedder=engine.embedder,
+        boundary_embedder=SlowBoundaryEmbedder(),
+        embed_window=4,
+    )
+    sentences = [f"Section {i} describes the approach to work package {i}." for i in range(24)]
+    path = tmp_path / "tender.txt"
+    path.write_text(" ".join(sentences), encoding="utf-8")
+
+    gaps: list[float] = []
+
+    async def heartbeat():
+        last = time.perf_counter()
+        while True:
+            await asyncio.sleep(0.005)
+            now = time.perf_counter()
+            gaps.append(now - last)
+            last = now
+
+    ticker = asyncio.create_task(heartbeat())
+    try:
+        stats = await IngestionPipeline(engine).ingest_file(str(path), document_id=9)
+    finally:
+        ticker.cancel()
+
+    assert stats["status"] == "completed" and stats["chunks"] > 0
+    # Six windows of 50 ms ran, none of them on the loop thread
+    assert max(gaps) < SlowBoundaryEmbedder.delay
@@ -0,0 +1,48 @@
+"""Tests for the adaptive retrieval planner (app.rag.planner)."""
+
+from __future__ import annotations
+
+import pytest
+
+from app.rag.candidate import Candidate
+from app.rag.engine import QueryMode, RAGQuery
+from app.rag.planner import QueryPlanner
+
+
+def plan(text: str, mode: str = "qa", **kwargs):
+    return QueryPlanner().plan(RAGQuery(text=text, mode=QueryMode(mode), **kwargs))
+
+
+def candidates(ids: str) -> list[Candidate]:
+    return [Candidate(i, i, {}) for i in ids]
+
+
+def test_detect_entities():
+    entities = QueryPlanner.detect_entities("Which projects used ISO 9001 for Rijkswaterstaat")
+    assert entities == ["ISO 9001", "Rijkswaterstaat", "projects"]
+
+
+def test_graph_skipped_without_entities_in_text_modes():
+    assert plan("how do we handle quality assurance on bridges").graph_k == 0
+    assert plan("which projects did Jan Jansen deliver").graph_k > 0
+    assert plan("write about our approach to bridge maintenance", "write_section").graph_k > 0
+
+
+def test_short_queries_skip_rerank_only_in_search_mode():
+    assert not plan("bridge inspection", "search").rerank
+    for mode in ("qa", "write_section", "compliance"):
+        assert plan("bridge inspection", mode).rerank
+
+
+def test_fast_profile_runs_dense_and_sparse_only():
+    fast = plan("bridge inspection reports", "search", profile="fast")
+    assert (fast.graph_k, fast.rerank, fast.early_exit) == (0, False, False)
+    with pytest.raises(ValueError):
+        plan("bridge inspection", profile="fastest")
+
+
+def test_agreement_requires_the_same_top_hit():
+    assert QueryPlanner.agreement(candidates("abc"), candidates("abc")) == 1.0
+    assert QueryPlanner.agreement(candidates("abc"), candidates("abd")) == pytest.approx(2 / 3)
+    assert QueryPlanner.agreement(candidates("abc"), candidates("bac")) == 0.0
+    assert QueryPlanner.agreement([], candidates("abc")) == 0.0
@@ -0,0 +1,128 @@
+"""Tests for the cascade re-ranker (app.rag.reranker) with stand-in models."""
+
+from __future__ import annotations
+
+import time
+
+import pytest
+
+from app.config import settings
+from app.ingestion.pipeline import IngestionPipeline
+from app.rag.candidate import Candidate
+from app.rag.reranker import Reranker
+from tests.test_versioning import PRICING, SAFETY
+
+
+class FakeCrossEncoder:
+    """Scores a pair by the number in its passage; sleeps per forward pass."""
+
+    def __init__(self, delay: float = 0.0, sign: float = 1.0):
+        self.delay = delay
+        self.sign = sign
+        self.scored: list[str] = []
+
+    def predict(self, pairs, batch_size=None, show_progress_bar=False):
+        time.sleep(self.delay)
+        self.scored.extend(text for _, text in pairs)
+        return [self.sign * float(text.split()[-1]) for _, text in pairs]
+
+
+def make_reranker(full: FakeCrossEncoder, first: FakeCrossEncoder | None = None) -> Reranker:
+    reranker = Reranker(model_name="full", first_pass_model_name="first" if first else "")
+    reranker._model = full
+    reranker._first_pass_model = first
+    return reranker
+
+
+def make_candidates(n: int) -> list[Candidate]:
+    candidates = []
+    for i in range(n):
+        candidate = Candidate.from_chunk(f"passage {i}", {"document_id": 1}, 1.0 / (i + 1))
+        candidate.fused_score = candidate.score
+        candidates.append(candidate)
+    return candidates
+
+
+@pytest.fixture(autouse=True)
+def no_score_cache(monkeypatch):
+    monkeypatch.setattr(settings, "reranker_cache_enabled", False)
+    monkeypatch.setattr(settings, "reranker_batch_wait_ms", 0.0)
+
+
+async def test_rerank_leaves_input_candidates_unchanged():
+    candidates = make_candidates(5)
+    before = [(c.chunk_id, c.score, c.fused_score) for c in candidates]
+
+    reranked = await make_reranker(FakeCrossEncoder()).rerank("query", candidates, top_k=3)
+
+    assert [c.text for c in reranked] == ["passage 4", "passage 3", "passage 2"]
+    assert [c.score for c in reranked] == [4.0, 3.0, 2.0]
+    assert [c.fused_score for c in reranked] == [0.2, 0.25, 1 / 3]
+    assert [(c.chunk_id, c.score, c.fused_score) for c in candidates] == before
+
+
+async def test_first_pass_limits_the_full_model_to_survivors():
+    full, first = FakeCrossEncoder(), FakeCrossEncoder(sign=-1.0)
+    candidates = make_candidates(10)
+
+    reranked = await make_reranker(full, first).rerank(
+        "query", candidates, top_k=2, survivors=4
+    )
+
+    assert len(first.scored) == 10
+    # The first pass prefers low numbers, the full model re-orders its shortlist
+    assert sorted(full.scored) == ["passage 0", "passage 1", "passage 2", "passage 3"]
+    assert [c.text for c in reranked] == ["passage 3", "passage 2"]
+
+
+async def test_full_model_stops_at_the_budget(monkeypatch):
+    monkeypatch.setattr(settings, "reranker_batch_size", 2)
+    delay = 0.05
+    full, first = FakeCrossEncoder(delay=delay), FakeCrossEncoder(sign=-1.0)
+    candidates = make_candidates(12)
+
+    start = time.perf_counter()
+    reranked = await make_reranker(full, first).rerank(
+        "query", candidates, top_k=8, survivors=8, budget_ms=2.5 * delay * 1000
+    )
+    elapsed = time.perf_counter() - start
+
+    # Two full batches fit the budget; the third would overrun it
+    assert len(full.scored) == 4
+    assert elapsed < 3 * delay
+    # Survivors the full model did not reach follow in first-pass order
+    assert [c.text for c in reranked[4:]] == [f"passage {i}" for i in range(4, 8)]
+    assert [c.score for c in reranked[4:]] == [-4.0, -5.0, -6.0, -7.0]
+
+
+async def test_repeated_rerank_is_served_from_the_score_cache(monkeypatch):
+    monkeypatch.setattr(settings, "reranker_cache_enabled", True)
+    full = FakeCrossEncoder(delay=0.02)
+    reranker = make_reranker(full)
+    candidates = make_candidates(4)
+
+    first = await reranker.rerank("Bridge  maintenance", candidates, top_k=4)
+    second = await reranker.rerank("bridge maintenance", candidates, top_k=4)
+
+    assert len(full.scored) == 4
+    assert [(c.text, c.score) for c in second] == [(c.text, c.score) for c in first]
+    stats = reranker.score_cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (4, 4, 4)
+    assert stats["time_saved_ms"] > 0
+
+
+async def test_reingest_evicts_the_document_from_the_score_cache(engine, monkeypatch):
+    monkeypatch.setattr(settings, "reranker_cache_enabled", True)
+    pipeline = IngestionPipeline(engine)
+    await pipeline.ingest_text(PRICING, document_id=1)
+    full = FakeCrossEncoder()
+    engine.reranker = make_reranker(full)
+    other = Candidate.from_chunk("passage 9", {"document_id": 2}, 0.1)
+    await engine.reranker.rerank("query", [*make_candidates(3), other], top_k=4)
+
+    await pipeline.ingest_text(SAFETY, document_id=1)
+
+    stats = engine.reranker.score_cache.stats()
+    assert (stats["invalidations"], stats["entries"]) == (3, 1)
+    await engine.reranker.rerank("query", [*make_candidates(3), other], top_k=4)
+    assert len(full.scored) == 7
@@ -0,0 +1,36 @@
+"""Tests for app.rag.sparse_retriever."""
+
+from __future__ import annotations
+
+import threading
+
+from app.rag import bm25_index
+from app.rag.sparse_retriever import SparseRetriever
+
+
+def test_search_scores_outside_the_index_lock(sparse_dir, monkeypatch):
+    retriever = SparseRetriever()
+    retriever.add_chunks(
+        ["bridge inspection", "tunnel ventilation", "quality audit", "bridge pricing", "staff"],
+        [{"document_id": i} for i in range(5)],
+    )
+    search = bm25_index.PreparedQuery.search
+    lock_free = []
+
+    def probe():
+        acquired = retriever._lock.acquire(timeout=1)
+        if acquired:
+            retriever._lock.release()
+        lock_free.append(acquired)
+
+    def scoring(self, *args, **kwargs):
+        # Another thread (a concurrent search or an ingest) can take the lock
+        probe_thread = threading.Thread(target=probe)
+        probe_thread.start()
+        probe_thread.join()
+        return search(self, *args, **kwargs)
+
+    monkeypatch.setattr(bm25_index.PreparedQuery, "search", scoring)
+    results = retriever.search("bridge", top_k=5)
+    assert lock_free == [True]
+    assert sorted(c.text for c in results) == ["bridge inspection", "bridge pricing"]
@@ -0,0 +1,184 @@
+"""Tests for BM25 snapshots (app.rag.sparse_snapshot) and shared mode."""
+
+from __future__ import annotations
+
+import threading
+
+import numpy as np
+import pytest
+
+import app.rag.sparse_snapshot as sparse_snapshot
+from app.config import settings
+from app.rag.chunk_store import ChunkStore
+from app.rag.sparse_retriever import SparseRetriever
+from app.rag.sparse_snapshot import (
+    current_generation,
+    read_snapshot,
+    snapshot_lock,
+    write_snapshot,
+)
+
+
+def write_generation(root, keep=2, prune_grace=0.0) -> int:
+    return write_snapshot(
+        root,
+        arrays={"values": np.arange(3)},
+        json_files={"terms": ["a", "b"]},
+        stores={"texts": ChunkStore()},
+        manifest={},
+        keep=keep,
+        prune_grace=prune_grace,
+    )
+
+
+def generations(root) -> list[str]:
+    return sorted(p.name for p in root.glob("gen-*"))
+
+
+def test_prune_waits_for_the_grace_period(tmp_path):
+    for _ in range(3):
+        write_generation(tmp_path, keep=1, prune_grace=60.0)
+    assert len(generations(tmp_path)) == 3
+
+    write_generation(tmp_path, keep=1, prune_grace=0.0)
+    assert generations(tmp_path) == ["gen-00000004"]
+
+
+def test_read_follows_current_when_its_generation_is_pruned(tmp_path, monkeypatch):
+    write_generation(tmp_path)
+    read_generation = sparse_snapshot._read_generation
+    calls = []
+
+    def racing_read(path):
+        calls.append(path.name)
+        if len(calls) == 1:
+            # A writer publishes and prunes between resolving CURRENT and opening it
+            write_generation(tmp_path)
+            raise FileNotFoundError(path / "manifest.json")
+        return read_generation(path)
+
+    monkeypatch.setattr(sparse_snapshot, "_read_generation", racing_read)
+    snapshot = read_snapshot(tmp_path)
+    assert calls == ["gen-00000001", "gen-00000002"]
+    assert snapshot["manifest"]["generation"] == 2
+
+
+def test_background_writes_are_coalesced(sparse_dir, monkeypatch):
+    monkeypatch.setattr(settings, "sparse_snapshot_interval", 60.0)
+    retriever = SparseRetriever()
+    retriever.add_chunks(["bridge inspection report"], [{"document_id": 0}])
+    retriever.commit()
+    retriever._save_thread.join()
+    assert current_generation(sparse_dir) == 1
+
+    for document_id in range(1, 6):
+        retriever.add_chunks([f"tunnel section {document_id}"], [{"document_id": document_id}])
+        retriever.commit()
+    # The follow-up write waits for the interval and covers every commit
+    assert current_generation(sparse_dir) == 1
+    retriever.shutdown()
+    assert current_generation(sparse_dir) == 2
+
+    reader = SparseRetriever()
+    assert reader.load_snapshot() and reader.corpus_size == 6
+
+
+@pytest.fixture
+def shared_mode(sparse_dir, monkeypatch):
+    monkeypatch.setattr(settings, "sparse_shared_mode", True)
+    monkeypatch.setattr(settings, "sparse_shared_notify", False)
+    return sparse_dir
+
+
+def test_shared_workers_do_not_lose_each_others_updates(shared_mode):
+    first, second = SparseRetriever(), SparseRetriever()
+    first.add_chunks(["bridge inspection report"], [{"document_id": 1, "chunk_id": "a"}])
+    second.add_chunks(["tunnel ventilation design"], [{"document_id": 2, "chunk_id": "b"}])
+
+    first.save_snapshot()
+    # The second worker publishes on top of the first worker's generation
+    second.save_snapshot()
+    assert current_generation(shared_mode) == 2
+    assert second.corpus_size == 2
+
+    reader = SparseRetriever()
+    assert reader.load_snapshot()
+    assert reader.corpus_size == 2
+    assert first.refresh() and first.corpus_size == 2
+
+
+def test_shared_mutations_do_not_wait_for_the_writer_lock(shared_mode):
+    retriever = SparseRetriever()
+    done = threading.Event()
+
+    def mutate():
+        retriever.add_chunks(["bridge inspection report"], [{"document_id": 1}])
+        retriever.remove_chunks(1, {"missing"})
+        done.set()
+
+    with snapshot_lock(shared_mode):
+        worker = threading.Thread(target=mutate)
+        worker.start()
+        worker.join(timeout=5)
+        assert done.is_set()
+
+    retriever.save_snapshot()
+    assert retriever.corpus_size == 0
+
+
+def test_snapshot_round_trip_serves_the_same_results(sparse_dir):
+    retriever = SparseRetriever()
+    retriever.build_index(
+        [
+            "bridge inspection report for the northern viaduct",
+            "tunnel ventilation design and fire safety",
+            "quality management under ISO-9001",
+            "pricing schedule for bridge maintenance",
+        ],
+        [{"document_id": i, "doc_type": "tender", "chunk_id": str(i)} for i in range(4)],
+    )
+    retriever.remove_chunks(1, {"1"})
+    retriever.save_snapshot()
+
+    restored = SparseRetriever()
+    assert restored.load_snapshot()
+    assert restored.corpus_size == retriever.corpus_size == 3
+    queries = [("bridge", None), ("iso-9001 quality", None), ("bridge", {"document_id": 3})]
+    for query, filters in queries:
+        expected = retriever.search(query, top_k=5, filters=filters)
+        results = restored.search(query, top_k=5, filters=filters)
+        assert expected
+        assert [(c.chunk_id, c.score) for c in results] == [
+            (c.chunk_id, c.score) for c in expected
+        ]
+    assert not restored.search("ventilation", top_k=5)
+
+
+async def test_restore_rebuilds_a_snapshot_with_the_same_count_but_other_chunks(
+    engine, sparse_dir, tmp_path
+):
+    from app.ingestion.pipeline import IngestionPipeline
+    from tests.test_versioning import PRICING, QUALITY, SAFETY
+
+    pipeline = IngestionPipeline(engine)
+    for document_id, text in enumerate((PRICING, SAFETY, QUALITY), start=1):
+        await pipeline.ingest_text(text, document_id=document_id)
+    engine.sparse_retriever.shutdown()  # waits for the background snapshot writes
+    generation = current_generation(sparse_dir)
+    dense = engine.dense_retriever
+
+    fresh = SparseRetriever(snapshot_dir=str(sparse_dir))
+    await fresh.restore(dense.fingerprint_chunks, dense.scroll_chunks)
+    assert fresh.fingerprint == engine.sparse_retriever.fingerprint
+    assert current_generation(sparse_dir) == generation  # up to date, not rebuilt
+
+    # Replace a chunk while the snapshot is not updated (e.g. a worker was down)
+    engine.sparse_retriever = SparseRetriever(snapshot_dir=str(tmp_path / "elsewhere"))
+    edited = PRICING.replace("120000", "135000")
+    await pipeline.ingest_text(edited, document_id=1)
+
+    restored = SparseRetriever(snapshot_dir=str(sparse_dir))
+    await restored.restore(dense.fingerprint_chunks, dense.scroll_chunks)
+    assert restored.corpus_size == fresh.corpus_size == 3
+    assert current_generation(sparse_dir) == generation + 1
+    assert [c.text for c in restored.search("contract price 135000", top_k=5)] == [edited]
@@ -0,0 +1,100 @@
+"""Tests for delta re-ingestion (app.rag.versioning and the ingestion pipeline)."""
+
+from __future__ import annotations
+
+from app.ingestion.pipeline import IngestionPipeline
+from app.rag.chunker import ChunkMetadata, TextChunk
+from app.rag.versioning import DocumentDiff, content_hash, stable_chunk_id
+
+PRICING = (
+    "The contractor shall deliver the maintenance programme for the northern "
+    "bridge portfolio over a period of four years, including quarterly "
+    "inspections, annual load tests, corrosion protection of all steel "
+    "members, replacement of expansion joints where required, and a monthly "
+    "report to the asset owner covering progress, risks and planned works. "
+    "The fixed contract price for this scope is EUR 120000 per year, "
+    "excluding VAT, payable in four equal instalments after acceptance of "
+    "the quarterly report by the asset owner and the independent engineer "
+    "appointed under the framework agreement for the duration of the works. "
+    "Works outside this scope are priced from the agreed schedule of rates, "
+    "which is indexed every January in line with the published construction "
+    "cost index, and are only carried out after a written instruction from "
+    "the asset owner that states the location, the expected duration, the "
+    "traffic measures and the budget reserved for the instructed works."
+)
+SAFETY = (
+    "All site personnel hold a valid VCA certificate and follow the safety "
+    "plan approved by the client before mobilisation."
+)
+QUALITY = (
+    "Our quality management system is certified to ISO 9001 and audited "
+    "yearly by an accredited body."
+)
+
+
+def test_content_hash_ignores_whitespace():
+    assert content_hash("a  b\nc") == content_hash("a b c")
+    assert content_hash("a b c") != content_hash("a b d")
+
+
+def test_diff_assigns_stable_ids():
+    digest = content_hash("same text")
+    stored = stable_chunk_id(7, digest, 0)
+    diff = DocumentDiff(7, {stored: stored, "gone": "gone"})
+
+    first = TextChunk("same text", ChunkMetadata(document_id=7))
+    repeat = TextChunk("same  text", ChunkMetadata(document_id=7))
+    assert diff.assign(first) == stored
+    assert diff.assign(repeat) is None  # second occurrence is a new chunk
+    assert repeat.metadata.chunk_id == stable_chunk_id(7, digest, 1)
+    assert diff.removed == {"gone"}
+    assert diff.stats() == {"chunks_added": 1, "chunks_unchanged": 1, "chunks_removed": 1}
+
+
+async def test_reingest_skips_unchanged_chunks(engine):
+    pipeline = IngestionPipeline(engine)
+    text = f"{PRICING}\n\n{SAFETY}"
+
+    first = await pipeline.ingest_text(text, document_id=1)
+    second = await pipeline.ingest_text(text, document_id=1)
+
+    assert first["chunks_added"] == first["chunks"]
+    assert second["chunks_added"] == 0
+    assert second["chunks_unchanged"] == first["chunks"]
+    assert second["point_ids"] == first["point_ids"]
+
+
+async def test_reingest_of_one_word_edit_serves_new_text(engine):
+    """An edit close enough to count as a near-duplicate is still re-indexed."""
+    pipeline = IngestionPipeline(engine)
+    await pipeline.ingest_text(PRICING, document_id=1)
+    # Other documents, so BM25 term weights are positive
+    await pipeline.ingest_text(SAFETY, document_id=2)
+    await pipeline.ingest_text(QUALITY, document_id=3)
+
+    edited = PRICING.replace("120000", "135000")
+    stats = await pipeline.ingest_text(edited, document_id=1)
+    assert stats["chunks_added"] == 1
+    assert stats["chunks_removed"] == 1
+
+    dense = await engine.dense_retriever.search(
+        "fixed contract price per year", top_k=5, filters={"document_id": 1}
+    )
+    assert [c.text for c in dense] == [edited]
+
+    sparse = engine.sparse_retriever.search("contract price", top_k=5)
+    assert [c.text for c in sparse] == [edited]
+
+
+async def test_reingest_keeps_chunks_shared_with_other_documents(engine):
+    pipeline = IngestionPipeline(engine)
+    await pipeline.ingest_text(PRICING, document_id=1)
+    await pipeline.ingest_text(PRICING, document_id=2)  # stored once, two sources
+
+    await pipeline.ingest_text(SAFETY, document_id=1)
+
+    dense = await engine.dense_retriever.search(
+        "fixed contract price", top_k=5, filters={"document_id": 2}
+    )
+    assert [c.text for c in dense] == [PRICING]
+    assert [c.metadata["document_id"] for c in dense] == [2]
@@ -0,0 +1,33 @@
+import os
+import sys
+
+# Add the current directory to sys.path
+sys.path.append(os.getcwd())
+
+from app.rag.inference import check_parity
+
+TEXTS = [
+    "The contractor shall hold a valid ISO 9001 certification.",
+    "Our team delivered 12 public-sector digital transformation projects since 2018.",
+    "Key personnel: project manager (PMP), solution architect, data protection officer.",
+    "Pricing must be submitted in a separate sealed envelope.",
+]
+QUERY = "Which certifications are required?"
+
+MIN_COSINE = 0.99
+
+try:
+    print("Comparing ONNX and torch backends...")
+    result = check_parity(TEXTS, [(QUERY, t) for t in TEXTS])
+    for key, value in result.items():
+        print(f"  {key}: {value}")
+
+    if result["embedding_min_cosine"] < MIN_COSINE:
+        raise Exception(f"Embedding cosine below {MIN_COSINE}")
+    if not result["reranker_same_ranking"]:
+        raise Exception("Re-ranker ordering differs from torch")
+
+    print("ONNX backend matches torch.")
+except Exception as e:
+    print(f"Parity check failed: {e}", file=sys.stderr)
+    sys.exit(1)